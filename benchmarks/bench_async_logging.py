@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Mesure le temps passé dans le thread appelant pour journaliser des messages
+au travers d'un handler lent (qui simule un syslog ou un disque chargé),
+utilisé directement ou au travers d'un AsyncHandler.
+
+Usage::
+
+    PYTHONPATH=src python benchmarks/bench_async_logging.py [MESSAGES [DELAY_US]]
+"""
+from __future__ import print_function
+
+import sys
+import time
+import logging
+
+from vigilo.common.logging import AsyncHandler
+
+class SlowHandler(logging.Handler):
+    """Handler dont chaque écriture prend un temps donné."""
+
+    def __init__(self, delay):
+        logging.Handler.__init__(self)
+        self.delay = delay
+
+    def emit(self, record):
+        self.format(record)
+        time.sleep(self.delay)
+
+def run(logger, handler, messages):
+    """Journalise des messages et retourne le temps passé par l'appelant."""
+    logger.handlers = [handler]
+    start = time.time()
+    for i in xrange(messages):
+        logger.info("message %d", i)
+    elapsed = time.time() - start
+    handler.flush()
+    return elapsed * 1000
+
+def bench(messages=1000, delay=200):
+    logger = logging.getLogger("bench")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    target = SlowHandler(delay / 1000000.0)
+    print("%d messages, %d us per write" % (messages, delay))
+    print("synchronous:            %8.2f ms" % run(logger, target, messages))
+    for overflow in AsyncHandler.OVERFLOW_POLICIES:
+        handler = AsyncHandler(target, messages // 10, overflow)
+        print("async, %-11s      %8.2f ms (%d dropped)" % (
+              overflow + ":", run(logger, handler, messages), handler.dropped))
+        handler.close()
+
+if __name__ == '__main__':
+    bench(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Compare le coût de la lecture de plusieurs paramètres à l'aide de
+l'utilitaire vigilo-config : une invocation par paramètre, ou une seule
+invocation en mode batch.
+
+Usage::
+
+    PYTHONPATH=src python benchmarks/bench_config_cli.py [QUERIES [SECTIONS]]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+
+def make_config(tmpdir, sections, keys=20):
+    """Génère une configuration synthétique."""
+    main = os.path.join(tmpdir, "settings.ini")
+    with open(main, "w") as f:
+        for j in xrange(sections):
+            f.write("[section-%04d]\n" % j)
+            for k in xrange(keys):
+                f.write("key%d = value %d, %d\n" % (k, j, k))
+    return main
+
+def run(args):
+    """Exécute vigilo-config et retourne sa durée d'exécution."""
+    start = time.time()
+    subprocess.check_call([sys.executable, "-m", "vigilo.common.conf"] + args,
+                          stdout=open(os.devnull, "w"))
+    return time.time() - start
+
+def bench(queries=30, sections=200):
+    tmpdir = tempfile.mkdtemp(prefix="vigilo-bench-")
+    try:
+        main = make_config(tmpdir, sections)
+        pairs = [("section-%04d" % (i % sections), "key%d" % (i % 20))
+                 for i in xrange(queries)]
+        print("%d queries, %d sections" % (queries, sections))
+
+        elapsed = sum(run(["-s", section, "-g", key, main])
+                      for section, key in pairs)
+        print("one call per query: %8.2f ms (%.2f ms per query)" %
+              (elapsed * 1000, elapsed * 1000 / queries))
+
+        args = ["-f", "shell", main]
+        for section, key in pairs:
+            args.extend(["-q", "%s:%s" % (section, key)])
+        elapsed = run(args)
+        print("batch call:         %8.2f ms (%.2f ms per query)" %
+              (elapsed * 1000, elapsed * 1000 / queries))
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    bench(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Mesure la latence des requêtes adressées au serveur de configuration,
+ainsi que la durée d'exécution de la commande vigilo-config avec et sans
+serveur.
+
+Usage::
+
+    PYTHONPATH=src python benchmarks/bench_config_server.py [QUERIES [SECTIONS]]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import subprocess
+
+from vigilo.common.conf import VigiloConfigObj
+from vigilo.common.confserver import SettingsServer
+from vigilo.common.confclient import SettingsClient
+
+def make_config(tmpdir, sections, keys=20):
+    """Génère une configuration synthétique."""
+    main = os.path.join(tmpdir, "settings.ini")
+    with open(main, "w") as f:
+        for j in xrange(sections):
+            f.write("[section-%04d]\n" % j)
+            for k in xrange(keys):
+                f.write("key%d = value %d, %d\n" % (k, j, k))
+    return main
+
+def run_cli(env, runs=10):
+    """Retourne la durée moyenne d'une invocation de vigilo-config."""
+    start = time.time()
+    for _i in xrange(runs):
+        subprocess.check_call([sys.executable, "-m",
+                               "vigilo.common.confclient",
+                               "-s", "section-0000", "-g", "key0"],
+                              env=env, stdout=open(os.devnull, "w"))
+    return (time.time() - start) / runs * 1000
+
+def bench(queries=10000, sections=200):
+    tmpdir = tempfile.mkdtemp(prefix="vigilo-bench-")
+    try:
+        main = make_config(tmpdir, sections)
+        config = VigiloConfigObj(None, interpolation=False)
+        config.load_file(main)
+        path = os.path.join(tmpdir, "config.sock")
+        server = SettingsServer(path, config, watch=False)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            client = SettingsClient(path)
+            start = time.time()
+            for i in xrange(queries):
+                client.get("section-%04d" % (i % sections), "key%d" % (i % 20))
+            elapsed = time.time() - start
+            client.close()
+            print("%d queries, %d sections" % (queries, sections))
+            print("query latency:          %8.3f ms" %
+                  (elapsed / queries * 1000))
+
+            env = dict(os.environ, VIGILO_SETTINGS=main,
+                       VIGILO_CONFIG_SOCKET=path)
+            print("vigilo-config (server): %8.2f ms" % run_cli(env))
+            env["VIGILO_CONFIG_SOCKET"] = os.path.join(tmpdir, "none")
+            print("vigilo-config (local):  %8.2f ms" % run_cli(env))
+        finally:
+            server.shutdown()
+            thread.join()
+            server.server_close()
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    bench(*[int(arg) for arg in sys.argv[1:3]])
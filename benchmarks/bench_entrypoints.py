@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Compare la liste des groupes de points d'entrée et la recherche d'un point
+d'entrée au travers de pkg_resources et de l'index des points d'entrée,
+sur un dossier contenant de nombreuses distributions synthétiques.
+
+Usage::
+
+    PYTHONPATH=src python benchmarks/bench_entrypoints.py [DISTS [RUNS]]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+import pkg_resources
+
+from vigilo.common.entrypoints import EntryPointIndex
+
+def make_dists(tmpdir, dists):
+    """Génère des distributions synthétiques."""
+    for i in xrange(dists):
+        egg_info = os.path.join(tmpdir, "dist%d-1.0.egg-info" % i)
+        os.mkdir(egg_info)
+        with open(os.path.join(egg_info, "PKG-INFO"), "w") as f:
+            f.write("Metadata-Version: 1.0\nName: dist%d\nVersion: 1.0\n" % i)
+        with open(os.path.join(egg_info, "entry_points.txt"), "w") as f:
+            f.write("[vigilo.group%d]\n" % (i % 10))
+            for j in xrange(10):
+                f.write("ep%d_%d = os.path:join\n" % (i, j))
+
+def timed(func, runs):
+    """Retourne la durée moyenne d'exécution d'une fonction."""
+    start = time.time()
+    for _i in xrange(runs):
+        func()
+    return (time.time() - start) / runs * 1000
+
+def bench(dists=300, runs=10):
+    tmpdir = tempfile.mkdtemp(prefix="vigilo-bench-")
+    cache_dir = tempfile.mkdtemp(prefix="vigilo-bench-")
+    try:
+        make_dists(tmpdir, dists)
+        cache_file = os.path.join(cache_dir, "entrypoints.cache")
+
+        def list_pkg_resources():
+            groups = set()
+            for dist in pkg_resources.WorkingSet([tmpdir]):
+                groups.update(group for group in dist.get_entry_map()
+                              if group.startswith('vigilo.'))
+            return sorted(groups)
+
+        def lookup_pkg_resources():
+            working_set = pkg_resources.WorkingSet([tmpdir])
+            return list(working_set.iter_entry_points('vigilo.group3', 'ep3_5'))
+
+        index = EntryPointIndex([tmpdir], cache_file)
+        print("%d distributions" % dists)
+        print("list groups, pkg_resources: %8.2f ms" %
+              timed(list_pkg_resources, runs))
+        print("lookup, pkg_resources:      %8.2f ms" %
+              timed(lookup_pkg_resources, runs))
+        print("build index, no cache:      %8.2f ms" %
+              timed(lambda: EntryPointIndex([tmpdir], None), runs))
+        print("build index, warm cache:    %8.2f ms" %
+              timed(lambda: EntryPointIndex([tmpdir], cache_file), runs))
+        print("list groups, index:         %8.4f ms" %
+              timed(lambda: index.groups(('vigilo.', )), runs * 100))
+        print("lookup, index:              %8.4f ms" %
+              timed(lambda: index.get('vigilo.group3', 'ep3_5'), runs * 100))
+    finally:
+        shutil.rmtree(tmpdir)
+        shutil.rmtree(cache_dir)
+
+if __name__ == '__main__':
+    bench(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Compare le débit (enregistrements par seconde) de VigiloFormatter
+et de VigiloJSONFormatter pour des champs équivalents.
+
+Usage::
+
+    PYTHONPATH=src python benchmarks/bench_json_formatter.py [RECORDS]
+"""
+from __future__ import print_function
+
+import sys
+import time
+import logging
+
+from vigilo.common.logging import VigiloFormatter, VigiloJSONFormatter
+
+FORMAT = "%(asctime)s %(processName)s[%(process)d]: %(levelname)s " \
+         "%(multiprocessName)s %(name)s %(user_login)s %(user_ip)s " \
+         "%(vigilo_app)s::%(message)s"
+
+def run(formatter, records, msg):
+    """Formate des enregistrements et retourne le débit obtenu."""
+    record = logging.makeLogRecord({
+        "name": "vigilo.bench", "msg": msg, "args": (42, ),
+        "levelname": "INFO", "levelno": logging.INFO,
+    })
+    start = time.time()
+    for _i in xrange(records):
+        formatter.format(record)
+    return records / (time.time() - start)
+
+def bench(records=100000):
+    print("%d records" % records)
+    for label, msg in (("ascii", "alarm %d raised"),
+                       ("unicode", u"alarme %d lev\xe9e")):
+        print("%-8s VigiloFormatter:     %10.0f records/s" % (
+              label, run(VigiloFormatter(FORMAT), records, msg)))
+        print("%-8s VigiloJSONFormatter: %10.0f records/s" % (
+              label, run(VigiloJSONFormatter(FORMAT), records, msg)))
+
+if __name__ == '__main__':
+    bench(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Mesure le débit (enregistrements par seconde) de VigiloFormatter,
+comparé à celui de l'implémentation précédente (reproduite ci-dessous),
+qui recalculait le contexte du processus et tentait d'importer TurboGears
+pour chaque enregistrement.
+
+Usage::
+
+    PYTHONPATH=src python benchmarks/bench_log_formatter.py [RECORDS]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import logging
+from multiprocessing import current_process
+
+from vigilo.common.logging import VigiloFormatter
+
+FORMAT = "%(processName)s[%(process)d]: %(levelname)s %(multiprocessName)s " \
+         "%(name)s::%(message)s"
+
+class LegacyFormatter(VigiloFormatter):
+    """Implémentation précédente de VigiloFormatter.add_context."""
+
+    def add_context(self, record):
+        record.processName = os.path.basename(sys.argv[0])
+        record.multiprocessName = current_process().name
+        fields = {
+            'user_login': '???',
+            'user_fullname': '???',
+            'user_ip': '???',
+        }
+        try:
+            from tg import request
+            fields['user_ip'] = request.remote_addr
+        except (ImportError, TypeError):
+            pass
+        for field in fields:
+            if not hasattr(record, field):
+                setattr(record, field, fields[field])
+        record.app_name = '???'
+        try:
+            from tg import config
+        except ImportError:
+            pass
+
+def run(formatter, records):
+    """Formate des enregistrements et retourne le débit obtenu."""
+    record = logging.makeLogRecord({
+        "name": "vigilo.bench", "msg": "message %d", "args": (42, ),
+        "levelname": "INFO", "levelno": logging.INFO,
+    })
+    start = time.time()
+    for _i in xrange(records):
+        formatter.format(record)
+        # Un nouvel enregistrement n'a pas les champs injectés.
+        del record.user_login, record.user_fullname, record.user_ip
+    return records / (time.time() - start)
+
+def bench(records=100000):
+    print("%d records" % records)
+    print("before: %10.0f records/s" % run(LegacyFormatter(FORMAT), records))
+    print("after:  %10.0f records/s" % run(VigiloFormatter(FORMAT), records))
+
+if __name__ == '__main__':
+    bench(*[int(arg) for arg in sys.argv[1:2]])
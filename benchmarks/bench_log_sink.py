@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Mesure le temps passé par des processus fils (multiprocessing) pour
+journaliser des messages dans un fichier avec rotation, en écrivant
+directement au travers du handler hérité du processus parent, ou en
+transmettant les enregistrements au processus parent (LogSink).
+Les lignes présentes dans l'ensemble des fichiers sont ensuite comptées.
+
+Usage::
+
+    PYTHONPATH=src python benchmarks/bench_log_sink.py [MESSAGES [WORKERS]]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import glob
+import time
+import shutil
+import logging
+import logging.handlers
+import tempfile
+import multiprocessing
+
+from vigilo.common.logging import VigiloFormatter, start_log_sink, \
+                                  stop_log_sink
+
+LINE = "x" * 200
+
+def worker(messages, queue):
+    """Journalise des messages et retourne le temps passé."""
+    logger = logging.getLogger("bench")
+    start = time.time()
+    for i in xrange(messages):
+        logger.info("message %d %s", i, LINE)
+    elapsed = time.time() - start
+    logger.handlers[0].flush()
+    queue.put(elapsed)
+
+def run(logfile, messages, workers, sink):
+    """Lance les processus fils et retourne le temps moyen par processus."""
+    logger = logging.getLogger("bench")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    handler = logging.handlers.RotatingFileHandler(logfile,
+                                                   maxBytes=1024 * 1024,
+                                                   backupCount=1000)
+    handler.setFormatter(VigiloFormatter("%(multiprocessName)s %(message)s"))
+    logger.handlers = [handler]
+    if sink:
+        start_log_sink()
+    queue = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=worker, args=(messages, queue))
+             for _i in xrange(workers)]
+    start = time.time()
+    for proc in procs:
+        proc.start()
+    elapsed = [queue.get() for _proc in procs]
+    for proc in procs:
+        proc.join()
+    if sink:
+        stop_log_sink()
+    total = time.time() - start
+    handler.close()
+    lines = []
+    for path in glob.glob(logfile + "*"):
+        with open(path) as log:
+            lines.extend(log.read().splitlines())
+    broken = len([line for line in lines if not line.endswith(LINE)])
+    return (sum(elapsed) / len(elapsed) * 1000, total * 1000,
+            len(lines), broken)
+
+def bench(messages=5000, workers=4):
+    tmpdir = tempfile.mkdtemp(prefix="vigilo-bench-")
+    try:
+        print("%d workers x %d messages" % (workers, messages))
+        for sink in (False, True):
+            logfile = os.path.join(tmpdir, "sink.log" if sink else "direct.log")
+            per_worker, total, lines, broken = \
+                run(logfile, messages, workers, sink)
+            print("%-8s %8.2f ms per worker, %8.2f ms total, "
+                  "%d lines, %d broken" % ("sink:" if sink else "direct:",
+                  per_worker, total, lines, broken))
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    bench(*[int(arg) for arg in sys.argv[1:3]])
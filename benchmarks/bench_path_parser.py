@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Compare les performances de parse_path avec l'implémentation historique
+(analyse caractère par caractère).
+
+Usage::
+
+    PYTHONPATH=src python benchmarks/bench_path_parser.py
+"""
+from __future__ import print_function
+
+import timeit
+
+from vigilo.common import parse_path
+
+def legacy_parse_path(path):
+    """Implémentation historique de parse_path, pour comparaison."""
+    parts = []
+    if not path:
+        return None
+    absolute = (path[0] == '/')
+    if absolute:
+        path = path[1:]
+    it = iter(path)
+    try:
+        portion = ""
+        while True:
+            ch = it.next()
+            if ch == '\\':
+                ch = it.next()
+                if ch == '/' or ch == '\\':
+                    portion += ch
+                else:
+                    return None
+            elif ch == '/':
+                if not portion:
+                    return None
+                parts.append(portion)
+                portion = ""
+            else:
+                portion += ch
+    except StopIteration:
+        if portion:
+            parts.append(portion)
+    if not parts:
+        return None
+    if len(parts) != 1 and (not absolute):
+        return None
+    return parts
+
+PATHS = {
+    "short": "/Servers/Linux/Web",
+    "escaped": r"/Servers/Linux\/Unix/Web\\Front",
+    "long": "/" + "/".join(["component-%04d" % i for i in xrange(50)]),
+    "long component": "/" + "x" * 5000,
+}
+
+def bench(number=20000):
+    print("%-16s %14s %14s %8s" % ("path", "legacy (us)", "current (us)",
+                                   "speedup"))
+    for name in sorted(PATHS):
+        path = PATHS[name]
+        assert legacy_parse_path(path) == parse_path(path)
+        count = max(number // max(len(path) // 100, 1), 100)
+        legacy = min(timeit.repeat(lambda: legacy_parse_path(path),
+                                   number=count, repeat=3)) / count * 1e6
+        current = min(timeit.repeat(lambda: parse_path(path),
+                                    number=count, repeat=3)) / count * 1e6
+        print("%-16s %14.2f %14.2f %7.1fx" % (name, legacy, current,
+                                              legacy / current))
+
+if __name__ == '__main__':
+    bench()
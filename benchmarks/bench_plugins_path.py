@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Mesure la durée de setup_plugins_path sur un dossier contenant de nombreux
+plugins, sans cache puis avec le cache de la résolution des distributions.
+
+Usage::
+
+    PYTHONPATH=src python benchmarks/bench_plugins_path.py [PLUGINS [RUNS]]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+import pkg_resources
+
+from vigilo.common.conf import setup_plugins_path
+
+def make_plugins(tmpdir, plugins):
+    """Génère un dossier de plugins synthétiques."""
+    plugins_path = os.path.join(tmpdir, "plugins")
+    for i in xrange(plugins):
+        egg_info = os.path.join(plugins_path, "plugin%d-1.0-py%d.%d.egg" % (
+            i, sys.version_info[0], sys.version_info[1]), "EGG-INFO")
+        os.makedirs(egg_info)
+        with open(os.path.join(egg_info, "PKG-INFO"), "w") as f:
+            f.write("Metadata-Version: 1.0\nName: plugin%d\nVersion: 1.0\n" % i)
+        with open(os.path.join(egg_info, "requires.txt"), "w") as f:
+            f.write("setuptools\n")
+    return plugins_path
+
+def run(plugins_path, cache_file, runs):
+    """Exécute setup_plugins_path et retourne sa durée moyenne."""
+    working_set = pkg_resources.working_set
+    elapsed = 0
+    try:
+        for _i in xrange(runs):
+            pkg_resources.working_set = \
+                pkg_resources.WorkingSet(working_set.entries)
+            start = time.time()
+            setup_plugins_path(plugins_path, cache_file)
+            elapsed += time.time() - start
+    finally:
+        pkg_resources.working_set = working_set
+    return elapsed / runs * 1000
+
+def bench(plugins=200, runs=5):
+    tmpdir = tempfile.mkdtemp(prefix="vigilo-bench-")
+    try:
+        plugins_path = make_plugins(tmpdir, plugins)
+        cache_file = os.path.join(tmpdir, "plugins.cache")
+        print("%d plugins" % plugins)
+        print("no cache:   %8.2f ms" % run(plugins_path, None, runs))
+        run(plugins_path, cache_file, 1)
+        print("warm cache: %8.2f ms" % run(plugins_path, cache_file, runs))
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    bench(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Mesure le coût de création et de recherche des fichiers RRD
+pour chaque mode de répartition, sur une arborescence synthétique.
+
+Usage::
+
+    PYTHONPATH=src python benchmarks/bench_rrd_layout.py [HOSTS [DATASOURCES]]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+
+from vigilo.common import get_rrd_path, rrd_path_cache
+
+LAYOUTS = [
+    ("flat", {"path_mode": "flat"}),
+    ("name 2x1", {"path_mode": "name"}),
+    ("hash 2x1", {"path_mode": "hash"}),
+    ("hash 3x1", {"path_mode": "hash", "path_depth": 3}),
+    ("hash 2x2", {"path_mode": "hash", "path_width": 2}),
+]
+
+def bench(hosts=20000, datasources=5, lookups=20000):
+    pairs = [("host-%06d.example.com" % h, "ds%03d" % d)
+             for h in xrange(hosts) for d in xrange(datasources)]
+    sample = [random.choice(pairs) for _i in xrange(lookups)]
+
+    print("%-10s %12s %12s %12s" % ("layout", "create (us)",
+                                    "lookup (us)", "max entries"))
+    for name, options in LAYOUTS:
+        base_dir = tempfile.mkdtemp(prefix="vigilo-bench-")
+        try:
+            rrd_path_cache.clear()
+            start = time.time()
+            for hostname, ds in pairs:
+                path = get_rrd_path(hostname, ds, base_dir, **options)
+                dirname = os.path.dirname(path)
+                if not os.path.isdir(dirname):
+                    os.makedirs(dirname)
+                open(path, "w").close()
+            create = (time.time() - start) / len(pairs) * 1e6
+
+            # On vide le cache pour mesurer aussi le calcul du chemin.
+            rrd_path_cache.clear()
+            start = time.time()
+            for hostname, ds in sample:
+                os.stat(get_rrd_path(hostname, ds, base_dir, **options))
+            lookup = (time.time() - start) / len(sample) * 1e6
+
+            widest = max(len(dirnames) + len(filenames)
+                         for _dirpath, dirnames, filenames
+                         in os.walk(base_dir))
+            print("%-10s %12.1f %12.1f %12d" % (name, create, lookup, widest))
+        finally:
+            shutil.rmtree(base_dir)
+
+if __name__ == '__main__':
+    bench(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Mesure le temps de chargement d'un dossier d'inclusions volumineux,
+selon le nombre de processus utilisés pour l'analyse des fichiers
+(cf. VIGILO_SETTINGS_WORKERS), ainsi que le coût fixe du démarrage
+des processus, qui détermine le seuil _PREFETCH_MIN_FILES.
+
+Usage::
+
+    PYTHONPATH=src python benchmarks/bench_settings_includes.py \\
+        [FILES [SECTIONS]]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import multiprocessing
+
+from vigilo.common import conf
+from vigilo.common.conf import VigiloConfigObj
+
+def make_config(tmpdir, files, sections, keys=20):
+    """Génère une configuration synthétique."""
+    include_dir = os.path.join(tmpdir, "conf.d")
+    os.mkdir(include_dir)
+    main = os.path.join(tmpdir, "settings.ini")
+    with open(main, "w") as f:
+        f.write("[include]\ninclude = %s\n" % include_dir)
+    for i in xrange(files):
+        with open(os.path.join(include_dir, "%04d.ini" % i), "w") as f:
+            for j in xrange(sections):
+                f.write("[section-%04d-%04d]\n" % (i, j))
+                for k in xrange(keys):
+                    f.write("key%d = value %d, %d\n" % (k, j, k))
+    return main
+
+def load(filename, workers, repeat=5):
+    """Charge la configuration et retourne la meilleure durée (en ms)."""
+    os.environ['VIGILO_SETTINGS'] = filename
+    best = None
+    for _i in xrange(repeat):
+        config = VigiloConfigObj(None, interpolation=False)
+        config.paths = []
+        config.cache_dir = None
+        config.include_workers = workers
+        start = time.time()
+        config.load_module()
+        elapsed = (time.time() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, config.dict()
+
+def bench(files=200, sections=10):
+    tmpdir = tempfile.mkdtemp(prefix="vigilo-bench-")
+    # Le seuil est désactivé pour mesurer le coût réel du parallélisme.
+    conf._PREFETCH_MIN_FILES = 2
+    try:
+        filename = make_config(tmpdir, files, sections)
+        print("%d files, %d sections each, %d CPU" %
+              (files, sections, multiprocessing.cpu_count()))
+        reference_time, reference = load(filename, 0)
+        print("sequential:  %8.1f ms (%.2f ms per file)" %
+              (reference_time, reference_time / files))
+        workers = 2
+        while workers <= max(multiprocessing.cpu_count(), 2):
+            elapsed, result = load(filename, workers)
+            assert result == reference
+            print("%2d workers:  %8.1f ms" % (workers, elapsed))
+            workers *= 2
+
+        # Coût fixe : démarrage et arrêt des processus pour deux fichiers.
+        small = os.path.join(tmpdir, "small")
+        os.mkdir(small)
+        small_file = make_config(small, 2, sections)
+        sequential = load(small_file, 0)[0]
+        parallel = load(small_file, 2)[0]
+        print("pool overhead (2 workers): %.1f ms" % (parallel - sequential))
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    bench(*[int(arg) for arg in sys.argv[1:3]])
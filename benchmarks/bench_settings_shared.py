@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Compare le démarrage de processus de travail qui analysent chacun
+la configuration à celui de processus qui s'attachent à la configuration
+publiée par leur parent (cf. VigiloConfigObj.publish_shared) : durée de
+chargement et mémoire résidente maximale de chaque processus, qui ne lit
+qu'une section de la configuration.
+
+Usage::
+
+    PYTHONPATH=src python benchmarks/bench_settings_shared.py [WORKERS [SECTIONS]]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+
+from vigilo.common.conf import VigiloConfigObj
+
+WORKER = """
+import sys, time, resource
+from vigilo.common.conf import VigiloConfigObj
+start = time.time()
+config = VigiloConfigObj(None, interpolation=False)
+if sys.argv[1] == 'parse':
+    config.load_file(sys.argv[2])
+else:
+    config.attach_shared(sys.argv[2])
+config['section-0000']['key0']
+print time.time() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+"""
+
+def make_config(tmpdir, sections, keys=20):
+    """Génère une configuration synthétique."""
+    main = os.path.join(tmpdir, "settings.ini")
+    with open(main, "w") as f:
+        for j in xrange(sections):
+            f.write("[section-%04d]\n" % j)
+            for k in xrange(keys):
+                f.write("key%d = value %d, %d ; comment\n" % (k, j, k))
+    return main
+
+def spawn(workers, mode, path):
+    """Démarre des processus de travail et retourne leurs mesures moyennes."""
+    elapsed = rss = 0
+    for _i in xrange(workers):
+        output = subprocess.check_output(
+            [sys.executable, "-c", WORKER, mode, path])
+        duration, maxrss = output.split()
+        elapsed += float(duration)
+        rss += int(maxrss)
+    return (elapsed / workers * 1000, rss / workers)
+
+def bench(workers=5, sections=1000):
+    tmpdir = tempfile.mkdtemp(prefix="vigilo-bench-")
+    try:
+        main = make_config(tmpdir, sections)
+        config = VigiloConfigObj(None, interpolation=False)
+        config.load_file(main)
+        shared = os.path.join(tmpdir, "settings.shm")
+        config.publish_shared(shared)
+        print("%d workers, %d sections" % (workers, sections))
+        print("parse:  %8.2f ms, %6d kB max RSS" %
+              spawn(workers, "parse", main))
+        print("attach: %8.2f ms, %6d kB max RSS" %
+              spawn(workers, "attach", shared))
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    bench(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Mesure le temps de chargement de la configuration par load_module,
+avec et sans le cache de la configuration fusionnée (VIGILO_SETTINGS_CACHE)
+ainsi qu'en mode paresseux (VIGILO_SETTINGS_LAZY, une seule section lue),
+sur une configuration synthétique utilisant un dossier d'inclusions.
+
+Usage::
+
+    PYTHONPATH=src python benchmarks/bench_settings_startup.py [FILES [SECTIONS]]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+from vigilo.common.conf import VigiloConfigObj
+
+def make_config(tmpdir, files, sections, keys=20):
+    """Génère une configuration synthétique."""
+    include_dir = os.path.join(tmpdir, "conf.d")
+    os.mkdir(include_dir)
+    main = os.path.join(tmpdir, "settings.ini")
+    with open(main, "w") as f:
+        f.write("[include]\ninclude = %s\n" % include_dir)
+        f.write("[main]\nkey = value\n")
+    for i in xrange(files):
+        with open(os.path.join(include_dir, "%04d.ini" % i), "w") as f:
+            for j in xrange(sections):
+                f.write("[section-%04d-%04d]\n" % (i, j))
+                for k in xrange(keys):
+                    f.write("key%d = value %d, %d ; comment\n" % (k, j, k))
+    return main
+
+def load(cache_dir, runs, lazy=False):
+    """Charge la configuration plusieurs fois et retourne le temps moyen."""
+    start = time.time()
+    for _i in xrange(runs):
+        config = VigiloConfigObj(None, file_error=True, raise_errors=True,
+                                 interpolation=False)
+        config.cache_dir = cache_dir
+        config.lazy = lazy
+        config.load_module()
+        config["main"]["key"]
+    return (time.time() - start) / runs * 1000
+
+def bench(files=50, sections=10, runs=10):
+    tmpdir = tempfile.mkdtemp(prefix="vigilo-bench-")
+    try:
+        os.environ["VIGILO_SETTINGS"] = make_config(tmpdir, files, sections)
+        cache_dir = os.path.join(tmpdir, "cache")
+        os.mkdir(cache_dir)
+        print("%d files, %d sections each" % (files, sections))
+        print("full parse:  %8.2f ms" % load(None, runs))
+        load(cache_dir, 1)
+        print("warm cache:  %8.2f ms" % load(cache_dir, runs))
+        print("lazy:        %8.2f ms" % load(None, runs, lazy=True))
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    bench(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Mesure le temps de chargement et de validation d'une configuration
+volumineuse associée à une configspec, ainsi que le temps de rechargement
+après la modification d'une seule section.
+
+Usage::
+
+    PYTHONPATH=src python benchmarks/bench_settings_validate.py [SECTIONS [KEYS]]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+from vigilo.common import conf
+from vigilo.common.conf import VigiloConfigObj
+
+def make_config(tmpdir, sections, keys):
+    """Génère une configuration synthétique et sa configspec."""
+    main = os.path.join(tmpdir, "settings.ini")
+    with open(os.path.join(tmpdir, "settings.spec"), "w") as f:
+        f.write("[__many__]\n")
+        for k in xrange(keys):
+            f.write("key%d = integer(min=0, default=%d)\n" % (k, k))
+        f.write("flag = boolean(default=False)\n")
+    write_config(main, sections, keys, 0)
+    return main
+
+def write_config(main, sections, keys, changed):
+    """Écrit la configuration, en modifiant la valeur de la section donnée."""
+    with open(main, "w") as f:
+        for j in xrange(sections):
+            f.write("[section-%04d]\n" % j)
+            for k in xrange(keys):
+                f.write("key%d = %d\n" % (k, k + (j == changed)))
+            f.write("flag = yes\n")
+
+def bench(sections=500, keys=20, runs=5):
+    tmpdir = tempfile.mkdtemp(prefix="vigilo-bench-")
+    try:
+        main = make_config(tmpdir, sections, keys)
+        print("%d sections, %d keys each" % (sections, keys))
+
+        start = time.time()
+        for _i in xrange(runs):
+            conf._configspecs.clear()
+            config = VigiloConfigObj(None, interpolation=False)
+            config.load_file(main)
+        print("load (cold spec):  %8.2f ms" %
+              ((time.time() - start) / runs * 1000))
+
+        start = time.time()
+        for _i in xrange(runs):
+            config = VigiloConfigObj(None, interpolation=False)
+            config.load_file(main)
+        print("load (warm spec):  %8.2f ms" %
+              ((time.time() - start) / runs * 1000))
+
+        elapsed = 0
+        for i in xrange(runs):
+            # La taille du fichier change à chaque fois, afin que
+            # la modification soit détectée même si la date ne change pas.
+            write_config(main, sections, keys, i + 1)
+            with open(main, "a") as f:
+                f.write("\n" * (i + 1))
+            start = time.time()
+            config.reload()
+            elapsed += time.time() - start
+        print("reload (1 change): %8.2f ms" % (elapsed / runs * 1000))
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    bench(*[int(arg) for arg in sys.argv[1:3]])
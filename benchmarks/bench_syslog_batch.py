@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Compare le débit de SysLogHandler et de BatchedSysLogHandler vers
+une socket Unix locale (en mode datagramme, comme /dev/log, puis en mode
+flux), lue par un thread dédié.
+
+Seul le mode flux regroupe les messages en un appel système par lot ;
+en mode datagramme, chaque message reste envoyé séparément.
+
+Usage::
+
+    PYTHONPATH=src python benchmarks/bench_syslog_batch.py [RECORDS [BATCH]]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import socket
+import logging
+import tempfile
+import threading
+import logging.handlers
+
+from vigilo.common.logging import BatchedSysLogHandler
+
+def serve(path, socktype):
+    """Crée une socket d'écoute et un thread qui en lit les données."""
+    server = socket.socket(socket.AF_UNIX, socktype)
+    server.bind(path)
+    if socktype == socket.SOCK_STREAM:
+        server.listen(1)
+
+    def _read():
+        sock = server
+        if socktype == socket.SOCK_STREAM:
+            sock = server.accept()[0]
+        while sock.recv(65536):
+            pass
+    thread = threading.Thread(target=_read)
+    thread.daemon = True
+    thread.start()
+    return server
+
+def run(handler, records):
+    """Journalise des enregistrements et retourne le débit obtenu."""
+    logger = logging.getLogger("bench")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.handlers = [handler]
+    start = time.time()
+    for i in xrange(records):
+        logger.info("alarm %d on host%d", i, i % 100)
+    handler.flush()
+    elapsed = time.time() - start
+    handler.close()
+    return records / elapsed
+
+def bench(records=50000, batch=100):
+    tmpdir = tempfile.mkdtemp(prefix="vigilo-bench-")
+    try:
+        print("%d records, batches of %d" % (records, batch))
+        for name, socktype in (("dgram", socket.SOCK_DGRAM),
+                               ("stream", socket.SOCK_STREAM)):
+            path = os.path.join(tmpdir, name)
+            serve(path, socktype)
+            print("%-6s SysLogHandler:        %8.0f records/s" % (name, run(
+                logging.handlers.SysLogHandler(path, socktype=socktype),
+                records)))
+            path = os.path.join(tmpdir, name + "-batch")
+            serve(path, socktype)
+            print("%-6s BatchedSysLogHandler: %8.0f records/s" % (name, run(
+                BatchedSysLogHandler(path, socktype=socktype,
+                                     batch_size=batch), records)))
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    bench(*[int(arg) for arg in sys.argv[1:3]])
@@ -45,6 +45,7 @@ setup(name='vigilo-common',
             ],
         extras_require={
             'tests': tests_require,
+            'inotify': ['pyinotify'],
             },
         namespace_packages = [
             'vigilo',
@@ -57,13 +58,18 @@ setup(name='vigilo-common',
         },
         entry_points={
             'console_scripts': [
-                'vigilo-config = vigilo.common.conf:main',
+                'vigilo-config = vigilo.common.confclient:main',
+                'vigilo-config-server = vigilo.common.confserver:main',
                 'vigilo-plugins = vigilo.common.plugins:main',
+                'vigilo-rrd-relayout = vigilo.common.relayout:main',
             ],
             'distutils.commands': [
                 'identity_catalog = vigilo.common.commands:identity_catalog',
             ],
         },
         package_dir={'': 'src'},
-        data_files=install_i18n("i18n", os.path.join(sys.prefix, 'share', 'locale'))
+        data_files=install_i18n(
+            "i18n",
+            os.path.join(sys.prefix, 'share', 'locale'),
+        ),
         )
@@ -8,41 +8,371 @@ de Vigilo.
 """
 
 import os
+import re
+import stat
 import urllib
 import hashlib
 
-__all__ = ("get_rrd_path", "parse_path")
+try:
+    from os import scandir as _scandir
+except ImportError:
+    try:
+        from scandir import scandir as _scandir
+    except ImportError:
+        _scandir = None # pylint: disable-msg=C0103
+
+from vigilo.common.lru import LRUCache
+
+__all__ = ("get_rrd_path", "get_rrd_paths", "get_rrd_path_options",
+           "rrd_path_cache", "parse_rrd_path", "iter_rrd_files",
+           "parse_path", "parse_paths", "format_path", "format_paths")
+
+_DEFAULT_RRD_DIR = "/var/lib/vigilo/rrds"
 
-_DIR_HASHES = {}
+#: Cache des chemins calculés par L{get_rrd_path}.
+#: Sa taille peut être ajustée via C{rrd_path_cache.resize()}.
+rrd_path_cache = LRUCache(16384)
+
+# Éléments d'un chemin d'accès analysé par parse_path() : texte brut,
+# séquence d'échappement valide, séparateur ou séquence invalide.
+_PATH_TOKENS = re.compile(r'([^\\/]+)|\\([\\/])|(/)|(\\.?)', re.DOTALL)
+
+def get_rrd_path(hostname, ds=None, base_dir=None, path_mode="flat",
+                 path_depth=2, path_width=1):
+    """
+    Retourne le chemin vers le dossier RRD d'un hôte
+    ou vers le fichier RRD d'une de ses sources de données.
+
+    Les résultats sont conservés dans L{rrd_path_cache}, de sorte
+    que les hôtes les plus sollicités sont résolus en une seule
+    recherche dans le cache.
+
+    Dans les modes "name" et "hash", le dossier de l'hôte est placé
+    sous C{path_depth} niveaux de sous-dossiers, le niveau I{n} étant
+    nommé d'après les C{n * path_width} premiers caractères du nom
+    de l'hôte (mode "name") ou de son empreinte MD5 (mode "hash").
+    Les valeurs par défaut donnent par exemple C{4/42/localhost}.
+
+    @param hostname: Nom de l'hôte.
+    @type hostname: C{basestring}
+    @param ds: Nom de la source de données ou C{None} pour obtenir
+        le chemin du dossier de l'hôte.
+    @type ds: C{basestring}
+    @param base_dir: Dossier racine des fichiers RRD.
+    @type base_dir: C{str}
+    @param path_mode: Mode de répartition des fichiers
+        ("flat", "name" ou "hash").
+    @type path_mode: C{str}
+    @param path_depth: Nombre de niveaux de sous-dossiers intermédiaires
+        dans les modes "name" et "hash".
+    @type path_depth: C{int}
+    @param path_width: Nombre de caractères ajoutés à chaque niveau
+        de sous-dossiers intermédiaires.
+    @type path_width: C{int}
+    @return: Chemin vers le dossier ou le fichier RRD.
+    @rtype: C{str}
+    @raise ValueError: Les paramètres de répartition sont invalides.
+    """
+    key = (hostname, ds, base_dir, path_mode, path_depth, path_width)
+    path = rrd_path_cache.get(key)
+    if path is None:
+        path = _compute_rrd_path(hostname, ds, base_dir, path_mode,
+                                 path_depth, path_width)
+        rrd_path_cache[key] = path
+    return path
+
+def get_rrd_path_options(section):
+    """
+    Extrait les options de répartition des fichiers RRD d'une section
+    de la configuration, sous une forme directement utilisable
+    par L{get_rrd_path} et les fonctions associées::
 
-def get_rrd_path(hostname, ds=None, base_dir=None, path_mode="flat"):
+        options = get_rrd_path_options(settings['connector-metro'])
+        path = get_rrd_path(hostname, ds, base_dir, **options)
+
+    Les clés reconnues sont C{rrd_path_mode}, C{rrd_path_depth}
+    et C{rrd_path_width}. Les valeurs absentes conservent leur valeur
+    par défaut, ce qui préserve la répartition historique sur deux niveaux.
+
+    @param section: Section de la configuration.
+    @type section: C{dict}
+    @return: Options de répartition (C{path_mode}, C{path_depth}
+        et C{path_width}).
+    @rtype: C{dict}
+    @raise ValueError: Les paramètres de répartition sont invalides.
+    """
+    options = {
+        'path_mode': section.get('rrd_path_mode', 'flat'),
+        'path_depth': int(section.get('rrd_path_depth', 2)),
+        'path_width': int(section.get('rrd_path_width', 1)),
+    }
+    _check_fan_out(options['path_depth'], options['path_width'])
+    return options
+
+def _check_fan_out(path_depth, path_width):
+    """
+    Vérifie les paramètres de répartition des fichiers RRD.
+
+    @raise ValueError: La profondeur est négative
+        ou la largeur est inférieure à 1.
+    """
+    if path_depth < 0:
+        raise ValueError("Invalid RRD path depth: %r" % (path_depth, ))
+    if path_width < 1:
+        raise ValueError("Invalid RRD path width: %r" % (path_width, ))
+
+def _compute_rrd_path(hostname, ds, base_dir, path_mode,
+                      path_depth, path_width):
+    """Calcule le chemin retourné par L{get_rrd_path}, sans cache."""
     if base_dir is None:
-        base_dir = "/var/lib/vigilo/rrds"
-    subpath = ""
+        base_dir = _DEFAULT_RRD_DIR
 
     if isinstance(hostname, unicode):
         # urllib et hashlib ne supportent pas unicode.
         hostname = hostname.encode('utf-8')
 
-    if path_mode == "name" and len(hostname) >= 2:
-        subpath = os.path.join(hostname[0], "".join(hostname[0:2]))
-    elif path_mode == "hash":
-        if hostname in _DIR_HASHES:
-            subpath = _DIR_HASHES[hostname]
-        else:
-            host_hash = hashlib.md5(hostname).hexdigest()
-            subpath = os.path.join(host_hash[0], "".join(host_hash[0:2]))
-            _DIR_HASHES[hostname] = subpath
-
-    host_dir = os.path.join(base_dir, subpath, urllib.quote_plus(hostname))
+    subdirs = _get_rrd_subdirs(hostname, path_mode, path_depth, path_width)
+    host_dir = os.path.join(base_dir, *(subdirs +
+                                        [urllib.quote_plus(hostname)]))
     if ds is None:
         return host_dir
+    return os.path.join(host_dir, _get_rrd_filename(ds))
+
+def _get_rrd_subdirs(hostname, path_mode, path_depth=2, path_width=1):
+    """
+    Retourne les sous-dossiers intermédiaires entre le dossier racine
+    des fichiers RRD et le dossier d'un hôte, selon le mode de répartition.
+
+    @param hostname: Nom de l'hôte, encodé en UTF-8.
+    @type hostname: C{str}
+    @param path_mode: Mode de répartition des fichiers.
+    @type path_mode: C{str}
+    @param path_depth: Nombre de niveaux de sous-dossiers.
+    @type path_depth: C{int}
+    @param path_width: Nombre de caractères ajoutés à chaque niveau.
+    @type path_width: C{int}
+    @return: Liste des sous-dossiers intermédiaires.
+    @rtype: C{list}
+    @raise ValueError: Les paramètres de répartition sont invalides.
+    """
+    _check_fan_out(path_depth, path_width)
+    length = path_depth * path_width
+    if path_mode == "name":
+        if len(hostname) < length:
+            return []
+        key = hostname
+    elif path_mode == "hash":
+        # Une empreinte MD5 compte 32 caractères hexadécimaux.
+        if length > 32:
+            raise ValueError("Hash fan-out too deep (%d characters "
+                             "requested, 32 available)" % length)
+        key = hashlib.md5(hostname).hexdigest()
+    else:
+        return []
+    return [key[0:level * path_width]
+            for level in xrange(1, path_depth + 1)]
 
+def _get_rrd_filename(ds):
+    """
+    Retourne le nom du fichier RRD associé à une source de données.
+
+    @param ds: Nom de la source de données.
+    @type ds: C{basestring}
+    @return: Nom du fichier RRD (sans le dossier de l'hôte).
+    @rtype: C{str}
+    """
     if isinstance(ds, unicode):
         # urllib ne supporte pas unicode.
         ds = ds.encode('utf-8')
-    ds = urllib.quote_plus(ds)
-    return os.path.join(host_dir, "%s.rrd" % ds)
+    return "%s.rrd" % urllib.quote_plus(ds)
+
+def get_rrd_paths(pairs, base_dir=None, path_mode="flat",
+                  path_depth=2, path_width=1):
+    """
+    Calcule les chemins vers les fichiers RRD d'un ensemble
+    de couples (hôte, source de données).
+
+    Le résultat est identique à un appel à L{get_rrd_path} pour chacun
+    des couples, mais le dossier de chaque hôte et le nom de fichier
+    de chaque source de données ne sont calculés qu'une seule fois,
+    ce qui accélère nettement le traitement d'un parc complet.
+
+    @param pairs: Couples (hôte, source de données). La source de données
+        peut valoir C{None}, auquel cas le chemin du dossier de l'hôte
+        est retourné.
+    @type pairs: C{iterable} de C{tuple}
+    @param base_dir: Dossier racine des fichiers RRD.
+    @type base_dir: C{str}
+    @param path_mode: Mode de répartition des fichiers
+        ("flat", "name" ou "hash").
+    @type path_mode: C{str}
+    @param path_depth: Nombre de niveaux de sous-dossiers intermédiaires
+        dans les modes "name" et "hash".
+    @type path_depth: C{int}
+    @param path_width: Nombre de caractères ajoutés à chaque niveau
+        de sous-dossiers intermédiaires.
+    @type path_width: C{int}
+    @return: Générateur des chemins, dans l'ordre des couples fournis.
+    @rtype: C{generator}
+    """
+    host_dirs = {}
+    filenames = {}
+    for hostname, ds in pairs:
+        try:
+            host_dir = host_dirs[hostname]
+        except KeyError:
+            host_dir = get_rrd_path(hostname, None, base_dir, path_mode,
+                                    path_depth, path_width)
+            host_dirs[hostname] = host_dir
+
+        if ds is None:
+            yield host_dir
+            continue
+
+        try:
+            filename = filenames[ds]
+        except KeyError:
+            filename = _get_rrd_filename(ds)
+            filenames[ds] = filename
+        yield os.path.join(host_dir, filename)
+
+def parse_rrd_path(path, base_dir=None, path_mode="flat",
+                   path_depth=2, path_width=1):
+    """
+    Retrouve l'hôte et la source de données associés à un fichier RRD.
+    Il s'agit de l'opération inverse de L{get_rrd_path}.
+
+    @param path: Chemin vers le fichier RRD.
+    @type path: C{str}
+    @param base_dir: Dossier racine des fichiers RRD.
+    @type base_dir: C{str}
+    @param path_mode: Mode de répartition des fichiers
+        ("flat", "name" ou "hash").
+    @type path_mode: C{str}
+    @param path_depth: Nombre de niveaux de sous-dossiers intermédiaires
+        dans les modes "name" et "hash".
+    @type path_depth: C{int}
+    @param path_width: Nombre de caractères ajoutés à chaque niveau
+        de sous-dossiers intermédiaires.
+    @type path_width: C{int}
+    @return: Le couple (hôte, source de données), encodés en UTF-8,
+        ou C{None} si le chemin ne correspond pas à un fichier RRD
+        rangé selon le mode de répartition indiqué.
+    @rtype: C{tuple} ou C{None}
+    """
+    if base_dir is None:
+        base_dir = _DEFAULT_RRD_DIR
+    prefix = os.path.join(base_dir, "")
+    if not path.startswith(prefix):
+        return None
+    return _parse_rrd_parts(path[len(prefix):].split(os.sep), path_mode,
+                            path_depth, path_width)
+
+def _parse_rrd_parts(parts, path_mode, path_depth, path_width):
+    """
+    Analyse les composantes d'un chemin relatif au dossier racine
+    des fichiers RRD (cf. L{parse_rrd_path}).
+    """
+    if len(parts) < 2 or not parts[-1].endswith(".rrd"):
+        return None
+    hostname = urllib.unquote_plus(parts[-2])
+    ds = urllib.unquote_plus(parts[-1][:-4])
+    if not hostname or not ds:
+        return None
+    if parts[:-2] != _get_rrd_subdirs(hostname, path_mode,
+                                      path_depth, path_width):
+        return None
+    return (hostname, ds)
+
+def _scan_dir(path):
+    """
+    Parcourt le contenu d'un dossier sans construire la liste
+    complète de ses entrées lorsque C{scandir} est disponible.
+
+    @param path: Dossier à parcourir.
+    @type path: C{str}
+    @return: Générateur de tuples (nom, chemin, dossier?, stat), où
+        C{stat} est une fonction retournant les informations sur l'entrée
+        (sans suivre les liens symboliques).
+    @rtype: C{generator}
+    """
+    if _scandir is not None:
+        for entry in _scandir(path):
+            yield (entry.name, entry.path,
+                   entry.is_dir(follow_symlinks=False),
+                   lambda entry=entry: entry.stat(follow_symlinks=False))
+        return
+
+    for name in os.listdir(path):
+        full_path = os.path.join(path, name)
+        try:
+            st = os.lstat(full_path)
+        except OSError:
+            continue
+        yield (name, full_path, stat.S_ISDIR(st.st_mode),
+               lambda st=st: st)
+
+def iter_rrd_files(base_dir=None, path_mode="flat",
+                   path_depth=2, path_width=1):
+    """
+    Parcourt l'arborescence des fichiers RRD et retourne, au fil de l'eau,
+    des informations sur chaque fichier RRD rencontré.
+
+    Seuls les fichiers rangés conformément au mode de répartition indiqué
+    sont retournés ; les autres fichiers sont ignorés.
+
+    @param base_dir: Dossier racine des fichiers RRD.
+    @type base_dir: C{str}
+    @param path_mode: Mode de répartition des fichiers
+        ("flat", "name" ou "hash").
+    @type path_mode: C{str}
+    @param path_depth: Nombre de niveaux de sous-dossiers intermédiaires
+        dans les modes "name" et "hash".
+    @type path_depth: C{int}
+    @param path_width: Nombre de caractères ajoutés à chaque niveau
+        de sous-dossiers intermédiaires.
+    @type path_width: C{int}
+    @return: Générateur de tuples (hôte, source de données, chemin,
+        taille, date de dernière modification).
+    @rtype: C{generator}
+    """
+    _check_fan_out(path_depth, path_width)
+    if base_dir is None:
+        base_dir = _DEFAULT_RRD_DIR
+    # Profondeur maximale d'un fichier RRD dans l'arborescence :
+    # sous-dossiers intermédiaires + dossier de l'hôte + fichier.
+    if path_mode == "flat":
+        max_depth = 2
+    else:
+        max_depth = path_depth + 2
+
+    stack = [(_scan_dir(base_dir), [])]
+    while stack:
+        entries, parents = stack[-1]
+        try:
+            name, path, is_dir, get_stat = entries.next()
+        except StopIteration:
+            stack.pop()
+            continue
+        except OSError:
+            # Dossier supprimé ou inaccessible pendant le parcours.
+            stack.pop()
+            continue
+
+        parts = parents + [name]
+        if is_dir:
+            if len(parts) < max_depth:
+                stack.append((_scan_dir(path), parts))
+            continue
+
+        res = _parse_rrd_parts(parts, path_mode, path_depth, path_width)
+        if res is None:
+            continue
+        try:
+            st = get_stat()
+        except OSError:
+            continue
+        yield (res[0], res[1], path, st.st_size, st.st_mtime)
 
 def parse_path(path):
     """
@@ -56,8 +386,6 @@ def parse_path(path):
         d'accès valide.
     @rtype: C{list} ou C{None}
     """
-    parts = []
-
     # On refuse les chemins d'accès vides.
     if not path:
         return None
@@ -65,39 +393,21 @@ def parse_path(path):
     absolute = (path[0] == '/')
     if absolute:
         path = path[1:]
-    it = iter(path)
-
-    try:
-        portion = ""
-        while True:
-            ch = it.next()
-            # Il s'agit d'une séquence d'échappement.
-            if ch == '\\':
-                ch = it.next()
-                # Les seules séquences reconnus sont "\\" et "\/"
-                # pour échapper le caractère d'échappement et le
-                # séparateur des composantes du chemin respectivement.
-                if ch == '/' or ch == '\\':
-                    portion += ch
-                else:
-                    return None
-            # Il s'agit d'un séparateur de chemins.
-            elif ch == '/':
-                if not portion:
-                    return None
-                parts.append(portion)
-                portion = ""
-            # Il s'agit d'un autre caractère (quelconque).
-            else:
-                portion += ch
-    except StopIteration:
-        if portion:
-            parts.append(portion)
 
-    # Permet de traiter correctement
-    # le cas où le chemin est '/'.
-    if not parts:
-        return None
+    if '\\' in path:
+        parts = _split_escaped_path(path)
+        if parts is None:
+            return None
+    else:
+        # Cas le plus courant : aucune séquence d'échappement,
+        # un simple découpage suffit.
+        parts = path.split('/')
+        # On ignore le "/" final éventuel.
+        if not parts[-1]:
+            parts.pop()
+        # Composante vide (ex : "/A//B") ou chemin vide (ex : "/").
+        if not parts or '' in parts:
+            return None
 
     # Un chemin relatif ne peut pas
     # contenir plusieurs composantes.
@@ -105,3 +415,107 @@ def parse_path(path):
         return None
 
     return parts
+
+def _split_escaped_path(path):
+    """
+    Découpe un chemin d'accès contenant des séquences d'échappement
+    en ses composantes, en une seule passe.
+
+    @param path: Chemin d'accès, sans le "/" initial.
+    @type path: C{basestr}
+    @return: Composantes du chemin ou C{None} si le chemin
+        est invalide.
+    @rtype: C{list} ou C{None}
+    """
+    parts = []
+    portion = []
+    for text, escaped, sep, invalid in _PATH_TOKENS.findall(path):
+        if text:
+            portion.append(text)
+        # Les seules séquences reconnues sont "\\" et "\/"
+        # pour échapper le caractère d'échappement et le
+        # séparateur des composantes du chemin respectivement.
+        elif escaped:
+            portion.append(escaped)
+        elif sep:
+            if not portion:
+                return None
+            parts.append(''.join(portion))
+            portion = []
+        # Un caractère d'échappement isolé en fin de chemin est ignoré.
+        elif invalid != '\\':
+            return None
+    if portion:
+        parts.append(''.join(portion))
+    # Permet de traiter correctement
+    # le cas où le chemin est '/'.
+    if not parts:
+        return None
+    return parts
+
+def parse_paths(paths):
+    """
+    Analyse un ensemble de chemins d'accès en un seul appel.
+
+    Le résultat est équivalent à un appel à L{parse_path} pour chacun
+    des chemins, mais le cas le plus courant (chemin absolu sans séquence
+    d'échappement) est traité directement dans la boucle d'analyse.
+
+    @param paths: Chemins d'accès à analyser.
+    @type paths: C{iterable} de C{basestr}
+    @return: Un couple dont le premier élément est la liste
+        des composantes de chaque chemin (dans l'ordre des chemins fournis,
+        avec C{None} à la place des chemins invalides) et le second
+        la liste des indices des chemins invalides.
+    @rtype: C{tuple}
+    """
+    parsed = []
+    invalid = []
+    append = parsed.append
+    for index, path in enumerate(paths):
+        if path and path[0] == '/' and '\\' not in path:
+            parts = path[1:].split('/')
+            if not parts[-1]:
+                parts.pop()
+            if not parts or '' in parts:
+                parts = None
+        else:
+            parts = parse_path(path)
+        if parts is None:
+            invalid.append(index)
+        append(parts)
+    return (parsed, invalid)
+
+def format_path(parts):
+    """
+    Construit un chemin d'accès absolu à partir de ses composantes.
+    Il s'agit de l'opération inverse de L{parse_path}.
+
+    @param parts: Composantes du chemin d'accès.
+    @type parts: C{list}
+    @return: Chemin d'accès, dans lequel les caractères "/" et "\\"
+        des composantes ont été échappés.
+    @rtype: C{basestr}
+    @raise ValueError: Aucune composante n'a été fournie
+        ou l'une d'elles est vide.
+    """
+    if not parts or not all(parts):
+        raise ValueError("Path components must not be empty")
+    return '/' + '/'.join([
+        part.replace('\\', '\\\\').replace('/', '\\/')
+        for part in parts
+    ])
+
+def format_paths(parts_list):
+    """
+    Construit un ensemble de chemins d'accès à partir de leurs composantes
+    (cf. L{format_path}).
+
+    @param parts_list: Composantes de chacun des chemins.
+    @type parts_list: C{iterable} de C{list}
+    @return: Liste des chemins d'accès, dans le même ordre.
+    @rtype: C{list}
+    @raise ValueError: L'un des chemins n'a aucune composante
+        ou possède une composante vide.
+    """
+    return [format_path(parts) for parts in parts_list]
@@ -37,9 +37,37 @@ C{settings.load_module("vigilo.connector")} looks for:
 If you define VIGILO_SETTINGS to a valid filename, it will override the
 search mechanism and be used instead.
 
+If you define VIGILO_SETTINGS_CACHE to a writable directory, the merged
+and validated settings are stored there in a compact binary form and
+reused by later processes as long as none of the source files changed.
+The distributions resolved by setup_plugins_path() are cached there too.
+
+If you define VIGILO_SETTINGS_WORKERS to a number greater than 1, the files
+of large included directories are parsed concurrently by that many
+processes during the initial load_module() (they are still merged in
+alphabetical order). Reloads are always sequential.
+
+If you define VIGILO_SETTINGS_LAZY to a non-empty value, only the top-level
+values and the [include] section of each file are parsed at load time.
+The other sections are located in the files and parsed (and validated)
+the first time they are accessed.
+
 Command-line usage::
     conntype=$(python -m vigilo.common.conf --get MEMCACHE_CONN_TYPE)
 
+Several settings (or whole sections) can be read in a single invocation::
+    eval "$(vigilo-config -f shell -q bus:host -q bus:port -d database)"
+
+Components that fork or spawn workers can share the merged settings
+instead of having each worker parse the files::
+    settings.publish_shared('/dev/shm/vigilo-correlator.settings')  # parent
+    settings.attach_shared('/dev/shm/vigilo-correlator.settings')   # workers
+Workers deserialize only the sections they use, and pick up the settings
+published after a reload when reload() is called (see SettingsWatcher).
+
+The vigilo-config command forwards its queries to the settings server
+(vigilo-config-server, see L{vigilo.common.confserver}) when it is running.
+
 We can't import any other Vigilo code here.
 This is because Vigilo code may log or require settings for some other reason.
 """
@@ -47,20 +75,75 @@ This is because Vigilo code may log or require settings for some other reason.
 from __future__ import absolute_import, print_function
 
 import os
+import re
 import sys
 import os.path
 import glob
+import codecs
+import time
+import marshal
+import hashlib
+import tempfile
+import itertools
+import threading
+import collections
+import multiprocessing
 
 import pkg_resources
 
-from configobj import ConfigObj, ParseError
+from configobj import ConfigObj, ParseError, ConfigObjError, ConfigspecError
 from validate import Validator
 
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None # pylint: disable-msg=C0103
+
 from vigilo.common.gettext import translate
+from vigilo.common.confshm import SharedSegment, publish
+from vigilo.common.confclient import SETTINGS_PATHS, get_settings_files
 _ = translate(__name__)
 
 
-__all__ = ( 'settings', )
+__all__ = ( 'settings', 'SettingsWatcher' )
+
+# Marqueur utilisé pour les valeurs absentes.
+_MISSING = object()
+# Marqueur utilisé pour les sections pas encore analysées (mode paresseux).
+_UNLOADED = object()
+
+# Configspecs déjà analysées, indexées par chemin :
+# (empreinte, configspec).
+_configspecs = {}
+_configspecs_lock = threading.Lock()
+# Le validateur conserve en cache l'analyse des fonctions de vérification
+# de la configspec : il est donc partagé entre toutes les validations.
+_validator = Validator()
+
+# Numéros de génération de la configuration
+# (cf. VigiloConfigObj.generation).
+_generations = itertools.count(1)
+# Nombre minimum de fichiers d'un dossier inclus à analyser pour que
+# l'analyse soit parallélisée (cf. VigiloConfigObj._prefetch). Mesuré avec
+# benchmarks/bench_settings_includes.py : le démarrage des processus coûte
+# environ 110 ms et le transfert des résultats 1,4 ms par fichier, pour
+# 4,4 ms d'analyse ; avec 2 processus, le gain n'apparaît qu'au-delà
+# d'environ 125 fichiers.
+_PREFETCH_MIN_FILES = 128
+# Classes des vues typées, indexées par (section, champs).
+_view_classes = {}
+# Conversions prédéfinies des vues typées, à partir des méthodes
+# de configobj.Section (C{bool("no")} vaut C{True}, par exemple).
+_view_converters = {
+    'str': lambda section, key: str(section[key]),
+    'int': lambda section, key: section.as_int(key),
+    'float': lambda section, key: section.as_float(key),
+    'bool': lambda section, key: section.as_bool(key),
+    'list': lambda section, key: section.as_list(key),
+}
+# Les types natifs sont acceptés en lieu et place des noms.
+_view_converters.update((conv_type, _view_converters[conv_type.__name__])
+                        for conv_type in (str, int, float, bool, list))
 
 # pylint: disable-msg=C0103
 
@@ -142,6 +225,294 @@ class _KeywordWrapper(object):
             self.key_name = res.groups()[1]
         return res
 
+def _fingerprint(path):
+    """
+    Retourne l'empreinte d'un fichier ou d'un dossier, qui change dès que
+    son contenu est modifié (ou, pour un dossier, que des fichiers y sont
+    ajoutés ou supprimés).
+
+    @param path: Chemin vers le fichier ou le dossier.
+    @type path: C{str}
+    @return: Date de modification, taille et numéro d'inode,
+        ou C{None} si le chemin n'existe pas.
+    @rtype: C{tuple}
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime, st.st_size, st.st_ino)
+
+def _write_cache(cache_file, data):
+    """
+    Enregistre un fichier de cache de manière atomique, pour ne jamais
+    exposer un cache incomplet aux autres processus. Les erreurs d'écriture
+    sont ignorées : les caches sont facultatifs.
+
+    @param cache_file: Emplacement du cache.
+    @type cache_file: C{str}
+    @param data: Contenu du cache.
+    @type data: C{str}
+    """
+    try:
+        fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(cache_file),
+                                        prefix='.settings-')
+    except OSError:
+        return
+    try:
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+        os.rename(tmp_file, cache_file)
+    except OSError:
+        try:
+            os.unlink(tmp_file)
+        except OSError:
+            pass
+
+def _dump_tree(section):
+    """
+    Convertit une section de la configuration en une structure
+    sérialisable par C{marshal}, en conservant l'ordre des clés.
+
+    @param section: Section à convertir.
+    @type section: C{configobj.Section}
+    @return: Couple (valeurs, sous-sections), où chaque élément
+        est une liste de couples (clé, valeur).
+    @rtype: C{tuple}
+    """
+    scalars = []
+    for key in section.scalars:
+        value = section[key]
+        if isinstance(value, list):
+            value = list(value)
+        scalars.append((key, value))
+    sections = [(key, _dump_tree(section[key])) for key in section.sections]
+    return (scalars, sections)
+
+def _merge_tree(section, tree):
+    """
+    Fusionne une structure produite par L{_dump_tree} dans une section,
+    avec la même sémantique que C{ConfigObj.merge}.
+
+    @param section: Section dans laquelle les valeurs sont fusionnées.
+    @type section: C{configobj.Section}
+    @param tree: Structure produite par L{_dump_tree}.
+    @type tree: C{tuple}
+    """
+    scalars, sections = tree
+    # On évite de partager les listes entre plusieurs sections.
+    scalars = [(key, list(value) if isinstance(value, list) else value)
+               for key, value in scalars]
+    if not section:
+        # Section vide (cas le plus courant) : on reproduit directement
+        # l'effet de Section.__setitem__ pour des valeurs simples (chaînes
+        # et listes, seules valeurs produites par _dump_tree), ce qui est
+        # nettement plus rapide qu'une affectation clé par clé.
+        keys = [key for key, _value in scalars]
+        dict.update(section, scalars)
+        section.scalars.extend(keys)
+        section.comments.update((key, []) for key in keys)
+        section.inline_comments.update((key, '') for key in keys)
+    else:
+        for key, value in scalars:
+            section[key] = value
+    for key, subtree in sections:
+        if not isinstance(section.get(key), dict):
+            section[key] = {}
+        _merge_tree(section[key], subtree)
+
+def _reparent(section, parent, main):
+    """
+    Rattache une section (et ses sous-sections) à un autre objet
+    de configuration.
+
+    @param section: Section à rattacher.
+    @type section: C{configobj.Section}
+    @param parent: Nouvelle section parente.
+    @type parent: C{configobj.Section}
+    @param main: Nouvel objet de configuration principal.
+    @type main: C{ConfigObj}
+    """
+    section.parent = parent
+    section.main = main
+    for key in section.sections:
+        _reparent(dict.__getitem__(section, key), section, main)
+
+def _diff_trees(old, new, path=()):
+    """
+    Compare deux versions de la configuration.
+
+    @param old: Ancienne version de la configuration.
+    @type old: C{dict}
+    @param new: Nouvelle version de la configuration.
+    @type new: C{dict}
+    @param path: Chemin vers les sections comparées.
+    @type path: C{tuple}
+    @return: Liste triée des clés modifiées, ajoutées ou supprimées,
+        sous la forme de tuples (section, ..., clé).
+    @rtype: C{list}
+    """
+    changes = []
+    for key in set(old) | set(new):
+        old_value = old.get(key, _MISSING)
+        new_value = new.get(key, _MISSING)
+        if isinstance(old_value, dict) and isinstance(new_value, dict):
+            changes.extend(_diff_trees(old_value, new_value, path + (key, )))
+        elif old_value != new_value:
+            changes.append(path + (key, ))
+    changes.sort()
+    return changes
+
+def _get_configspec(path):
+    """
+    Retourne la configspec analysée stockée dans un fichier.
+    Le résultat est conservé tant que le fichier n'est pas modifié.
+
+    @param path: Chemin vers la configspec.
+    @type path: C{str}
+    @return: La configspec, ou C{None} si le fichier n'existe pas.
+    @rtype: C{ConfigObj}
+    @raise ConfigspecError: La configspec n'a pas pu être analysée.
+    """
+    fingerprint = _fingerprint(path)
+    if fingerprint is None:
+        return None
+    with _configspecs_lock:
+        cached = _configspecs.get(path)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+        try:
+            configspec = ConfigObj(path, raise_errors=True, file_error=True,
+                                   _inspec=True)
+        except ConfigObjError as e:
+            raise ConfigspecError('Parsing configspec failed: %s' % e)
+        _configspecs[path] = (fingerprint, configspec)
+        return configspec
+
+def _index_sections(lines):
+    """
+    Repère les sections de premier niveau d'un fichier de configuration,
+    sans analyser leur contenu.
+
+    @param lines: Lignes du fichier.
+    @type lines: C{list}
+    @return: Liste de triplets (nom de la section, indice de la ligne
+        d'en-tête, indice de la ligne suivant la fin de la section).
+    @rtype: C{list}
+    """
+    starts = []
+    quote = None
+    for index, line in enumerate(lines):
+        if quote is not None:
+            # Valeur multi-lignes : on ignore son contenu,
+            # qui pourrait ressembler à un en-tête de section.
+            if quote in line:
+                quote = None
+            continue
+        # Tests préalables peu coûteux, afin de n'appliquer les expressions
+        # régulières qu'aux lignes susceptibles de correspondre.
+        if '[' in line:
+            match = ConfigObj._sectionmarker.match(line)
+            if match is not None:
+                sect_open, sect_name = match.groups()[1:3]
+                if sect_open.count('[') == 1:
+                    if len(sect_name) > 1 and sect_name[0] == sect_name[-1] \
+                            and sect_name[0] in ('"', "'"):
+                        sect_name = sect_name[1:-1]
+                    starts.append((sect_name, index))
+                continue
+        if '"""' not in line and "'''" not in line:
+            continue
+        match = ConfigObj._keyword.match(line)
+        if match is not None:
+            value = match.group(3)
+            if value[:3] in ('"""', "'''") and value.find(value[:3], 3) == -1:
+                quote = value[:3]
+    ends = [index for _name, index in starts[1:]] + [len(lines)]
+    return [(name, start, end) for (name, start), end in zip(starts, ends)]
+
+def _split_sections(lines):
+    """
+    Découpe un fichier de configuration en un en-tête, regroupant les
+    valeurs de premier niveau et la section C{include}, et des sections.
+
+    @param lines: Lignes du fichier.
+    @type lines: C{list}
+    @return: Couple contenant les lignes de l'en-tête et la liste des
+        sections du fichier, y compris C{include} (cf. L{_index_sections}).
+    @rtype: C{tuple}
+    """
+    sections = _index_sections(lines)
+    head = lines[:sections[0][1]] if sections else lines[:]
+    for name, start, end in sections:
+        if name == 'include':
+            head.extend(lines[start:end])
+    return (head, sections)
+
+def _spec_sections(configspec):
+    """
+    Retourne les sections de premier niveau d'une configspec qui
+    sont créées par la validation lorsqu'elles sont absentes.
+    """
+    return [name for name in configspec.sections
+            if name not in ('include', '__many__', '___many___')]
+
+def _read_fragment(filename, ranges, bom):
+    """
+    Lit des portions d'un fichier de configuration.
+
+    @param filename: Fichier à lire.
+    @type filename: C{str}
+    @param ranges: Positions (début, fin) des portions à lire.
+    @type ranges: C{list}
+    @param bom: Marque d'ordre des octets du fichier, reproduite
+        en tête des données afin qu'elles soient décodées
+        de la même manière que le fichier complet.
+    @type bom: C{str}
+    @return: Lignes lues.
+    @rtype: C{list}
+    """
+    chunks = [bom]
+    with open(filename, 'rb') as f:
+        for start, end in ranges:
+            f.seek(start)
+            chunks.append(f.read(end - start))
+    return ''.join(chunks).splitlines(True)
+
+def _parse_fragment(lines, configspec, names):
+    """
+    Analyse une portion d'un fichier de configuration et la valide.
+
+    La portion est validée à l'aide de la configspec complète du fichier,
+    mais seul le résultat de la validation des clés et des sections
+    demandées est pris en compte.
+
+    @param lines: Lignes à analyser.
+    @type lines: C{list}
+    @param configspec: Configspec associée au fichier, ou C{None}.
+    @type configspec: C{ConfigObj}
+    @param names: Clés ou sections de premier niveau à valider.
+    @type names: C{list}
+    @return: La configuration obtenue.
+    @rtype: L{VigiloConfigObj}
+    """
+    if configspec is None:
+        return VigiloConfigObj(lines, raise_errors=True, interpolation=False)
+
+    config = VigiloConfigObj(lines, raise_errors=True,
+                             configspec=configspec, interpolation=False)
+    valid = config.validate(_validator)
+    if valid is not True:
+        for name in names:
+            if name not in configspec:
+                continue
+            if valid is False or valid.get(name, True) is not True:
+                raise SyntaxError('Invalid value in configuration')
+    return config
+
+
 class VigiloConfigObj(ConfigObj):
     """
     Une classe permettant de gérer la configuration de Vigilo.
@@ -155,69 +526,440 @@ class VigiloConfigObj(ConfigObj):
         http://code.google.com/p/configobj/issues/detail?id=19
     """
 
-    paths = [
-        '/etc/vigilo/%s',
-        '~/.vigilo/%s',
-        './%s',
-    ]
+    paths = list(SETTINGS_PATHS)
     filenames = []
 
+    #: Dossier dans lequel la configuration fusionnée est mise en cache
+    #: par L{load_module}, ou C{None} pour désactiver ce cache.
+    cache_dir = os.environ.get('VIGILO_SETTINGS_CACHE') or None
+
+    #: Chargement paresseux : les sections ne sont analysées et validées
+    #: que lors de leur premier accès.
+    lazy = bool(os.environ.get('VIGILO_SETTINGS_LAZY'))
+
+    #: Nombre de processus utilisés par L{load_module} pour analyser
+    #: en parallèle les fichiers d'un dossier inclus volumineux
+    #: (0 ou 1 pour une analyse séquentielle).
+    include_workers = int(os.environ.get('VIGILO_SETTINGS_WORKERS') or 0)
+
     # Wrappers autour de ConfigObj pour désactiver la détection des listes
     # pour la clé "args" dans la configuration d'un handler.
     _sectionmarker = _SectionWrapper()
     _keyword = _KeywordWrapper()
 
+    # pylint: disable-msg=W0201
+    # W0201: Attribute 'foo' defined outside __init__
+    def _initialise(self, options=None):
+        """
+        Initialise l'état de l'objet. Cette méthode est appelée
+        par ConfigObj à la création de l'objet et par L{reset}.
+        """
+        super(VigiloConfigObj, self)._initialise(options)
+        self.filenames = []
+        # Fichiers et dossiers dont dépend la configuration chargée
+        # (fichiers chargés, configspecs, inclusions).
+        self._sources = []
+        # Fichiers chargés explicitement (hors inclusions).
+        self._roots = []
+        # Résultat de l'analyse de chaque fichier, indexé par le nom
+        # du fichier : (empreinte, valeurs, inclusions).
+        self._parsed = {}
+        # Portions des fichiers restant à analyser pour chaque section
+        # (en mode paresseux), dans l'ordre de fusion.
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        # Configuration partagée à laquelle l'objet est attaché
+        # (cf. L{attach_shared}).
+        self._shared = None
+        # Processus d'analyse en parallèle (cf. L{_prefetch}), utilisables
+        # uniquement pendant L{load_module}.
+        self._prefetch_enabled = False
+        self._pool = None
+        self._invalidate_views()
+
+    def _invalidate_views(self):
+        """
+        Invalide les vues typées (cf. L{typed_view}) après une modification
+        de la configuration, et change le numéro de génération.
+        """
+        self._views = {}
+        self.generation = next(_generations)
+
+    def __getitem__(self, key):
+        if key in self._pending:
+            self._materialise(key)
+        return super(VigiloConfigObj, self).__getitem__(key)
+
+    def __setitem__(self, key, value, unrepr=False):
+        # Une valeur affectée explicitement remplace celle des fichiers.
+        self._pending.pop(key, None)
+        super(VigiloConfigObj, self).__setitem__(key, value, unrepr)
+
+    def __delitem__(self, key):
+        self._pending.pop(key, None)
+        super(VigiloConfigObj, self).__delitem__(key)
+
     def load_file(self, filename):
         """
         Charge un fichier de configuration
         """
         if filename in self.filenames:
             return # Double appel à load_file, ou boucle d'include
-
-        configspec = filename[:-4] + '.spec'
+        self._roots.append(filename)
         try:
-            if os.path.exists(configspec):
-                config = VigiloConfigObj(filename, file_error=True,
-                    raise_errors=True, configspec=configspec,
-                    interpolation=False)
+            self._load_file(filename)
+        finally:
+            self._invalidate_views()
 
-                validator = Validator()
-                valid = config.validate(validator)
-                if not valid:
-                    raise SyntaxError('Invalid value in configuration')
+    def _load_file(self, filename):
+        """
+        Charge un fichier de configuration ainsi que les fichiers
+        qu'il inclut.
+        """
+        if filename in self.filenames:
+            return # Boucle d'include
 
+        configspec = filename[:-4] + '.spec'
+        self._sources.extend([filename, configspec])
+        fragments = None
+        try:
+            if self.lazy:
+                config, includes, fragments = \
+                    self._index_file(filename, configspec)
             else:
-                config = VigiloConfigObj(filename, file_error=True,
-                    raise_errors=True, interpolation=False)
+                config, includes = self._parse_file(filename, configspec)
         except IOError:
-            pass
+            return
         except ParseError as e:
             raise ConfigParseError(e, filename)
+
+        self.filenames.append(filename)
+        for include in includes:
+            if not include:
+                # cas d'une valeur vide que le as_list traduit en ['']
+                continue
+            self._sources.append(include)
+            if not os.path.exists(include):
+                print("Can't find included file: %s" % include)
+                continue
+            if os.path.isdir(include):
+                # On inclut tous les fichiers INI du dossier pointé
+                # par le motif dans "include" (par ordre alphabétique).
+                # Les valeurs s'ajoutent, mais en cas de doublon,
+                # les valeurs du dernier fichier chargé écrasent
+                # celles des fichiers précédemment chargés.
+                included_files = glob.glob(os.path.join(include, '*.ini'))
+                included_files.sort()
+                if self._prefetch_enabled:
+                    self._prefetch(included_files)
+                for included_file in included_files:
+                    self._load_file(included_file)
+            else:
+                self._load_file(include)
+
+        if isinstance(config, ConfigObj):
+            self.merge(config)
+        else:
+            _merge_tree(self, config)
+        if fragments is not None:
+            for name, fragment in fragments:
+                if not isinstance(dict.get(self, name), dict):
+                    self[name] = {}
+                self._pending.setdefault(name, []).append(fragment)
+
+    def _parse_file(self, filename, configspec):
+        """
+        Analyse un fichier de configuration, en réutilisant le résultat
+        d'une analyse précédente si ni le fichier ni sa configspec n'ont
+        été modifiés depuis.
+
+        @param filename: Fichier de configuration à analyser.
+        @type filename: C{str}
+        @param configspec: Configspec associée au fichier.
+        @type configspec: C{str}
+        @return: Couple contenant la configuration (un objet C{ConfigObj},
+            ou une structure produite par L{_dump_tree} si le fichier
+            n'a pas été modifié) et la liste des inclusions déclarées
+            par le fichier.
+        @rtype: C{tuple}
+        """
+        fingerprint = (_fingerprint(filename), _fingerprint(configspec))
+        cached = self._parsed.get(filename)
+        if cached is not None and cached[0] == fingerprint:
+            return (cached[1], cached[2])
+
+        spec = _get_configspec(configspec)
+        if spec is None:
+            config = VigiloConfigObj(filename, file_error=True,
+                raise_errors=True, interpolation=False)
+            digests = None
+
+        else:
+            with open(filename, 'rb') as f:
+                lines = f.readlines()
+            # Empreinte du contenu de chaque section, afin de ne valider
+            # que les sections modifiées lors d'une prochaine analyse.
+            head, sections = _split_sections(lines)
+            digests = {None: hashlib.md5(''.join(head)).digest()}
+            for name, start, end in sections:
+                if name != 'include':
+                    digests[name] = hashlib.md5(
+                        ''.join(lines[start:end])).digest()
+            # Les sections en double (erreur de syntaxe) ou la présence
+            # d'une marque d'ordre des octets imposent une analyse complète.
+            names = [name for name, _start, _end in sections]
+            simple = len(set(names)) == len(names) and \
+                not (lines and lines[0].startswith(codecs.BOM_UTF8))
+
+            if simple and cached is not None and cached[3] is not None \
+                    and cached[0][1] == fingerprint[1]:
+                tree, includes = self._parse_changed_sections(
+                    lines, head, sections, digests, spec, cached)
+                self._parsed[filename] = (fingerprint, tree, includes,
+                                          digests)
+                return (tree, includes)
+
+            config = VigiloConfigObj(lines, raise_errors=True,
+                configspec=spec, interpolation=False)
+            valid = config.validate(_validator)
+            if not valid:
+                raise SyntaxError('Invalid value in configuration')
+
+        includes = []
+        if "include" in config.sections:
+            includes = config["include"].as_list("include")
+        self._parsed[filename] = (fingerprint, _dump_tree(config), includes,
+                                  digests)
+        return (config, includes)
+
+    def _parse_changed_sections(self, lines, head, sections, digests,
+                                configspec, cached):
+        """
+        Analyse à nouveau un fichier de configuration modifié, en ne
+        validant que les sections dont le contenu a changé depuis l'analyse
+        précédente (la configspec étant inchangée). Les autres sections
+        sont reprises telles quelles du résultat de l'analyse précédente.
+
+        @param lines: Lignes du fichier.
+        @type lines: C{list}
+        @param head: En-tête du fichier (cf. L{_split_sections}).
+        @type head: C{list}
+        @param sections: Sections du fichier (cf. L{_split_sections}).
+        @type sections: C{list}
+        @param digests: Empreinte du contenu de l'en-tête et des sections.
+        @type digests: C{dict}
+        @param configspec: Configspec associée au fichier.
+        @type configspec: C{ConfigObj}
+        @param cached: Résultat de l'analyse précédente du fichier.
+        @type cached: C{tuple}
+        @return: Couple contenant la configuration (sous la forme d'une
+            structure produite par L{_dump_tree}) et la liste des inclusions
+            déclarées par le fichier.
+        @rtype: C{tuple}
+        """
+        old_scalars, old_sections = cached[1]
+        old_sections = dict(old_sections)
+        old_digests = cached[3]
+
+        if digests[None] == old_digests[None]:
+            scalars = old_scalars
+            includes = cached[2]
+            include = old_sections.get('include')
         else:
-            self.filenames.append(filename)
+            config = _parse_fragment(head, configspec,
+                                     ['include'] + configspec.scalars)
+            scalars = _dump_tree(config)[0]
+            includes = []
+            include = None
             if "include" in config.sections:
                 includes = config["include"].as_list("include")
-                for include in includes:
-                    if not include:
-                        # cas d'une valeur vide que le as_list traduit en ['']
-                        continue
-                    if not os.path.exists(include):
-                        print("Can't find included file: %s" % include)
+                include = _dump_tree(config["include"])
+
+        tree = []
+        for name, start, end in sections:
+            if name == 'include':
+                if include is not None:
+                    tree.append((name, include))
+            elif old_digests.get(name) == digests[name] and \
+                    name in old_sections:
+                tree.append((name, old_sections[name]))
+            else:
+                config = _parse_fragment(lines[start:end], configspec, [name])
+                tree.append((name, _dump_tree(config[name])))
+        for name in _spec_sections(configspec):
+            if name in digests:
+                continue
+            if name not in old_digests and name in old_sections:
+                # Section créée à partir des valeurs par défaut.
+                tree.append((name, old_sections[name]))
+            else:
+                config = _parse_fragment([], configspec, [name])
+                if name in config.sections:
+                    tree.append((name, _dump_tree(config[name])))
+        return ((scalars, tree), includes)
+
+    def _index_file(self, filename, configspec):
+        """
+        Indexe un fichier de configuration en vue de son chargement
+        paresseux : seules les valeurs de premier niveau et la section
+        C{include} sont analysées, les autres sections sont simplement
+        repérées dans le fichier (cf. L{_materialise}).
+
+        @param filename: Fichier de configuration à indexer.
+        @type filename: C{str}
+        @param configspec: Configspec associée au fichier.
+        @type configspec: C{str}
+        @return: Triplet contenant la configuration analysée,
+            la liste des inclusions déclarées par le fichier et la liste
+            des sections restant à analyser, sous la forme de couples
+            (nom de la section, portion du fichier).
+        @rtype: C{tuple}
+        """
+        fingerprint = _fingerprint(filename)
+        with open(filename, 'rb') as f:
+            lines = f.readlines()
+        bom = ''
+        if lines and lines[0].startswith(codecs.BOM_UTF8):
+            bom = codecs.BOM_UTF8
+        offsets = [len(bom)]
+        for line in lines:
+            offsets.append(offsets[-1] + len(line))
+        if bom:
+            lines[0] = lines[0][len(bom):]
+
+        spec = _get_configspec(configspec)
+        head, sections = _split_sections(lines)
+        ranges = {}
+        names = []
+        for name, start, end in sections:
+            if name == 'include':
+                continue
+            if name not in ranges:
+                names.append(name)
+                ranges[name] = []
+            ranges[name].append((offsets[start], offsets[end]))
+        if spec is not None:
+            # Sections présentes uniquement dans la configspec,
+            # créées avec leurs valeurs par défaut lors de la validation.
+            for name in _spec_sections(spec):
+                if name not in ranges:
+                    names.append(name)
+                    ranges[name] = []
+
+        head_names = ['include']
+        if spec is not None:
+            head_names.extend(spec.scalars)
+        if bom and head:
+            head[0] = bom + head[0]
+        config = _parse_fragment(head, spec, head_names)
+        for name in config.sections[:]:
+            if name != 'include':
+                del config[name]
+        includes = []
+        if "include" in config.sections:
+            includes = config["include"].as_list("include")
+        fragments = [(name, (filename, fingerprint, ranges[name], spec, bom))
+                     for name in names]
+        return (config, includes, fragments)
+
+    def _materialise(self, name):
+        """
+        Analyse et valide une section chargée en mode paresseux,
+        à partir des portions de fichiers qui la définissent.
+
+        @param name: Nom de la section.
+        @type name: C{str}
+        @raise ConfigParseError: La section n'a pas pu être analysée.
+        """
+        with self._pending_lock:
+            fragments = self._pending.get(name)
+            if fragments is None:
+                return # Section analysée entre-temps par un autre thread.
+            section = dict.get(self, name)
+            for fragment in fragments:
+                if isinstance(fragment[0], SharedSegment):
+                    segment, offset, length = fragment
+                    if isinstance(section, dict):
+                        _merge_tree(section, segment.read(offset, length))
+                    continue
+                filename, fingerprint, ranges, spec, bom = fragment
+                if _fingerprint(filename) != fingerprint:
+                    # Le fichier a été modifié depuis son indexation :
+                    # les positions mémorisées ne sont plus valables.
+                    ranges = []
+                    try:
+                        for other, fragment in self._index_file(
+                                filename, filename[:-4] + '.spec')[2]:
+                            if other == name:
+                                ranges = fragment[2]
+                    except IOError:
                         continue
-                    if os.path.isdir(include):
-                        # On inclut tous les fichiers INI du dossier pointé
-                        # par le motif dans "include" (par ordre alphabétique).
-                        # Les valeurs s'ajoutent, mais en cas de doublon,
-                        # les valeurs du dernier fichier chargé écrasent
-                        # celles des fichiers précédemment chargés.
-                        included_files = glob.glob(os.path.join(
-                                                   include, '*.ini'))
-                        included_files.sort()
-                        for included_file in included_files:
-                            self.load_file(included_file)
-                    else:
-                        self.load_file(include)
-            self.merge(config)
+                    except ParseError as e:
+                        raise ConfigParseError(e, filename)
+                try:
+                    config = _parse_fragment(
+                        _read_fragment(filename, ranges, bom), spec, [name])
+                except IOError:
+                    continue
+                except ParseError as e:
+                    raise ConfigParseError(e, filename)
+                if isinstance(section, dict) and name in config.sections:
+                    section.merge(config[name])
+            del self._pending[name]
+
+    def _can_prefetch(self):
+        """
+        Indique si les dossiers inclus peuvent être analysés en parallèle
+        (cf. L{_prefetch}) : uniquement si C{include_workers} le demande,
+        hors chargement paresseux, depuis le thread principal (jamais
+        depuis le thread d'un L{SettingsWatcher}) et hors d'un processus
+        démon de C{multiprocessing}, qui ne peut pas créer de processus.
+
+        @rtype: C{bool}
+        """
+        return self.include_workers > 1 and not self.lazy and \
+            not multiprocessing.current_process().daemon and \
+            isinstance(threading.current_thread(), threading._MainThread)
+
+    def _prefetch(self, filenames):
+        """
+        Analyse en parallèle les fichiers d'un dossier inclus et conserve
+        le résultat de l'analyse en vue de leur chargement. Rien n'est fait
+        en deçà de C{_PREFETCH_MIN_FILES} fichiers à analyser, le coût du
+        démarrage des processus l'emportant alors sur le gain.
+
+        Seule l'analyse est parallélisée : les fichiers sont ensuite
+        fusionnés un à un, dans l'ordre habituel, de sorte que la
+        configuration obtenue est identique à celle d'un chargement
+        séquentiel. Les fichiers dont l'analyse échoue sont ignorés ici
+        et analysés à nouveau lors de leur chargement, afin de remonter
+        l'erreur normalement.
+
+        @param filenames: Fichiers à analyser.
+        @type filenames: C{list}
+        """
+        pending = []
+        for filename in filenames:
+            if filename in self.filenames:
+                continue
+            cached = self._parsed.get(filename)
+            configspec = filename[:-4] + '.spec'
+            if cached is not None and cached[0] == \
+                    (_fingerprint(filename), _fingerprint(configspec)):
+                continue
+            pending.append(filename)
+        if len(pending) < _PREFETCH_MIN_FILES:
+            return
+
+        # Les processus sont créés au premier dossier concerné,
+        # puis réutilisés jusqu'à la fin de load_module().
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self.include_workers)
+        for filename, parsed in self._pool.imap_unordered(
+                _parse_in_worker, pending,
+                max(1, len(pending) // (4 * self.include_workers))):
+            if parsed is not None:
+                self._parsed[filename] = marshal.loads(parsed)
 
     def load_module(self, module=None, basename="settings.ini"):
         """
@@ -228,33 +970,34 @@ class VigiloConfigObj(ConfigObj):
             from vigilo.common.conf import settings
             settings.load_module(__name__)
         """
-        filenames = []
+        filenames = get_settings_files(self.paths, module, basename)
 
-        paths = [path % basename for path in self.paths]
-        filenames.extend(paths)
+        # Le cache n'est utilisé que pour un chargement initial
+        # (et jamais en mode paresseux, puisqu'il contient la configuration
+        # complète).
+        cache_file = None
+        if self.cache_dir and not self.filenames and not self.lazy:
+            cache_file = os.path.join(self.cache_dir, "settings-%s.cache" %
+                hashlib.md5(repr(filenames)).hexdigest())
+            if self._load_snapshot(cache_file, filenames):
+                return
 
-        if module:
-            module_components = module.split(".")
-            if module_components[0] == "vigilo":
-                del module_components[0]
-            if len(module_components) > 0:
-                filename = os.path.join(
-                    module_components[0].replace("_", "-"),
-                    basename)
-                paths = [path % filename for path in self.paths]
-                filenames.extend(paths)
+        self._prefetch_enabled = self._can_prefetch()
+        try:
+            for filename in filenames:
+                if not os.path.exists(filename):
+                    continue
+                self.load_file(filename)
+        finally:
+            self._prefetch_enabled = False
+            pool, self._pool = self._pool, None
+            if pool is not None:
+                pool.close()
+                pool.join()
 
-        # Si la variable VIGILO_SETTINGS a été définie,
-        # on utilise le chemin d'accès qu'elle contient.
-        env_file = os.environ.get('VIGILO_SETTINGS', None)
-        if env_file:
-            filenames.append(env_file)
+        if cache_file is not None and self.filenames:
+            self._save_snapshot(cache_file, filenames)
 
-        for filename in filenames:
-            filename = os.path.expanduser(filename)
-            if not os.path.exists(filename):
-                continue
-            self.load_file(filename)
         if not self.filenames:
             import logging as temp_logging
 
@@ -266,15 +1009,338 @@ class VigiloConfigObj(ConfigObj):
             logger.error(_("No configuration file found"))
             raise IOError(_("No configuration file found"))
 
+    def _load_snapshot(self, cache_file, candidates):
+        """
+        Charge la configuration depuis le cache, si aucun des fichiers
+        sources n'a été modifié depuis sa création.
+
+        @param cache_file: Emplacement du cache.
+        @type cache_file: C{str}
+        @param candidates: Fichiers de configuration recherchés
+            par L{load_module}.
+        @type candidates: C{list}
+        @return: C{True} si la configuration a été chargée depuis le cache.
+        @rtype: C{bool}
+        """
+        try:
+            with open(cache_file, 'rb') as f:
+                snapshot = marshal.load(f)
+        except (IOError, EOFError, ValueError, TypeError):
+            return False
+
+        try:
+            if snapshot['version'] != sys.version_info[:2]:
+                return False
+            fingerprints = [
+                [(path, _fingerprint(path)) for path in candidates],
+                [(path, _fingerprint(path)) for path in snapshot['sources']],
+            ]
+            if fingerprints != snapshot['fingerprints']:
+                return False
+            _merge_tree(self, snapshot['tree'])
+            self.filenames = list(snapshot['filenames'])
+            self._sources = list(snapshot['sources'])
+            self._roots = list(snapshot['roots'])
+        except (KeyError, IndexError, TypeError, ValueError):
+            self.reset()
+            return False
+        self._invalidate_views()
+        return True
+
+    def _save_snapshot(self, cache_file, candidates):
+        """
+        Enregistre la configuration chargée dans le cache.
+        Les erreurs d'écriture sont ignorées : le cache est facultatif.
+
+        @param cache_file: Emplacement du cache.
+        @type cache_file: C{str}
+        @param candidates: Fichiers de configuration recherchés
+            par L{load_module}.
+        @type candidates: C{list}
+        """
+        sources = []
+        for source in self._sources:
+            if source not in sources:
+                sources.append(source)
+        snapshot = {
+            'version': sys.version_info[:2],
+            'fingerprints': [
+                [(path, _fingerprint(path)) for path in candidates],
+                [(path, _fingerprint(path)) for path in sources],
+            ],
+            'sources': sources,
+            'filenames': self.filenames,
+            'roots': self._roots,
+            'tree': _dump_tree(self),
+        }
+        try:
+            data = marshal.dumps(snapshot)
+        except ValueError:
+            # Valeur non sérialisable (type inattendu dans la configuration).
+            return
+        _write_cache(cache_file, data)
+
     def reset(self):
         super(VigiloConfigObj, self).reset()
         self.filenames = []
 
     def reload(self):
-        previous_filenames = self.filenames[:]
+        """
+        Recharge la configuration à partir des fichiers précédemment
+        chargés.
+
+        Seuls les fichiers modifiés depuis leur dernier chargement sont
+        analysés à nouveau ; les valeurs des autres fichiers sont
+        réutilisées telles quelles, puis l'ensemble est fusionné dans
+        l'ordre d'origine.
+        Les fichiers ajoutés ou supprimés dans les dossiers inclus sont
+        pris en compte.
+
+        En mode paresseux, seules les sections déjà analysées sont
+        analysées à nouveau ; les sections ajoutées ou supprimées sont
+        signalées sans que leur contenu ne soit analysé. Il en va de même
+        pour une configuration partagée (cf. L{attach_shared}) : l'objet
+        est simplement attaché à la dernière configuration publiée.
+
+        @return: Liste des clés dont la valeur a changé, a été ajoutée
+            ou supprimée, sous la forme de tuples (section, ..., clé).
+        @rtype: C{list}
+        @raise ConfigParseError: L'un des fichiers n'a pas pu être analysé.
+            La configuration précédente est alors conservée.
+        """
+        previous = self._loaded_dict()
+        parsed = self._parsed
+        # La nouvelle configuration est construite à part, puis substituée
+        # à l'actuelle : les autres threads ne voient jamais une
+        # configuration partiellement chargée.
+        config = VigiloConfigObj(None, file_error=True, raise_errors=True,
+                                 interpolation=False)
+        config.lazy = self.lazy
+        config._parsed = parsed
+        if self._shared is not None:
+            config._attach(SharedSegment(self._shared.path))
+        for filename in self._roots:
+            config.load_file(filename)
+        for key, value in previous.iteritems():
+            if isinstance(value, dict) and key in config._pending:
+                config._materialise(key)
+        self._swap(config)
+        # On oublie les fichiers qui ne font plus partie de la configuration.
+        for filename in list(parsed):
+            if filename not in self.filenames:
+                del parsed[filename]
+        return _diff_trees(previous, self._loaded_dict())
+
+    def _swap(self, config):
+        """
+        Remplace le contenu de l'objet par celui d'une autre configuration.
+        Les valeurs sont remplacées en une seule opération ; seules les
+        clés qui n'existent plus sont ensuite retirées.
+
+        @param config: Configuration à reprendre.
+        @type config: L{VigiloConfigObj}
+        """
+        for key in config.sections:
+            _reparent(dict.__getitem__(config, key), self, self)
+        with self._pending_lock:
+            removed = [key for key in dict.keys(self) if key not in config]
+            dict.update(self, config)
+            (self.scalars, self.sections, self.comments,
+             self.inline_comments, self.filenames, self._sources,
+             self._roots, self._pending, self._shared) = \
+                (config.scalars, config.sections, config.comments,
+                 config.inline_comments, config.filenames, config._sources,
+                 config._roots, config._pending, config._shared)
+            for key in removed:
+                dict.pop(self, key, None)
+        self._invalidate_views()
+
+    def publish_shared(self, path, mode=0o600):
+        """
+        Publie la configuration dans un fichier afin que d'autres processus
+        puissent l'utiliser sans analyser les fichiers de configuration
+        (cf. L{attach_shared}). Pour une efficacité maximale, le fichier
+        doit se trouver sur un système de fichiers en mémoire (C{/dev/shm}).
+
+        La configuration doit être publiée à nouveau après chaque
+        rechargement, par exemple depuis une fonction de rappel
+        de L{SettingsWatcher}.
+
+        @param path: Emplacement de la configuration publiée.
+        @type path: C{str}
+        @param mode: Permissions du fichier.
+        @type mode: C{int}
+        @return: Numéro de génération de la configuration publiée.
+        @rtype: C{int}
+        @raise ValueError: La configuration contient une valeur
+            qui ne peut pas être sérialisée.
+        """
+        return publish(path, _dump_tree(self), self.filenames, mode)
+
+    def attach_shared(self, path):
+        """
+        Remplace la configuration par celle publiée par un autre processus
+        (cf. L{publish_shared}). Le fichier est projeté en mémoire en lecture
+        seule et les sections ne sont désérialisées que lors de leur premier
+        accès.
+
+        L{reload} (et donc L{SettingsWatcher}) s'attache à nouveau au fichier
+        lorsqu'une nouvelle configuration a été publiée.
+
+        @param path: Emplacement de la configuration publiée.
+        @type path: C{str}
+        @raise EnvironmentError: Le fichier n'a pas pu être ouvert.
+        @raise ValueError: Le fichier n'est pas valide.
+        """
+        segment = SharedSegment(path)
         self.reset()
-        for filename in previous_filenames:
-            self.load_file(filename)
+        try:
+            self._attach(segment)
+        finally:
+            self._invalidate_views()
+
+    def _attach(self, segment):
+        """
+        Charge la configuration publiée dans un segment partagé.
+
+        @param segment: Configuration publiée.
+        @type segment: L{SharedSegment}
+        """
+        self._shared = segment
+        self.filenames.extend(segment.filenames)
+        self._sources.append(segment.path)
+        _merge_tree(self, (segment.scalars, []))
+        for name, offset, length in segment.sections:
+            if not isinstance(dict.get(self, name), dict):
+                self[name] = {}
+            self._pending.setdefault(name, []).append(
+                (segment, offset, length))
+
+    def shared_changed(self):
+        """
+        Indique si une nouvelle configuration a été publiée depuis
+        l'appel à L{attach_shared} (ou le dernier rechargement).
+
+        @rtype: C{bool}
+        """
+        return self._shared is not None and self._shared.changed()
+
+    def typed_view(self, section, converters, defaults=None):
+        """
+        Retourne une vue typée d'une section : un C{namedtuple} dont
+        les champs contiennent les valeurs converties des clés demandées.
+
+        Les valeurs sont converties une seule fois, puis conservées jusqu'au
+        prochain chargement ou rechargement de la configuration : la lecture
+        d'une valeur se résume alors à un accès à un attribut. Les valeurs
+        par défaut sont appliquées à chaque appel (la même vue est
+        retournée tant qu'aucune d'entre elles n'est nécessaire). Une vue
+        déjà obtenue n'est jamais modifiée ; après un rechargement (que
+        l'on peut détecter grâce à l'attribut C{generation}), il suffit
+        d'appeler à nouveau cette méthode pour obtenir les nouvelles
+        valeurs. Les modifications apportées directement aux sections
+        ne sont pas répercutées.
+
+        Usage::
+            view = settings.typed_view('connector', {
+                'max_queue_size': int,
+                'debug': bool,
+            }, defaults={'debug': False})
+            if view.debug: ...
+
+        @param section: Nom de la section.
+        @type section: C{str}
+        @param converters: Conversion à appliquer à chaque clé : un type
+            (C{str}, C{int}, C{float}, C{bool}, C{list}), son nom, ou une
+            fonction recevant la valeur brute. Les booléens et les listes
+            sont interprétés comme par C{as_bool} et C{as_list}.
+            Les caractères des clés qui ne sont pas autorisés dans un nom
+            d'attribut sont remplacés par C{_} ; les noms qui restent
+            invalides (mot-clé, C{_} initial) sont remplacés par
+            C{_<position>}, comme le fait C{namedtuple(rename=True)}.
+        @type converters: C{dict}
+        @param defaults: Valeurs (non converties) des clés absentes.
+        @type defaults: C{dict}
+        @return: Vue typée de la section.
+        @rtype: C{namedtuple}
+        @raise KeyError: La section ou une clé sans valeur
+            par défaut est absente.
+        @raise ValueError: Plusieurs clés correspondent au même
+            nom d'attribut.
+        """
+        keys = sorted(converters)
+        cache_key = (section, tuple((key, converters[key]) for key in keys))
+        cached = self._views.get(cache_key)
+        if cached is None:
+            cached = self._views[cache_key] = \
+                self._build_view(section, keys, converters)
+        view, converted = cached
+        if view is not None:
+            return view
+
+        # Certaines clés sont absentes : on applique les valeurs par défaut.
+        defaults = defaults or {}
+        values = []
+        for key, value in zip(keys, converted):
+            if value is _MISSING:
+                if key not in defaults:
+                    raise KeyError(key)
+                value = defaults[key]
+            values.append(value)
+        return type(converted)(*values)
+
+    def _build_view(self, section, keys, converters):
+        """
+        Convertit les valeurs d'une section pour L{typed_view}.
+
+        @return: Couple contenant la vue (ou C{None} si certaines clés sont
+            absentes) et les valeurs converties, dans un C{namedtuple} où
+            les clés absentes valent C{_MISSING}.
+        @rtype: C{tuple}
+        """
+        fields = tuple(re.sub(r'\W', '_', key) for key in keys)
+        if len(set(fields)) != len(fields):
+            raise ValueError("Conflicting keys in typed view: %s"
+                             % ", ".join(keys))
+        view_class = _view_classes.get((section, fields))
+        if view_class is None:
+            view_class = collections.namedtuple('SettingsView', fields,
+                                                rename=True)
+            _view_classes[(section, fields)] = view_class
+
+        values = self[section]
+        converted = []
+        for key in keys:
+            if key not in values:
+                converted.append(_MISSING)
+                continue
+            converter = converters[key]
+            builtin = _view_converters.get(converter)
+            if builtin is not None:
+                converted.append(builtin(values, key))
+            else:
+                converted.append(converter(values[key]))
+        converted = view_class(*converted)
+        if any(value is _MISSING for value in converted):
+            return (None, converted)
+        return (converted, converted)
+
+    def _loaded_dict(self):
+        """
+        Équivalent de C{dict()} qui n'analyse pas les sections
+        en attente de chargement (mode paresseux) : celles-ci sont
+        représentées par un marqueur.
+        """
+        result = {}
+        for key in self.scalars:
+            value = self[key]
+            result[key] = list(value) if isinstance(value, list) else value
+        for key in self.sections:
+            if key in self._pending:
+                result[key] = _UNLOADED
+            else:
+                result[key] = self[key].dict()
+        return result
 
     # pylint: disable-msg=W0201
     # W0201: Attribute 'foo' defined outside __init__
@@ -297,6 +1363,228 @@ class VigiloConfigObj(ConfigObj):
         return res
 
 
+def _parse_in_worker(filename):
+    """
+    Analyse un fichier de configuration dans un processus fils
+    (cf. L{VigiloConfigObj._prefetch}).
+
+    @param filename: Fichier à analyser.
+    @type filename: C{str}
+    @return: Couple contenant le nom du fichier et le résultat
+        de son analyse sérialisé avec C{marshal} (bien plus rapide
+        que C{pickle} pour ce type de données), ou C{None} en cas
+        d'erreur.
+    @rtype: C{tuple}
+    """
+    config = VigiloConfigObj(None, file_error=True, raise_errors=True,
+                             interpolation=False)
+    try:
+        config._parse_file(filename, filename[:-4] + '.spec')
+        return (filename, marshal.dumps(config._parsed[filename]))
+    except Exception: # pylint: disable-msg=W0703
+        return (filename, None)
+
+
+class SettingsWatcher(object):
+    """
+    Surveille les fichiers de configuration chargés (y compris les dossiers
+    inclus) et recharge la configuration lorsqu'ils sont modifiés.
+
+    Les modifications sont détectées via inotify lorsque le module
+    C{pyinotify} est disponible, et par une scrutation périodique sinon.
+    Les rafales d'écritures sont regroupées : la configuration n'est
+    rechargée qu'une fois les fichiers stables pendant C{debounce} secondes.
+    Le rechargement est incrémental (cf. L{VigiloConfigObj.reload}).
+
+    Usage::
+        from vigilo.common.conf import settings, SettingsWatcher
+        watcher = SettingsWatcher(settings)
+        watcher.add_callback(on_settings_changed)
+        watcher.start()
+
+    Les fonctions de rappel reçoivent la liste des clés modifiées.
+    Par défaut, le rechargement et les appels aux fonctions de rappel
+    ont lieu dans le thread de surveillance (la nouvelle configuration
+    n'est substituée à l'ancienne qu'une fois entièrement chargée) ;
+    une application Twisted peut passer
+    C{scheduler=reactor.callFromThread} pour qu'ils aient lieu dans
+    le thread du réacteur.
+    """
+
+    def __init__(self, config=None, interval=1.0, debounce=0.5,
+                 scheduler=None, use_inotify=True):
+        """
+        Initialisation.
+
+        @param config: Configuration à surveiller
+            (par défaut, la configuration globale).
+        @type config: L{VigiloConfigObj}
+        @param interval: Intervalle de scrutation des fichiers (en secondes)
+            lorsqu'inotify n'est pas disponible.
+        @type interval: C{float}
+        @param debounce: Durée (en secondes) pendant laquelle les fichiers
+            doivent rester inchangés avant le rechargement.
+        @type debounce: C{float}
+        @param scheduler: Fonction utilisée pour exécuter le rechargement.
+        @type scheduler: C{callable}
+        @param use_inotify: Utiliser inotify lorsqu'il est disponible.
+        @type use_inotify: C{bool}
+        """
+        if config is None:
+            config = settings
+        self.config = config
+        self.interval = interval
+        self.debounce = debounce
+        self.scheduler = scheduler
+        self.use_inotify = use_inotify and pyinotify is not None
+        self._callbacks = []
+        self._fingerprints = {}
+        self._stopping = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._notifier = None
+        self._watch_manager = None
+        self._watched_dirs = set()
+
+    def add_callback(self, callback):
+        """
+        Enregistre une fonction appelée après chaque rechargement
+        ayant modifié la configuration.
+
+        @param callback: Fonction recevant la liste des clés modifiées,
+            sous la forme de tuples (section, ..., clé).
+        @type callback: C{callable}
+        """
+        self._callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        """Supprime une fonction de rappel enregistrée précédemment."""
+        self._callbacks.remove(callback)
+
+    def _get_fingerprints(self):
+        """Retourne l'empreinte de chacune des sources de la configuration."""
+        return dict((path, _fingerprint(path))
+                    for path in self.config._sources)
+
+    def start(self):
+        """Démarre la surveillance dans un thread dédié."""
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._fingerprints = self._get_fingerprints()
+        if self.use_inotify:
+            self._watch_manager = pyinotify.WatchManager()
+            self._notifier = pyinotify.ThreadedNotifier(
+                self._watch_manager, self._on_event)
+            self._notifier.daemon = True
+            self._notifier.start()
+            self._update_watches()
+        self._thread = threading.Thread(target=self._run,
+                                        name="SettingsWatcher")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Arrête la surveillance."""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        self._thread.join()
+        self._thread = None
+        if self._notifier is not None:
+            self._notifier.stop()
+            self._notifier = None
+            self._watch_manager = None
+            self._watched_dirs = set()
+
+    def _update_watches(self):
+        """
+        Surveille les dossiers contenant les sources de la configuration,
+        ainsi que les dossiers inclus. Surveiller les dossiers plutôt que
+        les fichiers permet de détecter les fichiers remplacés par
+        renommage (comme le font la plupart des éditeurs).
+        """
+        dirs = set()
+        for path in self.config._sources:
+            if os.path.isdir(path):
+                dirs.add(path)
+            dirs.add(os.path.dirname(os.path.abspath(path)))
+        mask = pyinotify.IN_CLOSE_WRITE | pyinotify.IN_MOVED_TO | \
+               pyinotify.IN_MOVED_FROM | pyinotify.IN_CREATE | \
+               pyinotify.IN_DELETE | pyinotify.IN_ATTRIB
+        for path in dirs - self._watched_dirs:
+            if os.path.isdir(path):
+                self._watch_manager.add_watch(path, mask, quiet=True)
+        self._watched_dirs |= dirs
+
+    def _on_event(self, event):
+        """
+        Réveille le thread de surveillance suite à un événement inotify.
+        """
+        self._wakeup.set()
+
+    def _run(self):
+        """Boucle principale du thread de surveillance."""
+        while not self._stopping.is_set():
+            if self.use_inotify:
+                # La scrutation reste active, mais à un rythme réduit,
+                # au cas où un événement aurait été manqué.
+                self._wakeup.wait(self.interval * 10)
+            else:
+                self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                break
+            fingerprints = self._get_fingerprints()
+            if fingerprints == self._fingerprints:
+                continue
+
+            # On attend que les fichiers soient stables.
+            while not self._stopping.is_set():
+                time.sleep(self.debounce)
+                current = self._get_fingerprints()
+                if current == fingerprints and not self._wakeup.is_set():
+                    break
+                self._wakeup.clear()
+                fingerprints = current
+            if self._stopping.is_set():
+                break
+
+            if self.scheduler is None:
+                self.check()
+            else:
+                self.scheduler(self.check)
+
+    def check(self):
+        """
+        Recharge la configuration si l'une de ses sources a été modifiée,
+        puis appelle les fonctions de rappel si des valeurs ont changé.
+
+        @return: Liste des clés modifiées.
+        @rtype: C{list}
+        """
+        fingerprints = self._get_fingerprints()
+        if fingerprints == self._fingerprints:
+            return []
+        try:
+            changes = self.config.reload()
+        except (ConfigParseError, SyntaxError) as e:
+            from vigilo.common.logging import get_logger
+            get_logger(__name__).error(
+                _("Could not reload the settings: %s"), e)
+            # On réessaiera lors de la prochaine modification.
+            self._fingerprints = fingerprints
+            return []
+        self._fingerprints = self._get_fingerprints()
+        if self._watch_manager is not None:
+            self._update_watches()
+        if changes:
+            for callback in self._callbacks[:]:
+                callback(changes)
+        return changes
+
+
 settings = VigiloConfigObj(None, file_error=True, raise_errors=True,
                            interpolation=False)
 
@@ -314,15 +1602,170 @@ def log_initialized(silent_load=False):
                  ", ".join(settings.filenames))
 
 
-def setup_plugins_path(plugins_path):
-    """Très fortement inspiré de Trac"""
-    from vigilo.common.logging import get_logger
-    LOGGER = get_logger(__name__)
-    LOGGER.debug("Loading plugins from %s" % plugins_path)
+def _metadata_fingerprint(path):
+    """
+    Retourne l'empreinte des fichiers de métadonnées d'un plugin
+    décompressé (C{EGG-INFO/entry_points.txt}, par exemple), dont
+    la modification ne change pas l'empreinte du plugin lui-même.
 
+    @param path: Emplacement du plugin.
+    @type path: C{str}
+    @return: Empreinte des métadonnées, ou C{None} si le plugin
+        n'est pas un dossier de distribution.
+    @rtype: C{list}
+    """
+    if path.lower().endswith('.egg'):
+        path = os.path.join(path, 'EGG-INFO')
+    elif not path.lower().endswith(('.egg-info', '.dist-info')):
+        return None
+    try:
+        names = sorted(os.listdir(path))
+    except OSError:
+        return None
+    return [(name, _fingerprint(os.path.join(path, name))) for name in names]
+
+def _plugins_fingerprint(plugins_path):
+    """
+    Retourne l'empreinte d'un dossier de plugins, qui change dès qu'un
+    plugin y est ajouté, supprimé ou modifié (y compris ses métadonnées),
+    ou que les distributions déjà installées changent.
+
+    @param plugins_path: Dossier contenant les plugins.
+    @type plugins_path: C{str}
+    @return: Empreinte du dossier, ou C{None} s'il n'existe pas.
+    @rtype: C{list}
+    """
+    try:
+        names = sorted(os.listdir(plugins_path))
+    except OSError:
+        return None
+    return [
+        _fingerprint(plugins_path),
+        [(name, _fingerprint(os.path.join(plugins_path, name)),
+          _metadata_fingerprint(os.path.join(plugins_path, name)))
+         for name in names],
+        sorted(str(dist) for dist in pkg_resources.working_set),
+    ]
+
+def _find_plugins(plugins_path):
+    """
+    Résout les distributions d'un dossier de plugins.
+
+    @param plugins_path: Dossier contenant les plugins.
+    @type plugins_path: C{str}
+    @return: Couple contenant les distributions à ajouter et les erreurs,
+        sous la forme de triplets (distribution, type d'erreur, message).
+    @rtype: C{tuple}
+    """
     distributions, errors = pkg_resources.working_set.find_plugins(
         pkg_resources.Environment([plugins_path])
     )
+    error_types = (
+        (pkg_resources.DistributionNotFound, 'not-found'),
+        (pkg_resources.VersionConflict, 'conflict'),
+        (pkg_resources.UnknownExtra, 'extra'),
+        (ImportError, 'import'),
+    )
+    results = []
+    for dist, e in errors.iteritems():
+        for error_type, kind in error_types:
+            if isinstance(e, error_type):
+                break
+        else:
+            kind = 'other'
+        results.append((str(dist), kind, str(e)))
+    return (distributions, results)
+
+def _load_plugins_cache(cache_file, fingerprint):
+    """
+    Charge les distributions d'un dossier de plugins depuis le cache,
+    si le dossier n'a pas été modifié depuis sa création.
+
+    @param cache_file: Emplacement du cache.
+    @type cache_file: C{str}
+    @param fingerprint: Empreinte actuelle du dossier
+        (cf. L{_plugins_fingerprint}).
+    @type fingerprint: C{list}
+    @return: Distributions et erreurs (cf. L{_find_plugins}),
+        ou C{None} si le cache n'est pas utilisable.
+    @rtype: C{tuple}
+    """
+    try:
+        with open(cache_file, 'rb') as f:
+            cache = marshal.load(f)
+    except (IOError, EOFError, ValueError, TypeError):
+        return None
+    try:
+        if cache['version'] != sys.version_info[:2] or \
+                cache['fingerprint'] != fingerprint:
+            return None
+        distributions = []
+        for location, key in cache['distributions']:
+            dists = [dist for dist in
+                     pkg_resources.find_distributions(location)
+                     if dist.key == key and dist.location == location]
+            if len(dists) != 1:
+                return None
+            distributions.extend(dists)
+        return (distributions, cache['errors'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def setup_plugins_path(plugins_path, cache_file=None):
+    """
+    Très fortement inspiré de Trac
+
+    La résolution des distributions présentes dans le dossier des plugins
+    étant coûteuse, son résultat est conservé dans un cache, réutilisé
+    tant que le contenu du dossier et les distributions installées ne
+    changent pas.
+
+    @param plugins_path: Dossier contenant les plugins.
+    @type plugins_path: C{str}
+    @param cache_file: Emplacement du cache. Par défaut, le cache est placé
+        dans le dossier indiqué par la variable d'environnement
+        C{VIGILO_SETTINGS_CACHE}, s'il a été défini.
+    @type cache_file: C{str}
+    """
+    from vigilo.common.logging import get_logger
+    LOGGER = get_logger(__name__)
+    LOGGER.debug("Loading plugins from %s" % plugins_path)
+
+    if cache_file is None and VigiloConfigObj.cache_dir:
+        cache_file = os.path.join(VigiloConfigObj.cache_dir,
+            "plugins-%s.cache" % hashlib.md5(plugins_path).hexdigest())
+
+    start = time.time()
+    fingerprint = None
+    result = None
+    if cache_file is not None:
+        fingerprint = _plugins_fingerprint(plugins_path)
+        if fingerprint is not None:
+            result = _load_plugins_cache(cache_file, fingerprint)
+    if result is not None:
+        distributions, errors = result
+        LOGGER.debug("Plugins loaded from cache %(cache)s "
+                     "in %(duration).3f seconds", {
+                        'cache': cache_file,
+                        'duration': time.time() - start,
+                     })
+    else:
+        distributions, errors = _find_plugins(plugins_path)
+        LOGGER.debug("Plugins resolved in %.3f seconds", time.time() - start)
+        if fingerprint is not None:
+            try:
+                data = marshal.dumps({
+                    'version': sys.version_info[:2],
+                    'fingerprint': fingerprint,
+                    'distributions': [(dist.location, dist.key)
+                                      for dist in distributions],
+                    'errors': errors,
+                })
+            except ValueError:
+                pass
+            else:
+                _write_cache(cache_file, data)
+
     for dist in distributions:
         if dist in pkg_resources.working_set:
             continue
@@ -332,46 +1775,104 @@ def setup_plugins_path(plugins_path):
         })
         pkg_resources.working_set.add(dist)
 
-    def _log_error(item, e):
-        if isinstance(e, pkg_resources.DistributionNotFound):
+    for item, kind, error in errors:
+        if kind == 'not-found':
             LOGGER.debug('Skipping "%(item)s": ("%(module)s" not found)', {
                 'item': item,
-                'module': e,
+                'module': error,
             })
-        elif isinstance(e, pkg_resources.VersionConflict):
+        elif kind == 'conflict':
             LOGGER.error(_('Skipping "%(item)s": (version conflict '
                            '"%(error)s")'),
-                         {'item': item, 'error': e})
-        elif isinstance(e, pkg_resources.UnknownExtra):
+                         {'item': item, 'error': error})
+        elif kind == 'extra':
             LOGGER.error(_('Skipping "%(item)s": (unknown extra "%(error)s")'),
-                         {'item': item, 'error': e })
-        elif isinstance(e, ImportError):
+                         {'item': item, 'error': error })
+        elif kind == 'import':
             LOGGER.error(_('Skipping "%(item)s": (can\'t import "%(error)s")'),
-                         {'item': item, 'error': e })
+                         {'item': item, 'error': error })
         else:
             LOGGER.error(_('Skipping "%(item)s": (error "%(error)s")'), {
                 'item': item,
-                'error': e,
+                'error': error,
             })
 
-    for dist, e in errors.iteritems():
-        _log_error(dist, e)
 
+def _flatten(section, path):
+    """
+    Parcourt récursivement les valeurs d'une section.
+
+    @param section: Section à parcourir.
+    @type section: C{configobj.Section}
+    @param path: Chemin vers la section.
+    @type path: C{tuple}
+    @return: Générateur de couples (chemin vers la clé, valeur).
+    @rtype: C{generator}
+    """
+    for key in section.scalars:
+        yield (path + (key, ), section[key])
+    for key in section.sections:
+        for item in _flatten(section[key], path + (key, )):
+            yield item
+
+def query_settings(config, queries, dumps):
+    """
+    Recherche des paramètres ou des sections entières dans la configuration.
+
+    @param config: Configuration à interroger.
+    @type config: L{VigiloConfigObj}
+    @param queries: Paramètres demandés, sous la forme
+        de couples (section, clé).
+    @type queries: C{list}
+    @param dumps: Sections demandées dans leur intégralité.
+    @type dumps: C{list}
+    @return: Couple contenant les résultats, sous la forme de triplets
+        (chemin vers la clé, valeur, booléen indiquant si la valeur
+        provient de l'export d'une section entière), et les messages
+        d'erreur (paramètres ou sections inexistants).
+    @rtype: C{tuple}
+    """
+    results = []
+    errors = []
+    for section, key in queries:
+        if section not in config:
+            errors.append(_("No such section: %s") % section)
+        elif key not in config[section]:
+            errors.append(_("No such key: %s") % key)
+        else:
+            results.append(((section, key), config[section][key], False))
+    for section in dumps:
+        if section not in config:
+            errors.append(_("No such section: %s") % section)
+        else:
+            results.extend((path, value, True) for path, value
+                           in _flatten(config[section], (section, )))
+    return (results, errors)
 
 def main():
     """
     Cette fonction est appelée lorsqu'un utilisateur lance la commande
-    'vigilo-config'.
-    Cet utilitaire permet d'obtenir la valeur d'un paramètre.
+    'vigilo-config' et que le serveur de configuration n'est pas disponible
+    (cf. L{vigilo.common.confclient.main}).
+    Cet utilitaire permet d'obtenir la valeur d'un ou plusieurs paramètres,
+    ou le contenu de sections entières, en une seule invocation.
     """
-    from optparse import OptionParser
+    from vigilo.common.confclient import make_parser, get_queries, \
+                                         format_results
 
-    parser = OptionParser()
-    parser.add_option('-s', '--section', dest='section')
-    parser.add_option('-g', '--get', dest='get', metavar='SETTING_NAME')
+    parser = make_parser(_)
     opts, args = parser.parse_args()
-    if opts.get is None or opts.section is None:
+    try:
+        queries = get_queries(opts)
+    except ValueError as e:
+        if e.args[0] is not None:
+            print(_("Invalid query: %s") % e.args[0], file=sys.stderr)
+        return 2
+    if not queries and not opts.dumps:
         return 2
+
+    # Seules les sections demandées ont besoin d'être analysées.
+    settings.lazy = True
     try:
         for arg in args:
             if not os.path.exists(arg):
@@ -380,18 +1881,17 @@ def main():
             settings.load_file(arg)
         if not args:
             settings.load_module()
-    except ConfigParseError as e:
+        # Les sections demandées sont analysées (et validées) ici.
+        results, errors = query_settings(settings, queries, opts.dumps)
+    except (ConfigParseError, SyntaxError) as e:
         print(e, file=sys.stderr)
         return 4
-    if opts.section not in settings:
-        print(_("No such section: %s") % opts.section, file=sys.stderr)
-        return 1
-    if opts.get not in settings[opts.section]:
-        print(_("No such key: %s") % opts.get, file=sys.stderr)
-        return 1
-    val = settings[opts.section][opts.get]
-    sys.stdout.write('%s\n' % val)
-    return 0
+
+    for error in errors:
+        print(error, file=sys.stderr)
+    for line in format_results(results, opts.format):
+        sys.stdout.write('%s\n' % line)
+    return 1 if errors else 0
 
 if __name__ == '__main__':
     sys.exit(main())
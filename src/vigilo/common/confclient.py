@@ -0,0 +1,362 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Client du serveur de configuration (cf. L{vigilo.common.confserver}).
+
+Ce module est volontairement léger (il n'importe ni C{pkg_resources},
+ni C{configobj}) afin que la commande 'vigilo-config' démarre rapidement
+lorsque le serveur est disponible. Dans le cas contraire, la commande
+analyse elle-même la configuration (cf. L{vigilo.common.conf.main}).
+
+Usage depuis Python::
+
+    from vigilo.common.confclient import SettingsClient
+    client = SettingsClient()
+    host = client.get('bus', 'host')
+"""
+
+from __future__ import print_function
+
+import os
+import re
+import sys
+import json
+import pipes
+import socket
+from optparse import OptionParser
+
+__all__ = ("SettingsClient", "query", "get_settings_files")
+
+#: Emplacement par défaut de la socket du serveur de configuration.
+DEFAULT_SOCKET = "/var/run/vigilo/config.sock"
+
+#: Emplacements dans lesquels les fichiers de configuration sont
+#: recherchés (cf. L{vigilo.common.conf.VigiloConfigObj.load_module}).
+SETTINGS_PATHS = (
+    '/etc/vigilo/%s',
+    '~/.vigilo/%s',
+    './%s',
+)
+
+
+def get_socket_path():
+    """
+    Retourne l'emplacement de la socket du serveur de configuration,
+    qui peut être modifié à l'aide de la variable d'environnement
+    C{VIGILO_CONFIG_SOCKET}.
+
+    @rtype: C{str}
+    """
+    return os.environ.get("VIGILO_CONFIG_SOCKET") or DEFAULT_SOCKET
+
+def get_settings_files(paths=SETTINGS_PATHS, module=None,
+                       basename="settings.ini"):
+    """
+    Retourne la liste des fichiers de configuration candidats, dans leur
+    ordre de chargement, qu'ils existent ou non. Les emplacements relatifs
+    dépendent du répertoire courant et de l'utilisateur.
+
+    @param paths: Emplacements dans lesquels les fichiers sont recherchés.
+    @type paths: C{list}
+    @param module: Nom du module dont la configuration spécifique
+        doit également être chargée.
+    @type module: C{str}
+    @param basename: Nom des fichiers de configuration.
+    @type basename: C{str}
+    @rtype: C{list}
+    """
+    filenames = [path % basename for path in paths]
+
+    if module:
+        module_components = module.split(".")
+        if module_components[0] == "vigilo":
+            del module_components[0]
+        if len(module_components) > 0:
+            filename = os.path.join(
+                module_components[0].replace("_", "-"),
+                basename)
+            filenames.extend([path % filename for path in paths])
+
+    # Si la variable VIGILO_SETTINGS a été définie,
+    # on utilise le chemin d'accès qu'elle contient.
+    env_file = os.environ.get('VIGILO_SETTINGS', None)
+    if env_file:
+        filenames.append(env_file)
+
+    return [os.path.expanduser(filename) for filename in filenames]
+
+def _to_str(value):
+    """
+    Convertit les chaînes Unicode produites par le décodage JSON
+    en chaînes d'octets (UTF-8), comme celles de la configuration.
+    """
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    if isinstance(value, list):
+        return [_to_str(item) for item in value]
+    return value
+
+
+class SettingsClient(object):
+    """
+    Client du serveur de configuration. La connexion est établie
+    au premier appel et conservée pour les appels suivants.
+    """
+
+    def __init__(self, path=None, timeout=1.0):
+        """
+        Initialisation.
+
+        @param path: Emplacement de la socket du serveur
+            (cf. L{get_socket_path}).
+        @type path: C{str}
+        @param timeout: Délai maximum d'attente d'une réponse (en secondes).
+        @type timeout: C{float}
+        """
+        if path is None:
+            path = get_socket_path()
+        self.path = path
+        self.timeout = timeout
+        self._socket = None
+        self._file = None
+
+    def close(self):
+        """Ferme la connexion au serveur."""
+        if self._socket is not None:
+            self._file.close()
+            self._socket.close()
+            self._socket = self._file = None
+
+    def query(self, queries=(), dumps=(), settings=None):
+        """
+        Interroge le serveur de configuration.
+
+        @param queries: Paramètres demandés, sous la forme
+            de couples (section, clé).
+        @type queries: C{list}
+        @param dumps: Sections demandées dans leur intégralité.
+        @type dumps: C{list}
+        @param settings: Fichiers de configuration attendus, dans leur
+            ordre de chargement. Le serveur refuse la requête s'il ne sert
+            pas exactement ces fichiers.
+        @type settings: C{list}
+        @return: Couple contenant les résultats, sous la forme de triplets
+            (chemin vers la clé, valeur, booléen indiquant si la valeur
+            provient de l'export d'une section entière), et les messages
+            d'erreur (paramètres ou sections inexistants).
+        @rtype: C{tuple}
+        @raise socket.error: Le serveur n'est pas disponible.
+        @raise ValueError: La réponse du serveur est invalide
+            ou le serveur a refusé la requête.
+        """
+        request = {
+            'queries': [list(item) for item in queries],
+            'dumps': list(dumps),
+        }
+        if settings is not None:
+            request['settings'] = [os.path.abspath(filename)
+                                   for filename in settings]
+        request = json.dumps(request) + '\n'
+        if self._socket is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.path)
+            except socket.error:
+                sock.close()
+                raise
+            self._socket = sock
+            self._file = sock.makefile('rb')
+        try:
+            self._socket.sendall(request)
+            line = self._file.readline()
+            if not line.endswith('\n'):
+                raise socket.error("Connection closed by the server")
+            response = json.loads(line)
+            if 'error' in response:
+                raise ValueError(response['error'])
+        except (socket.error, ValueError):
+            self.close()
+            raise
+        results = [(tuple(_to_str(path)), _to_str(value), dumped)
+                   for path, value, dumped in response['results']]
+        errors = [error.encode('utf-8') for error in response['errors']]
+        return (results, errors)
+
+    def get(self, section, key, default=None):
+        """
+        Retourne la valeur d'un paramètre.
+
+        @param section: Nom de la section.
+        @type section: C{str}
+        @param key: Nom du paramètre.
+        @type key: C{str}
+        @param default: Valeur retournée si le paramètre n'existe pas.
+        @return: Valeur du paramètre.
+        """
+        results = self.query([(section, key)])[0]
+        if not results:
+            return default
+        return results[0][1]
+
+
+def query(queries=(), dumps=(), path=None, timeout=1.0, settings=None):
+    """
+    Interroge le serveur de configuration au travers
+    d'une connexion temporaire (cf. L{SettingsClient.query}).
+    """
+    client = SettingsClient(path, timeout)
+    try:
+        return client.query(queries, dumps, settings)
+    finally:
+        client.close()
+
+def make_parser(_=lambda message: message, parser=None):
+    """
+    Construit l'analyseur des options de la commande 'vigilo-config'.
+
+    @param _: Fonction de traduction des messages d'aide.
+    @type _: C{callable}
+    @param parser: Analyseur auquel ajouter les options
+        (par défaut, un nouvel analyseur est créé).
+    @type parser: C{optparse.OptionParser}
+    @return: Analyseur des options.
+    @rtype: C{optparse.OptionParser}
+    """
+    if parser is None:
+        parser = OptionParser()
+    parser.add_option('-s', '--section', dest='section')
+    parser.add_option('-g', '--get', dest='get', metavar='SETTING_NAME',
+        action='append',
+        help=_("Setting to read from the section given with --section "
+               "(may be repeated)."))
+    parser.add_option('-q', '--query', dest='queries',
+        metavar='SECTION:SETTING_NAME', action='append', default=[],
+        help=_("Setting to read (may be repeated)."))
+    parser.add_option('-d', '--dump', dest='dumps', metavar='SECTION',
+        action='append', default=[],
+        help=_("Section to display entirely (may be repeated)."))
+    parser.add_option('-f', '--format', dest='format', default='plain',
+        type='choice', choices=['plain', 'shell', 'json'],
+        help=_("Output format: plain, shell (for use with eval) or json."))
+    return parser
+
+def get_queries(opts):
+    """
+    Retourne les paramètres demandés sur la ligne de commande.
+
+    @param opts: Options de la ligne de commande.
+    @return: Liste de couples (section, clé).
+    @rtype: C{list}
+    @raise ValueError: Une requête est invalide. L'argument de l'exception
+        est la requête en cause, ou C{None} si l'option C{--get}
+        a été utilisée sans l'option C{--section}.
+    """
+    queries = []
+    if opts.get is not None:
+        if opts.section is None:
+            raise ValueError(None)
+        queries.extend((opts.section, key) for key in opts.get)
+    for item in opts.queries:
+        section, sep, key = item.rpartition(':')
+        if not sep or not section or not key:
+            raise ValueError(item)
+        queries.append((section, key))
+    return queries
+
+def format_results(results, output_format):
+    """
+    Met en forme le résultat des requêtes de la commande 'vigilo-config'.
+
+    @param results: Triplets (chemin vers la clé, valeur, booléen indiquant
+        si la valeur provient de l'export d'une section entière).
+    @type results: C{list}
+    @param output_format: Format de sortie : C{plain} (une valeur par
+        ligne), C{shell} (affectations de variables, à utiliser avec
+        C{eval}) ou C{json}.
+    @type output_format: C{str}
+    @return: Lignes à afficher.
+    @rtype: C{list}
+    """
+    if output_format == 'json':
+        tree = {}
+        for path, value, _dumped in results:
+            node = tree
+            for part in path[:-1]:
+                node = node.setdefault(part, {})
+            node[path[-1]] = value
+        return [json.dumps(tree, sort_keys=True)]
+
+    lines = []
+    for path, value, dumped in results:
+        # Les valeurs Unicode sont affichées en UTF-8.
+        path = _to_str(list(path))
+        value = _to_str(value)
+        if output_format == 'shell':
+            if isinstance(value, list):
+                value = ', '.join(value)
+            elif not isinstance(value, str):
+                value = str(value)
+            name = re.sub(r'[^A-Za-z0-9_]', '_', '_'.join(path)).upper()
+            lines.append('%s=%s' % (name, pipes.quote(value)))
+        elif dumped:
+            lines.append('%s = %s' % ('.'.join(path[1:]), value))
+        else:
+            lines.append('%s' % (value, ))
+    return lines
+
+
+class _QuietOptionParser(OptionParser):
+    """
+    Analyseur d'options qui lève une exception au lieu d'afficher
+    un message d'erreur (le message est affiché par L{conf.main}).
+    """
+
+    def error(self, msg):
+        raise ValueError(msg)
+
+
+def main():
+    """
+    Point d'entrée de la commande 'vigilo-config'.
+
+    Les requêtes sont transmises au serveur de configuration s'il est
+    disponible et qu'aucun fichier de configuration n'a été indiqué
+    sur la ligne de commande. Le serveur ne répond que s'il sert
+    exactement les fichiers que la commande chargerait elle-même
+    (ceux-ci dépendent du répertoire courant, de l'utilisateur et de
+    la variable C{VIGILO_SETTINGS}). Dans tous
+    les autres cas (y compris pour l'affichage de l'aide ou des erreurs
+    d'utilisation), la configuration est analysée par la commande
+    elle-même.
+    """
+    parser = make_parser(parser=_QuietOptionParser(add_help_option=False))
+    try:
+        opts, args = parser.parse_args()
+        queries = get_queries(opts)
+    except ValueError:
+        queries = opts = args = None
+
+    if opts is not None and not args and (queries or opts.dumps) and \
+            os.path.exists(get_socket_path()):
+        try:
+            filenames = [filename for filename in get_settings_files()
+                         if os.path.exists(filename)]
+            results, errors = query(queries, opts.dumps, settings=filenames)
+        except (socket.error, ValueError):
+            pass
+        else:
+            for error in errors:
+                print(error, file=sys.stderr)
+            for line in format_results(results, opts.format):
+                sys.stdout.write('%s\n' % line)
+            return 1 if errors else 0
+
+    from vigilo.common.conf import main as conf_main
+    return conf_main()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
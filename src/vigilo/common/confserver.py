@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Serveur de configuration : un processus de longue durée qui conserve
+la configuration de Vigilo en mémoire, la recharge automatiquement
+lorsque ses fichiers sont modifiés (cf. L{SettingsWatcher}), et répond
+aux requêtes reçues sur une socket Unix locale.
+
+Le protocole est orienté lignes : chaque requête est un objet JSON de
+la forme C{{"queries": [[section, clé], ...], "dumps": [section, ...]}}
+et reçoit en réponse un objet JSON de la forme
+C{{"results": [[chemin, valeur, export], ...], "errors": [message, ...]}}
+(cf. L{vigilo.common.confclient}).
+
+Une requête peut préciser les fichiers de configuration attendus par
+le client (clé C{"settings"}) ; le serveur répond alors par une erreur
+s'il ne sert pas exactement ces fichiers, afin que le client analyse
+lui-même sa configuration.
+"""
+from __future__ import print_function
+
+import os
+import sys
+import json
+import errno
+import socket
+import signal
+import threading
+import SocketServer
+from optparse import OptionParser
+
+from vigilo.common.conf import settings, SettingsWatcher, ConfigParseError, \
+                               query_settings
+from vigilo.common.confclient import get_socket_path
+from vigilo.common.gettext import translate
+
+_ = translate(__name__)
+
+__all__ = ("SettingsServer", )
+
+
+class _RequestHandler(SocketServer.StreamRequestHandler):
+    """Traite les requêtes reçues sur une connexion."""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                queries = [(section.encode('utf-8'), key.encode('utf-8'))
+                           for section, key in request.get('queries', [])]
+                dumps = [section.encode('utf-8')
+                         for section in request.get('dumps', [])]
+                filenames = request.get('settings')
+                if filenames is not None:
+                    filenames = [filename.encode('utf-8')
+                                 for filename in filenames]
+            except (ValueError, TypeError, AttributeError):
+                response = {'error': 'Invalid request'}
+            else:
+                if filenames is not None and \
+                        not self.server.serves(filenames):
+                    response = {'error': 'Settings mismatch'}
+                else:
+                    with self.server.lock:
+                        results, errors = query_settings(self.server.config,
+                                                         queries, dumps)
+                    response = {'results': results, 'errors': errors}
+            self.wfile.write(json.dumps(response) + '\n')
+            self.wfile.flush()
+
+
+class SettingsServer(SocketServer.ThreadingUnixStreamServer):
+    """
+    Serveur de configuration.
+
+    Les requêtes sont traitées dans des threads distincts ; l'accès
+    à la configuration est protégé par un verrou, que le rechargement
+    de la configuration utilise également.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path=None, config=None, mode=0o600, watch=True):
+        """
+        Initialisation du serveur.
+
+        @param path: Emplacement de la socket
+            (cf. L{vigilo.common.confclient.get_socket_path}).
+        @type path: C{str}
+        @param config: Configuration servie (par défaut, la configuration
+            globale, qui doit avoir été chargée au préalable).
+        @type config: L{VigiloConfigObj}
+        @param mode: Permissions de la socket. La configuration pouvant
+            contenir des mots de passe, seul le propriétaire du processus
+            peut l'interroger par défaut.
+        @type mode: C{int}
+        @param watch: Recharger automatiquement la configuration
+            lorsque ses fichiers sont modifiés.
+        @type watch: C{bool}
+        """
+        if path is None:
+            path = get_socket_path()
+        if config is None:
+            config = settings
+        self.path = path
+        self.config = config
+        self.lock = threading.RLock()
+        self.watcher = None
+        if watch:
+            self.watcher = SettingsWatcher(config, scheduler=self._locked)
+        self._remove_stale_socket()
+        # Les permissions sont appliquées dès la création de la socket.
+        umask = os.umask(0o777 & ~mode)
+        try:
+            SocketServer.ThreadingUnixStreamServer.__init__(
+                self, path, _RequestHandler)
+        finally:
+            os.umask(umask)
+
+    def _remove_stale_socket(self):
+        """
+        Supprime la socket laissée par un précédent serveur,
+        à condition que celui-ci ne soit plus actif.
+
+        @raise socket.error: Un autre serveur utilise déjà la socket.
+        """
+        if not os.path.exists(self.path):
+            return
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+        except socket.error:
+            os.unlink(self.path)
+        else:
+            raise socket.error(errno.EADDRINUSE,
+                               _("Socket already in use: %s") % self.path)
+        finally:
+            sock.close()
+
+    def serves(self, filenames):
+        """
+        Indique si les fichiers de configuration chargés explicitement
+        par le serveur sont exactement ceux indiqués, dans le même ordre.
+
+        @param filenames: Emplacements des fichiers.
+        @type filenames: C{list}
+        @rtype: C{bool}
+        """
+        filenames = [os.path.realpath(filename) for filename in filenames]
+        with self.lock:
+            roots = list(self.config._roots)
+        return filenames == [os.path.realpath(root) for root in roots]
+
+    def _locked(self, func):
+        """Exécute une fonction en détenant le verrou de la configuration."""
+        with self.lock:
+            func()
+
+    def serve_forever(self, poll_interval=0.5):
+        if self.watcher is not None:
+            self.watcher.start()
+        try:
+            SocketServer.ThreadingUnixStreamServer.serve_forever(
+                self, poll_interval)
+        finally:
+            if self.watcher is not None:
+                self.watcher.stop()
+
+    def server_close(self):
+        SocketServer.ThreadingUnixStreamServer.server_close(self)
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+def main():
+    """
+    Cette fonction est appelée lorsqu'un utilisateur lance la commande
+    'vigilo-config-server'.
+    Ce serveur conserve la configuration en mémoire afin de répondre
+    rapidement aux requêtes de la commande 'vigilo-config'.
+    """
+    parser = OptionParser(usage="%prog [options] [FILE...]")
+    parser.add_option('-S', '--socket', dest='socket',
+        default=get_socket_path(),
+        help=_("Path to the UNIX socket to listen on."))
+    parser.add_option('-m', '--mode', dest='mode', default='0600',
+        help=_("Permissions of the socket (in octal)."))
+    parser.add_option('--no-watch', action='store_false', dest='watch',
+        default=True,
+        help=_("Do not reload the settings when their files change."))
+    opts, args = parser.parse_args()
+    try:
+        mode = int(opts.mode, 8)
+    except ValueError:
+        parser.error(_("Invalid mode: %s") % opts.mode)
+
+    try:
+        for arg in args:
+            if not os.path.exists(arg):
+                print(_("No such file: %s") % arg, file=sys.stderr)
+                return 3
+            settings.load_file(arg)
+        if not args:
+            settings.load_module()
+    except ConfigParseError as e:
+        print(e, file=sys.stderr)
+        return 4
+
+    try:
+        server = SettingsServer(opts.socket, settings, mode, opts.watch)
+    except socket.error as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    def _stop(signum, frame):
+        """Arrête le serveur à la réception d'un signal."""
+        threading.Thread(target=server.shutdown).start()
+    signal.signal(signal.SIGTERM, _stop)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
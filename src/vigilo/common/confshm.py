@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Partage de la configuration fusionnée entre plusieurs processus
+(cf. L{VigiloConfigObj.publish_shared} et L{VigiloConfigObj.attach_shared}).
+
+La configuration est publiée dans un fichier (de préférence sous
+C{/dev/shm}), projeté en mémoire en lecture seule par les processus qui
+l'utilisent : ses pages ne sont présentes qu'une seule fois en mémoire.
+Le fichier est composé :
+  - d'un en-tête contenant un numéro de génération, incrémenté
+    à chaque publication ;
+  - d'un index (valeurs de premier niveau et position des sections) ;
+  - du contenu de chaque section, sérialisé séparément avec C{marshal},
+    afin que les processus ne désérialisent que les sections utilisées.
+
+Chaque publication remplace le fichier de manière atomique : un processus
+attaché à une publication précédente continue d'en lire le contenu jusqu'à
+ce qu'il s'attache à nouveau au fichier.
+"""
+
+import os
+import sys
+import mmap
+import struct
+import marshal
+import tempfile
+
+__all__ = ("SharedSegment", "publish")
+
+# Signature, numéro de génération, taille de l'index.
+_HEADER = struct.Struct('<8sQQ')
+_MAGIC = 'VIGILO\x00\x01'
+
+
+def read_generation(path):
+    """
+    Retourne le numéro de génération de la configuration publiée
+    dans un fichier, sans projeter ce dernier en mémoire.
+
+    @param path: Emplacement de la configuration publiée.
+    @type path: C{str}
+    @return: Numéro de génération, ou C{None} si le fichier
+        n'existe pas ou n'est pas valide.
+    @rtype: C{int}
+    """
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(_HEADER.size)
+    except IOError:
+        return None
+    if len(header) != _HEADER.size:
+        return None
+    magic, generation, _length = _HEADER.unpack(header)
+    if magic != _MAGIC:
+        return None
+    return generation
+
+def publish(path, tree, filenames, mode=0o600):
+    """
+    Publie une configuration dans un fichier.
+
+    @param path: Emplacement de la configuration publiée.
+    @type path: C{str}
+    @param tree: Configuration à publier, sous la forme d'un couple
+        (valeurs, sections) produit par C{conf._dump_tree}.
+    @type tree: C{tuple}
+    @param filenames: Fichiers dont la configuration est issue.
+    @type filenames: C{list}
+    @param mode: Permissions du fichier.
+    @type mode: C{int}
+    @return: Numéro de génération de la configuration publiée.
+    @rtype: C{int}
+    @raise ValueError: La configuration contient une valeur
+        qui ne peut pas être sérialisée.
+    """
+    scalars, sections = tree
+    blobs = []
+    index = []
+    offset = 0
+    for name, subtree in sections:
+        blob = marshal.dumps(subtree)
+        index.append((name, offset, len(blob)))
+        blobs.append(blob)
+        offset += len(blob)
+    index = marshal.dumps({
+        'version': sys.version_info[:2],
+        'scalars': scalars,
+        'sections': index,
+        'filenames': list(filenames),
+    })
+    generation = (read_generation(path) or 0) + 1
+
+    fd, tmp_file = tempfile.mkstemp(prefix='.vigilo-settings-',
+                                    dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, generation, len(index)))
+            f.write(index)
+            for blob in blobs:
+                f.write(blob)
+        os.chmod(tmp_file, mode)
+        os.rename(tmp_file, path)
+    except (IOError, OSError):
+        try:
+            os.unlink(tmp_file)
+        except OSError:
+            pass
+        raise
+    return generation
+
+
+class SharedSegment(object):
+    """
+    Configuration publiée, projetée en mémoire en lecture seule.
+    """
+
+    def __init__(self, path):
+        """
+        Projette en mémoire la configuration publiée dans un fichier.
+
+        @param path: Emplacement de la configuration publiée.
+        @type path: C{str}
+        @raise EnvironmentError: Le fichier n'a pas pu être ouvert.
+        @raise ValueError: Le fichier n'est pas valide, ou a été publié
+            par une autre version de Python.
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < _HEADER.size:
+            raise ValueError("Invalid shared settings: %s" % path)
+        magic, self.generation, length = \
+            _HEADER.unpack(self._mmap[:_HEADER.size])
+        if magic != _MAGIC:
+            raise ValueError("Invalid shared settings: %s" % path)
+        try:
+            index = marshal.loads(self._mmap[_HEADER.size:
+                                             _HEADER.size + length])
+            version = index['version']
+            # Un index mal formé est rejeté dès maintenant, plutôt que
+            # lors de l'accès aux sections.
+            self.scalars = [(key, value)
+                            for key, value in index['scalars']]
+            self.sections = [(name, start, size)
+                             for name, start, size in index['sections']]
+            self.filenames = list(index['filenames'])
+        except (EOFError, ValueError, KeyError, TypeError):
+            raise ValueError("Invalid shared settings: %s" % path)
+        if version != sys.version_info[:2]:
+            raise ValueError("Shared settings published by another "
+                             "version of Python: %s" % path)
+        self._base = _HEADER.size + length
+
+    def read(self, offset, length):
+        """
+        Désérialise le contenu d'une section.
+
+        @param offset: Position de la section (cf. C{sections}).
+        @type offset: C{int}
+        @param length: Taille de la section.
+        @type length: C{int}
+        @return: Contenu de la section, sous la forme d'un couple
+            (valeurs, sous-sections).
+        @rtype: C{tuple}
+        """
+        start = self._base + offset
+        return marshal.loads(self._mmap[start:start + length])
+
+    def changed(self):
+        """
+        Indique si une nouvelle configuration a été publiée depuis
+        la projection en mémoire de celle-ci.
+
+        @rtype: C{bool}
+        """
+        return read_generation(self.path) != self.generation
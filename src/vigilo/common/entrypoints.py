@@ -0,0 +1,476 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Index des points d'entrée des distributions installées.
+
+Contrairement à C{pkg_resources.iter_entry_points}, qui parcourt toutes
+les distributions et analyse leurs métadonnées à chaque appel, l'index
+est construit une seule fois en lisant directement les fichiers
+C{entry_points.txt}, puis conservé en mémoire (et sur disque, dans le
+dossier indiqué par la variable d'environnement C{VIGILO_SETTINGS_CACHE}).
+Les recherches par groupe et par nom se font ensuite en temps constant.
+
+Usage::
+
+    from vigilo.common.entrypoints import iter_entry_points
+    for ep in iter_entry_points('vigilo.vigiconf.applications'):
+        app = ep.load()
+
+L'index est reconstruit automatiquement lorsque des distributions sont
+ajoutées au C{working_set} (cf. L{vigilo.common.conf.setup_plugins_path}).
+"""
+
+import os
+import re
+import sys
+import marshal
+import hashlib
+import zipfile
+import threading
+import collections
+
+import pkg_resources
+
+from vigilo.common.conf import VigiloConfigObj, _fingerprint, _write_cache
+
+__all__ = ("EntryPoint", "EntryPointIndex", "get_index",
+           "iter_entry_points")
+
+_index = None
+_index_lock = threading.Lock()
+
+
+class EntryPoint(collections.namedtuple('EntryPoint',
+        'group name value project version location')):
+    """
+    Point d'entrée d'une distribution, qui offre la même interface que
+    C{pkg_resources.EntryPoint} (C{module_name}, C{attrs}, C{extras},
+    C{dist}, C{load}, C{resolve} et C{require}).
+
+    @ivar value: Objet référencé, sous la forme C{module:attribut}.
+    @ivar project: Nom de la distribution qui fournit le point d'entrée.
+    @ivar location: Emplacement de la distribution.
+    """
+
+    __slots__ = ()
+
+    def __str__(self):
+        return '%s = %s' % (self.name, self.value)
+
+    def _split(self):
+        """
+        Décompose la valeur du point d'entrée
+        (C{module:attribut.attribut [extra, extra]}).
+
+        @return: Nom du module, attributs et "extras".
+        @rtype: C{tuple}
+        """
+        value, _sep, extras = self.value.partition('[')
+        module, _sep, attrs = value.partition(':')
+        attrs = attrs.strip()
+        extras = extras.rstrip().rstrip(']').split(',')
+        return (module.strip(),
+                tuple(attrs.split('.')) if attrs else (),
+                tuple(pkg_resources.safe_extra(extra.strip())
+                      for extra in extras if extra.strip()))
+
+    @property
+    def module_name(self):
+        """Nom du module référencé."""
+        return self._split()[0]
+
+    @property
+    def attrs(self):
+        """Attributs référencés dans le module, sous la forme d'un tuple."""
+        return self._split()[1]
+
+    @property
+    def extras(self):
+        """Options ("extras") requises par le point d'entrée."""
+        return self._split()[2]
+
+    @property
+    def dist(self):
+        """
+        Distribution qui fournit le point d'entrée : celle du
+        C{working_set} si elle s'y trouve, sinon celle présente
+        à l'emplacement indexé.
+
+        @rtype: C{pkg_resources.Distribution}
+        """
+        key = pkg_resources.safe_name(self.project).lower()
+        dist = pkg_resources.working_set.by_key.get(key)
+        if dist is not None and dist.location == self.location:
+            return dist
+        for dist in pkg_resources.find_distributions(self.location):
+            if dist.key == key:
+                return dist
+        return pkg_resources.Distribution(self.location,
+            project_name=self.project, version=self.version or None)
+
+    def load(self, require=True, *args, **kwargs):
+        """
+        Vérifie les dépendances du point d'entrée (cf. L{require}),
+        puis importe l'objet référencé (cf. L{resolve}).
+
+        @param require: Vérifier les dépendances.
+        @type require: C{bool}
+        @return: Objet référencé.
+        @raise ImportError: L'objet n'a pas pu être importé.
+        """
+        if require:
+            self.require(*args, **kwargs)
+        return self.resolve()
+
+    def resolve(self):
+        """
+        Importe l'objet référencé par le point d'entrée,
+        sans vérifier ses dépendances.
+
+        @return: Objet référencé.
+        @raise ImportError: L'objet n'a pas pu être importé.
+        """
+        module, attrs, _extras = self._split()
+        obj = __import__(module, fromlist=['__name__'])
+        for attr in attrs:
+            try:
+                obj = getattr(obj, attr)
+            except AttributeError as e:
+                raise ImportError(str(e))
+        return obj
+
+    def require(self, env=None, installer=None):
+        """
+        Ajoute au C{working_set} les dépendances de la distribution
+        et des "extras" du point d'entrée (cf. C{pkg_resources}).
+
+        @param env: Environnement dans lequel rechercher les distributions.
+        @type env: C{pkg_resources.Environment}
+        @param installer: Fonction installant les distributions absentes.
+        @type installer: C{callable}
+        @raise pkg_resources.ResolutionError: Les dépendances
+            n'ont pas pu être satisfaites.
+        """
+        extras = self.extras
+        reqs = self.dist.requires(extras)
+        working_set = pkg_resources.working_set
+        for item in working_set.resolve(reqs, env, installer, extras=extras):
+            working_set.add(item)
+
+
+def _parse_entry_points(data):
+    """
+    Analyse le contenu d'un fichier C{entry_points.txt}.
+
+    @param data: Contenu du fichier.
+    @type data: C{str}
+    @return: Triplets (groupe, nom, valeur).
+    @rtype: C{list}
+    """
+    results = []
+    group = None
+    for line in data.splitlines():
+        line = line.strip()
+        if not line or line.startswith(('#', ';')):
+            continue
+        if line.startswith('[') and line.endswith(']'):
+            group = line[1:-1].strip()
+            continue
+        name, sep, value = line.partition('=')
+        if group is None or not sep:
+            continue
+        results.append((group, name.strip(), value.strip()))
+    return results
+
+def _read_metadata(path, name):
+    """
+    Lit un fichier de métadonnées d'une distribution.
+
+    @param path: Dossier de métadonnées ou egg compressé.
+    @type path: C{str}
+    @param name: Nom du fichier de métadonnées.
+    @type name: C{str}
+    @return: Contenu du fichier, ou C{None} s'il n'existe pas.
+    @rtype: C{str}
+    """
+    try:
+        if os.path.isdir(path):
+            with open(os.path.join(path, name), 'rb') as f:
+                return f.read()
+        with zipfile.ZipFile(path) as egg:
+            return egg.read('EGG-INFO/' + name)
+    except (IOError, KeyError, zipfile.BadZipfile):
+        return None
+
+def _find_metadata(entry, follow_links=True):
+    """
+    Recherche les distributions présentes dans une entrée du C{sys.path},
+    de la même manière que C{pkg_resources} pour construire le
+    C{working_set}. Les fichiers C{.egg-link} créés par C{setup.py develop}
+    sont également suivis (cf. C{pkg_resources.resolve_egg_link}).
+
+    @param entry: Entrée du C{sys.path}.
+    @type entry: C{str}
+    @param follow_links: Suivre les fichiers C{.egg-link}.
+    @type follow_links: C{bool}
+    @return: Quadruplets (nom de base, emplacement des métadonnées,
+        emplacement de la distribution, fichier C{.egg-link} suivi
+        ou C{None}).
+    @rtype: C{list}
+    """
+    basename = os.path.basename(entry.rstrip(os.sep))
+    if basename.lower().endswith('.egg'):
+        if os.path.isdir(entry):
+            return [(basename, os.path.join(entry, 'EGG-INFO'), entry, None)]
+        if os.path.isfile(entry):
+            return [(basename, entry, entry, None)]
+        return []
+    try:
+        names = sorted(os.listdir(entry))
+    except OSError:
+        return []
+    results = []
+    for name in names:
+        path = os.path.join(entry, name)
+        lower = name.lower()
+        if lower.endswith(('.egg-info', '.dist-info')):
+            if os.path.isdir(path):
+                results.append((name, path, entry, None))
+        elif follow_links and lower.endswith('.egg-link'):
+            # Seule la première ligne non vide désigne la distribution
+            # (la suivante indique l'emplacement du script setup.py).
+            try:
+                with open(path, 'rb') as f:
+                    target = [line.strip() for line in f if line.strip()]
+            except IOError:
+                continue
+            if not target:
+                continue
+            target = os.path.normpath(os.path.join(entry, target[0]))
+            results.extend([(dist_name, metadata, location, path)
+                            for dist_name, metadata, location, _link
+                            in _find_metadata(target, False)])
+    return results
+
+def _scan(entries):
+    """
+    Construit la liste des points d'entrée des distributions présentes
+    dans un ensemble d'entrées du C{sys.path}. Seule la première
+    occurrence d'une distribution est prise en compte.
+
+    @param entries: Entrées du C{sys.path}.
+    @type entries: C{list}
+    @return: Couple contenant les points d'entrée, sous la forme de tuples
+        (cf. L{EntryPoint}), et les emplacements de métadonnées lus.
+    @rtype: C{tuple}
+    """
+    results = []
+    sources = []
+    seen = set()
+    for entry in entries:
+        for basename, metadata, location, link in _find_metadata(entry):
+            parts = os.path.splitext(basename)[0].split('-')
+            project = re.sub(r'[^A-Za-z0-9.]+', '-', parts[0])
+            key = project.lower()
+            if key in seen:
+                continue
+            seen.add(key)
+            if link is not None:
+                sources.append(link)
+            # Le dossier de métadonnées n'est pas modifié lorsqu'un
+            # de ses fichiers est réécrit : ce dernier est donc surveillé.
+            sources.append(metadata)
+            sources.append(os.path.join(metadata, 'entry_points.txt'))
+            data = _read_metadata(metadata, 'entry_points.txt')
+            if not data:
+                continue
+            if len(parts) > 1:
+                version = parts[1].replace('_', '-')
+            else:
+                version = ''
+                pkg_info = _read_metadata(metadata, 'PKG-INFO') or \
+                           _read_metadata(metadata, 'METADATA') or ''
+                match = re.search(r'^Version:\s*(\S+)', pkg_info, re.M)
+                if match:
+                    version = match.group(1)
+            for group, name, value in _parse_entry_points(data):
+                results.append((group, name, value, project, version,
+                                location))
+    return (results, sources)
+
+
+class EntryPointIndex(object):
+    """
+    Index des points d'entrée d'un ensemble d'entrées du C{sys.path}.
+    """
+
+    def __init__(self, entries=None, cache_file=None):
+        """
+        Construit l'index, en le chargeant depuis le cache si aucune
+        des entrées ni aucune distribution n'a été modifiée depuis
+        sa création.
+
+        @param entries: Entrées du C{sys.path} à indexer
+            (par défaut, celles du C{working_set}).
+        @type entries: C{list}
+        @param cache_file: Emplacement du cache. Par défaut, le cache est
+            placé dans le dossier indiqué par la variable d'environnement
+            C{VIGILO_SETTINGS_CACHE}, s'il a été défini.
+        @type cache_file: C{str}
+        """
+        if entries is None:
+            entries = pkg_resources.working_set.entries
+        self.entries = list(entries)
+        if cache_file is None and VigiloConfigObj.cache_dir:
+            cache_file = os.path.join(VigiloConfigObj.cache_dir,
+                "entrypoints-%s.cache" %
+                hashlib.md5(repr(self.entries)).hexdigest())
+
+        items = None
+        if cache_file is not None:
+            items = self._load_cache(cache_file)
+        if items is None:
+            items, sources = _scan(self.entries)
+            if cache_file is not None:
+                self._save_cache(cache_file, items, sources)
+
+        self._groups = {}
+        self._names = {}
+        for item in items:
+            ep = EntryPoint(*item)
+            self._groups.setdefault(ep.group, []).append(ep)
+            # Comme pour pkg_resources, le premier point d'entrée
+            # d'un nom donné masque les suivants.
+            self._names.setdefault((ep.group, ep.name), ep)
+
+    def _fingerprint(self, sources):
+        """Empreinte des entrées indexées et des métadonnées lues."""
+        return [[(path, _fingerprint(path)) for path in self.entries],
+                [(path, _fingerprint(path)) for path in sources]]
+
+    def _load_cache(self, cache_file):
+        """
+        Charge les points d'entrée depuis le cache.
+
+        @return: Points d'entrée, ou C{None} si le cache
+            n'est pas utilisable.
+        @rtype: C{list}
+        """
+        try:
+            with open(cache_file, 'rb') as f:
+                cache = marshal.load(f)
+        except (IOError, EOFError, ValueError, TypeError):
+            return None
+        try:
+            if cache['version'] != sys.version_info[:2] or \
+                    cache['fingerprint'] != \
+                    self._fingerprint(cache['sources']):
+                return None
+            items = cache['items']
+            # Un cache tronqué ou mal formé est reconstruit.
+            for item in items:
+                if len(item) != len(EntryPoint._fields):
+                    return None
+            return items
+        except (KeyError, TypeError):
+            return None
+
+    def _save_cache(self, cache_file, items, sources):
+        """Enregistre les points d'entrée dans le cache."""
+        _write_cache(cache_file, marshal.dumps({
+            'version': sys.version_info[:2],
+            'fingerprint': self._fingerprint(sources),
+            'sources': sources,
+            'items': items,
+        }))
+
+    def groups(self, prefixes=None):
+        """
+        Retourne les noms des groupes de points d'entrée.
+
+        @param prefixes: Préfixes des groupes recherchés
+            (par défaut, tous les groupes sont retournés).
+        @type prefixes: C{tuple}
+        @return: Noms des groupes, triés.
+        @rtype: C{list}
+        """
+        if prefixes is None:
+            return sorted(self._groups)
+        return sorted(group for group in self._groups
+                      if group.startswith(prefixes))
+
+    def providers(self, group):
+        """
+        Retourne les distributions qui fournissent des points d'entrée
+        dans un groupe.
+
+        @param group: Nom du groupe.
+        @type group: C{str}
+        @return: Noms et versions des distributions, triés.
+        @rtype: C{list}
+        """
+        return sorted(set('%s %s' % (ep.project, ep.version)
+                          for ep in self._groups.get(group, [])))
+
+    def entry_points(self, group):
+        """
+        Retourne les points d'entrée d'un groupe.
+
+        @param group: Nom du groupe.
+        @type group: C{str}
+        @return: Points d'entrée, dans l'ordre des distributions.
+        @rtype: C{list}
+        """
+        return list(self._groups.get(group, []))
+
+    def get(self, group, name):
+        """
+        Retourne un point d'entrée à partir de son nom.
+
+        @param group: Nom du groupe.
+        @type group: C{str}
+        @param name: Nom du point d'entrée.
+        @type name: C{str}
+        @return: Point d'entrée, ou C{None} s'il n'existe pas.
+        @rtype: L{EntryPoint}
+        """
+        return self._names.get((group, name))
+
+
+def get_index():
+    """
+    Retourne l'index partagé des points d'entrée du C{working_set}.
+    L'index est reconstruit lorsque des entrées y ont été ajoutées.
+
+    @rtype: L{EntryPointIndex}
+    """
+    global _index # pylint: disable-msg=W0603
+    index = _index
+    if index is None or index.entries != pkg_resources.working_set.entries:
+        with _index_lock:
+            index = _index
+            if index is None or \
+                    index.entries != pkg_resources.working_set.entries:
+                index = _index = EntryPointIndex()
+    return index
+
+def iter_entry_points(group, name=None):
+    """
+    Équivalent de C{pkg_resources.iter_entry_points},
+    reposant sur l'index partagé (cf. L{get_index}).
+
+    @param group: Nom du groupe.
+    @type group: C{str}
+    @param name: Nom du point d'entrée recherché (par défaut, tous les
+        points d'entrée du groupe). Comme pour C{pkg_resources}, les points
+        d'entrée portant ce nom dans chaque distribution sont retournés.
+    @type name: C{str}
+    @return: Points d'entrée, dans l'ordre des distributions.
+    @rtype: C{list}
+    """
+    entry_points = get_index().entry_points(group)
+    if name is None:
+        return entry_points
+    return [ep for ep in entry_points if ep.name == name]
@@ -5,21 +5,50 @@
 
 """
 Sets up logging, with twisted and multiprocessing integration.
+
+Any handler can be moved out of the caller's thread by adding the following
+keys to its [handler_*] section (see L{AsyncHandler})::
+    queue = yes
+    queue_size = 1000
+    overflow = block        ; or drop-oldest, drop-new
+
+Child processes created with multiprocessing can send their records
+to the parent process, which owns the real handlers (see L{LogSink}).
+The application enables this by calling L{start_log_sink} before creating
+its child processes, or in the [handlers] section::
+    multiprocess = yes
 """
 from __future__ import absolute_import
 
 import os.path, sys
-import logging, logging.config # pylint: disable-msg=W0406
+import re
+import json
+import errno
+import atexit
+import shutil
+import tempfile
+import cPickle
+import logging, logging.config, logging.handlers # pylint: disable-msg=W0406
+import socket
+import select
 import warnings
+import threading
+import collections
 
 from vigilo.common.conf import settings, log_initialized
 
 try:
     from multiprocessing import current_process
+    from multiprocessing.process import Process
+    from multiprocessing.util import register_after_fork, Finalize
 except ImportError:
-    current_process = None # pylint: disable-msg=C0103
+    current_process = Process = None # pylint: disable-msg=C0103
+    register_after_fork = Finalize = None # pylint: disable-msg=C0103
 
-__all__ = ( 'get_logger', 'fileConfig')
+__all__ = ( 'get_logger', 'fileConfig', 'AsyncHandler', 'BatchedSysLogHandler',
+            'VigiloJSONFormatter', 'LogSink', 'LogSinkHandler',
+            'start_log_sink', 'stop_log_sink', 'attach_log_sink',
+            'register_context_provider', 'unregister_context_provider' )
 
 
 # Adapté depuis le code du module logging.config de Python 2.6
@@ -40,6 +69,11 @@ def fileConfig(disable_existing_loggers=1):
     # critical section
     logging._acquireLock()
     try:
+        # Les threads d'écriture de la configuration précédente sont
+        # arrêtés après la libération du verrou, qu'ils peuvent attendre.
+        old_handlers = [ref() for ref in logging._handlerList]
+        old_handlers = [handler for handler in old_handlers
+                        if isinstance(handler, AsyncHandler)]
         logging._handlers.clear()
         del logging._handlerList[:]
         # Handlers add themselves to logging._handlers
@@ -48,6 +82,13 @@ def fileConfig(disable_existing_loggers=1):
     finally:
         logging._releaseLock()
 
+    for handler in old_handlers:
+        handler.close()
+
+    # Un processus rattaché au LogSink de son parent le reste.
+    if _log_sink_child and _log_sink_child[0] == os.getpid():
+        attach_log_sink(_log_sink_child[1])
+
 
 # Adapté depuis le code du module logging.config de Python 2.6
 # Copyright 2001-2007 by Vinay Sajip.
@@ -151,6 +192,11 @@ def _install_handlers(formatters):
             target = opts.get("target", "")
             if len(target): #the target handler may not be loaded yet, so keep for later...
                 fixups.append((h, target))
+        # Le handler peut être déporté dans un thread dédié.
+        if "queue" in opts and opts.as_bool("queue"):
+            queue_size = int(opts.get("queue_size", 1000))
+            overflow = opts.get("overflow", "block")
+            h = AsyncHandler(h, queue_size, overflow)
         handlers[hand] = h
     #now all handlers are loaded, fixup inter-handler references...
     for h, t in fixups:
@@ -276,6 +322,11 @@ def get_logger(name, silent_load=False):
         # On configure les logs depuis le(s) fichier(s) de configuration.
         fileConfig()
 
+        # Les processus fils transmettront leurs enregistrements
+        # au processus courant, seul à écrire dans les journaux
+        # (si la configuration le demande).
+        _setup_log_sink()
+
         # Si Twisted est utilisé, on le configure pour transmettre
         # ses messages de log aux mécanismes classiques de C{logging}.
         # ATTENTION: cela doit être fait *après* le fileConfig ci-dessus,
@@ -327,10 +378,24 @@ class VigiloFormatter(logging.Formatter):
     def format(self, record):
         """
         Formatte l'enregistrement à journaliser en prenant soin
-        d'adapter l'encoding si nécessaire.
-        Cette méthode injecte également certaines informations
-        dans l'enregistrement lorsqu'elle le peut. Les informations
-        injectées sont :
+        d'adapter l'encoding si nécessaire, après y avoir injecté
+        les informations de contexte (cf. L{add_context}).
+
+        @param record: Enregistrement de journalisation à formatter.
+        @type record: L{LogRecord<https://docs.python.org/2/library/logging.html#logging.LogRecord>}
+        @return: Message formatté représentant le contenu de l'enregistrement.
+        @rtype: C{str}
+        """
+        self.add_context(record)
+        t = logging.Formatter.format(self, record)
+        if isinstance(t, unicode):
+            t = t.encode(self.encoding, 'replace')
+        return t
+
+    def add_context(self, record):
+        """
+        Injecte certaines informations dans l'enregistrement
+        lorsqu'elle le peut. Les informations injectées sont :
         -   Nom du processus (processName)
         -   Vrai nom du processus en cas d'utilisation
             du module C{multiprocessing} (multiprocessName)
@@ -338,11 +403,16 @@ class VigiloFormatter(logging.Formatter):
         -   Le nom complet de l'utilisateur connecté (user_fullname)
         -   L'adresse IP de l'utilisateur connecté (user_ip)
         -   Le nom de l'application manipulée (vigilo_app)
+        -   Les informations fournies par les fonctions enregistrées
+            à l'aide de L{register_context_provider}
 
-        @param record: Enregistrement de journalisation à formatter.
+        Les informations propres à l'utilisateur ne sont pas remplacées
+        si elles sont déjà présentes : cette méthode peut donc être appelée
+        depuis le thread qui émet l'enregistrement (cf. L{AsyncHandler}),
+        voire depuis le processus qui l'émet (cf. L{LogSinkHandler}).
+
+        @param record: Enregistrement de journalisation.
         @type record: L{LogRecord<https://docs.python.org/2/library/logging.html#logging.LogRecord>}
-        @return: Message formatté représentant le contenu de l'enregistrement.
-        @rtype: C{str}
         """
         # On préfèrerait utiliser une classe qui hérite de Logger
         # pour éviter de faire ces opérations pour chaque message
@@ -350,53 +420,1078 @@ class VigiloFormatter(logging.Formatter):
         # Malheureusement, les bibliothèques externes (ex: Twisted)
         # n'utiliseront pas forcément notre classe et échoueront
         # si le format des messages contient 'processName', etc.
-        record.processName = os.path.basename(sys.argv[0])
-        if not current_process:
-            record.multiprocessName = '???'
-        else:
-            record.multiprocessName = current_process().name
-
+        # Ces informations ne changent pas au cours de la vie du processus :
+        # elles ne sont calculées qu'une seule fois par processus.
+        # Celles d'un enregistrement émis par un autre processus
+        # (cf. L{LogSink}) sont conservées.
+        pid = os.getpid()
+        if record.process == pid or 'multiprocessName' not in record.__dict__:
+            context = _process_context.get(pid)
+            if context is None:
+                context = _get_process_context()
+            record.processName, record.multiprocessName = context
 
-        # Ajoute des infos liées à l'environnement de l'IHM web.
+        # Ajoute des infos liées à l'environnement (ex : IHM web).
         # Chaque champ vaudra "???" si la valeur ne peut être déterminée
         # et si les arguments du log ne spécifient pas non plus de valeur.
-        fields = {
-            'user_login': '???',
-            'user_fullname': '???',
-            'user_ip': '???',
-        }
+        fields = _DEFAULT_CONTEXT.copy()
+        for provider in _context_providers:
+            values = provider(record)
+            if values:
+                fields.update(values)
+        attrs = record.__dict__
+        for field, value in fields.iteritems():
+            if field not in attrs:
+                attrs[field] = value
+        record.app_name = '???'
+
+
+class VigiloJSONFormatter(VigiloFormatter):
+    """
+    Formateur produisant un objet JSON par enregistrement, directement
+    exploitable par un outil d'indexation des journaux.
 
+    Les champs produits sont ceux utilisés par le format indiqué
+    (ex : C{%(asctime)s %(levelname)s %(message)s}), ou à défaut
+    ceux de L{DEFAULT_FIELDS}. Les informations de contexte de Vigilo
+    (cf. L{VigiloFormatter.add_context}) peuvent y figurer. La pile
+    d'appels d'une éventuelle exception est ajoutée dans le champ
+    C{exception}.
+
+    Exemple de configuration::
+
+        [formatter_json]
+        class = vigilo.common.logging.VigiloJSONFormatter
+        format = %(asctime)s %(levelname)s %(name)s %(message)s %(vigilo_app)s
+    """
+
+    DEFAULT_FIELDS = ('asctime', 'created', 'name', 'levelname', 'message',
+                      'process', 'processName', 'multiprocessName',
+                      'user_login', 'user_fullname', 'user_ip', 'vigilo_app')
+
+    def __init__(self, fmt=None, datefmt=None, encoding='utf-8'):
+        VigiloFormatter.__init__(self, fmt, datefmt, encoding)
+        fields = fmt and re.findall(r'%\((\w+)\)', fmt)
+        self.fields = tuple(fields or self.DEFAULT_FIELDS)
+        self._uses_time = 'asctime' in self.fields
+        # Les chaînes d'octets sont décodées (une seule fois) par
+        # l'encodeur, qui produit directement une chaîne ASCII.
+        self._encoder = json.JSONEncoder(separators=(',', ':'),
+                                         encoding=encoding, default=repr)
+
+    def usesTime(self):
+        return self._uses_time
+
+    def format(self, record):
+        """
+        Formatte l'enregistrement sous la forme d'un objet JSON.
+
+        @param record: Enregistrement de journalisation à formatter.
+        @type record: L{LogRecord<https://docs.python.org/2/library/logging.html#logging.LogRecord>}
+        @return: Objet JSON représentant l'enregistrement.
+        @rtype: C{str}
+        """
+        self.add_context(record)
+        record.message = record.getMessage()
+        if self._uses_time:
+            record.asctime = self.formatTime(record, self.datefmt)
+        data = dict(zip(self.fields, map(record.__dict__.get, self.fields)))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
         try:
-            from tg import request
-            fields['user_ip'] = request.remote_addr
-            if getattr(request, 'identity', None):
-                fields['user_login'] = request.identity['repoze.who.userid']
-                fields['user_fullname'] = request.identity['fullname']
-        except (ImportError, TypeError):
-            # Une exception "TypeError" est levée lorsqu'aucune requête HTTP
-            # n'est disponible dans le contexte d'exécution courant,
-            # par exemple pour les logs concernant les requêtes SQL.
-            pass
+            return self._encoder.encode(data)
+        except UnicodeDecodeError:
+            # Chaîne d'octets dans un autre encodage : les caractères
+            # invalides sont remplacés.
+            for key, value in data.iteritems():
+                if isinstance(value, str):
+                    data[key] = value.decode(self.encoding, 'replace')
+            return self._encoder.encode(data)
 
-        for field in fields:
-            if not hasattr(record, field):
-                setattr(record, field, fields[field])
 
+# Valeurs par défaut des informations de contexte.
+_DEFAULT_CONTEXT = {
+    'user_login': '???',
+    'user_fullname': '???',
+    'user_ip': '???',
+    'vigilo_app': '???',
+}
+# Informations propres au processus, indexées par PID :
+# (processName, multiprocessName).
+_process_context = {}
+# Modules de TurboGears (request, config), ou () si TurboGears
+# n'est pas disponible. Ils ne sont recherchés qu'une seule fois.
+_tg_modules = None
 
-        # Ajoute le nom de l'IHM manipulée dans "vigilo_app".
-        record.app_name = '???'
+def _get_process_context():
+    """
+    Calcule les informations propres au processus courant
+    (cf. L{VigiloFormatter.add_context}).
+
+    @return: Couple (processName, multiprocessName).
+    @rtype: C{tuple}
+    """
+    if not current_process:
+        multiprocess_name = '???'
+    else:
+        multiprocess_name = current_process().name
+    context = (os.path.basename(sys.argv[0]), multiprocess_name)
+    # Le dictionnaire est hérité lors d'un fork() : on oublie
+    # les informations des autres processus.
+    _process_context.clear()
+    _process_context[os.getpid()] = context
+    return context
+
+def _tg_context(record): # pylint: disable-msg=W0613
+    """
+    Fournit les informations de contexte liées à l'IHM web
+    (utilisateur connecté et nom de l'application), lorsque
+    TurboGears est disponible.
+    """
+    global _tg_modules # pylint: disable-msg=W0603
+    if _tg_modules is None:
         try:
-            from tg import config
-            if hasattr(config, 'app_name'):
-                record.vigilo_app = 'vigilo-%s' % \
-                    getattr(config, 'app_name').lower()
+            from tg import request, config
         except ImportError:
+            _tg_modules = ()
+        else:
+            _tg_modules = (request, config)
+    if not _tg_modules:
+        return None
+
+    request, config = _tg_modules
+    fields = {}
+    try:
+        # Comme hasattr() sous Python 2, on ignore toute erreur levée
+        # par la configuration (par exemple hors d'une application).
+        app_name = getattr(config, 'app_name', None)
+    except Exception: # pylint: disable-msg=W0703
+        app_name = None
+    if app_name:
+        fields['vigilo_app'] = 'vigilo-%s' % app_name.lower()
+    try:
+        fields['user_ip'] = request.remote_addr
+        if getattr(request, 'identity', None):
+            fields['user_login'] = request.identity['repoze.who.userid']
+            fields['user_fullname'] = request.identity['fullname']
+    except TypeError:
+        # Une exception "TypeError" est levée lorsqu'aucune requête HTTP
+        # n'est disponible dans le contexte d'exécution courant,
+        # par exemple pour les logs concernant les requêtes SQL.
+        pass
+    return fields
+
+# Fonctions fournissant des informations de contexte
+# (cf. L{register_context_provider}).
+_context_providers = [_tg_context]
+
+def register_context_provider(provider):
+    """
+    Enregistre une fonction fournissant des informations de contexte
+    à injecter dans les enregistrements formatés par L{VigiloFormatter}.
+
+    La fonction reçoit l'enregistrement et retourne un dictionnaire
+    des champs à injecter (ou C{None}). Les champs déjà présents dans
+    l'enregistrement (ex : passés via C{extra}) ne sont pas remplacés.
+    En cas de conflit, la dernière fonction enregistrée l'emporte.
+
+    @param provider: Fonction fournissant des informations de contexte.
+    @type provider: C{callable}
+    """
+    if provider not in _context_providers:
+        _context_providers.append(provider)
+
+def unregister_context_provider(provider):
+    """
+    Supprime une fonction enregistrée à l'aide
+    de L{register_context_provider}.
+
+    @param provider: Fonction à supprimer.
+    @type provider: C{callable}
+    """
+    try:
+        _context_providers.remove(provider)
+    except ValueError:
+        pass
+
+class AsyncHandler(logging.Handler):
+    """
+    Handler qui transmet les enregistrements à un autre handler
+    (la cible) depuis un thread dédié, au travers d'une file d'attente
+    bornée. Les écritures lentes de la cible (syslog, disque, etc.)
+    ne bloquent ainsi plus le thread appelant (ex : le réacteur Twisted).
+
+    Lorsque la file d'attente est pleine, le comportement dépend
+    de la politique choisie :
+      - C{block} : l'appelant attend qu'une place se libère ;
+      - C{drop-oldest} : l'enregistrement le plus ancien est abandonné ;
+      - C{drop-new} : le nouvel enregistrement est abandonné.
+
+    Les compteurs C{queued}, C{written} et C{dropped} indiquent
+    respectivement le nombre d'enregistrements mis en file d'attente,
+    transmis à la cible et abandonnés.
+
+    Les enregistrements en attente sont transmis à la cible lors
+    de l'appel à L{flush} ou L{close} (et donc à la fin du programme,
+    cf. C{logging.shutdown}).
+    """
+
+    OVERFLOW_POLICIES = ('block', 'drop-oldest', 'drop-new')
+
+    def __init__(self, target, queue_size=1000, overflow='block'):
+        """
+        Initialisation du handler.
+
+        @param target: Handler auquel les enregistrements sont transmis.
+        @type target: C{logging.Handler}
+        @param queue_size: Taille maximale de la file d'attente.
+        @type queue_size: C{int}
+        @param overflow: Politique appliquée lorsque la file d'attente
+            est pleine (C{block}, C{drop-oldest} ou C{drop-new}).
+        @type overflow: C{str}
+        @raise ValueError: La politique ou la taille est invalide.
+        """
+        logging.Handler.__init__(self, target.level)
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError("Invalid overflow policy: %s" % overflow)
+        if queue_size < 1:
+            raise ValueError("Invalid queue size: %d" % queue_size)
+        self.target = target
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.queued = 0
+        self.written = 0
+        self.dropped = 0
+        # Protège le redémarrage du thread d'écriture après un fork().
+        self._start_lock = threading.Lock()
+        self._start()
+
+    def _start(self):
+        """Crée la file d'attente et démarre le thread d'écriture."""
+        self._queue = collections.deque()
+        self._cond = threading.Condition(threading.Lock())
+        # Nombre d'enregistrements en file d'attente ou en cours d'écriture.
+        self._pending = 0
+        self._closing = False
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run,
+                                        name="AsyncHandler-%s" %
+                                             self.target.__class__.__name__)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def prepare(self, record):
+        """
+        Prépare un enregistrement avant sa mise en file d'attente :
+        les informations qui dépendent du contexte de l'appelant sont
+        calculées dans le thread appelant. L'enregistrement d'origine,
+        également transmis aux autres handlers, n'est pas modifié.
+
+        @param record: Enregistrement de journalisation.
+        @type record: C{logging.LogRecord}
+        @return: Copie préparée de l'enregistrement.
+        @rtype: C{logging.LogRecord}
+        """
+        record = logging.makeLogRecord(dict(record.__dict__))
+        formatter = self.target.formatter
+        if hasattr(formatter, 'add_context'):
+            formatter.add_context(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # On ne conserve pas les frames de la pile d'appels.
+            record.exc_text = (formatter or logging._defaultFormatter) \
+                .formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        if os.getpid() != self._pid:
+            # Le thread d'écriture ne survit pas à un fork().
+            with self._start_lock:
+                if os.getpid() != self._pid:
+                    self._start()
+        if self._closing or threading.current_thread() is self._thread:
+            # Handler fermé, ou message émis par la cible elle-même :
+            # il est écrit directement, pour ne pas rester bloqué
+            # sur la file d'attente.
+            self.target.handle(record)
+            return
+        try:
+            record = self.prepare(record)
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except Exception:
+            self.handleError(record)
+            return
+
+        with self._cond:
+            while len(self._queue) >= self.queue_size:
+                if self.overflow == 'drop-new':
+                    self.dropped += 1
+                    return
+                if self.overflow == 'drop-oldest':
+                    self._queue.popleft()
+                    self._pending -= 1
+                    self.dropped += 1
+                else:
+                    self._cond.wait()
+            self._queue.append(record)
+            self._pending += 1
+            self.queued += 1
+            self._cond.notify_all()
+
+    def _run(self):
+        """Boucle du thread d'écriture."""
+        while True:
+            with self._cond:
+                while not self._queue and not self._closing:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                record = self._queue.popleft()
+                # Libère les appelants en attente d'une place.
+                self._cond.notify_all()
+            try:
+                self.target.handle(record)
+            except Exception: # pylint: disable-msg=W0703
+                self.target.handleError(record)
+            with self._cond:
+                self._pending -= 1
+                self.written += 1
+                self._cond.notify_all()
+
+    def flush(self):
+        """
+        Attend que tous les enregistrements en file d'attente
+        aient été transmis à la cible, puis vide cette dernière.
+        """
+        if os.getpid() == self._pid and \
+                threading.current_thread() is not self._thread:
+            with self._cond:
+                while self._pending and self._thread.is_alive():
+                    self._cond.wait(0.1)
+        self.target.flush()
+
+    def close(self):
+        """
+        Transmet les enregistrements en attente à la cible
+        et arrête le thread d'écriture.
+        La cible n'est pas fermée.
+        """
+        self.flush()
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        if threading.current_thread() is not self._thread:
+            self._thread.join()
+        logging.Handler.close(self)
+
+class BatchedSysLogHandler(logging.handlers.SysLogHandler):
+    """
+    Variante de C{SysLogHandler} qui regroupe les enregistrements
+    et les envoie par lots, lorsque le lot atteint un nombre
+    d'enregistrements ou une taille donnés, ou au plus tard après
+    un délai donné.
+
+    Le regroupement ne réduit le nombre d'appels système que sur une
+    socket en mode flux (TCP ou socket Unix C{SOCK_STREAM}) : les
+    messages d'un lot y sont préfixés par leur taille (comptage d'octets,
+    cf. RFC 6587), ce qui préserve les messages sur plusieurs lignes,
+    et envoyés en un seul appel système. C'est la configuration
+    recommandée, avec une socket d'écoute en mode flux côté démon syslog
+    (par exemple le module C{imptcp} de rsyslog).
+
+    Sur une socket en mode datagramme (cas de C{/dev/log} en général),
+    chaque message reste un datagramme distinct, envoyé par un appel
+    système dédié : le handler se contente alors de différer l'envoi.
+
+    Les compteurs C{sent} et C{dropped} indiquent respectivement
+    le nombre de messages envoyés et perdus (erreur d'envoi).
+
+    Exemple de configuration::
+
+        [handler_syslog]
+        class = vigilo.common.logging.BatchedSysLogHandler
+        ; adresse, facility, type de socket, taille des lots, délai
+        args = ('/var/run/vigilo/syslog.sock', 'daemon', 'stream', 100, 0.5)
+    """
+
+    def __init__(self, address=('localhost',
+                                logging.handlers.SYSLOG_UDP_PORT),
+                 facility=logging.handlers.SysLogHandler.LOG_USER,
+                 socktype=None, batch_size=100, flush_interval=1.0,
+                 batch_bytes=65536):
+        """
+        Initialisation du handler.
+
+        @param address: Adresse du serveur syslog (cf. C{SysLogHandler}).
+        @param facility: Facility des messages.
+        @param socktype: Type de socket (cf. C{SysLogHandler}),
+            ou l'un des noms C{'stream'} et C{'dgram'}, utilisables
+            depuis le fichier de configuration.
+        @param batch_size: Nombre maximum d'enregistrements par lot.
+        @type batch_size: C{int}
+        @param flush_interval: Délai maximum (en secondes) avant l'envoi
+            d'un enregistrement.
+        @type flush_interval: C{float}
+        @param batch_bytes: Taille maximale (en octets) d'un lot.
+        @type batch_bytes: C{int}
+        """
+        # Le handler est enregistré auprès de logging (et donc vidé
+        # à la fin du programme) avant même la connexion à la socket.
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.batch_bytes = batch_bytes
+        self.sent = 0
+        self.dropped = 0
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._pid = None
+        self._stop = threading.Event()
+        if socktype == 'stream':
+            socktype = socket.SOCK_STREAM
+        elif socktype == 'dgram':
+            socktype = socket.SOCK_DGRAM
+        logging.handlers.SysLogHandler.__init__(self, address, facility,
+                                                socktype)
+
+    def _start_timer(self):
+        """Démarre le thread chargé d'envoyer les lots incomplets."""
+        self._pid = os.getpid()
+        # Les messages hérités du processus parent sont envoyés par celui-ci.
+        self._buffer = []
+        self._buffer_bytes = 0
+        thread = threading.Thread(target=self._run,
+                                  name="BatchedSysLogHandler")
+        thread.daemon = True
+        thread.start()
+
+    def _run(self):
+        """Envoie périodiquement le lot en cours."""
+        pid = self._pid
+        while not self._stop.wait(self.flush_interval):
+            if os.getpid() != pid:
+                return
+            self.flush()
+
+    def emit(self, record):
+        """
+        Ajoute un enregistrement au lot en cours,
+        et envoie le lot s'il est complet.
+        """
+        if self._pid != os.getpid():
+            self._start_timer()
+        try:
+            msg = self.format(record)
+            if isinstance(msg, unicode):
+                msg = msg.encode('utf-8')
+            msg = '<%d>%s' % (self.encodePriority(
+                self.facility, self.mapPriority(record.levelname)), msg)
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except Exception:
+            self.handleError(record)
+            return
+        # La méthode est appelée en détenant le verrou du handler.
+        self._buffer.append(msg)
+        self._buffer_bytes += len(msg)
+        if len(self._buffer) >= self.batch_size or \
+                self._buffer_bytes >= self.batch_bytes:
+            self._send()
+
+    def flush(self):
+        """Envoie le lot en cours."""
+        self.acquire()
+        try:
+            if self._pid != os.getpid():
+                # Les messages hérités du processus parent
+                # sont envoyés par celui-ci.
+                self._buffer = []
+                self._buffer_bytes = 0
+            self._send()
+        finally:
+            self.release()
+
+    def _send(self):
+        """Envoie le lot en cours (le verrou doit être détenu)."""
+        batch = self._buffer
+        if not batch:
+            return
+        self._buffer = []
+        self._buffer_bytes = 0
+        if self.socktype == socket.SOCK_STREAM:
+            messages = [''.join(['%d %s' % (len(msg), msg)
+                                 for msg in batch])]
+        else:
+            # Comme SysLogHandler, on termine chaque datagramme par un
+            # caractère nul, nécessaire pour certains démons syslog.
+            messages = [msg + '\000' for msg in batch]
+        done = 0
+        try:
+            for data in messages:
+                self._send_data(data)
+                done += 1
+        except socket.error:
             pass
+        if self.socktype == socket.SOCK_STREAM:
+            done *= len(batch)
+        self.sent += done
+        self.dropped += len(batch) - done
 
-        t = logging.Formatter.format(self, record)
-        if isinstance(t, unicode):
-            t = t.encode(self.encoding, 'replace')
-        return t
+    def _send_data(self, data):
+        """
+        Envoie des données sur la socket, en rétablissant
+        la connexion à une socket Unix en cas d'erreur.
+
+        @param data: Données à envoyer.
+        @type data: C{str}
+        @raise socket.error: Les données n'ont pas pu être envoyées.
+        """
+        if self.unixsocket:
+            try:
+                self.socket.sendall(data)
+            except socket.error:
+                self.socket.close()
+                self._connect_unixsocket(self.address)
+                self.socket.sendall(data)
+        elif self.socktype == socket.SOCK_DGRAM:
+            self.socket.sendto(data, self.address)
+        else:
+            self.socket.sendall(data)
+
+    def close(self):
+        """Envoie le lot en cours, puis ferme la socket."""
+        self._stop.set()
+        self.flush()
+        logging.handlers.SysLogHandler.close(self)
+
+class LogSink(object):
+    """
+    Point de collecte, dans le processus parent, des enregistrements
+    émis par ses processus fils (cf. L{LogSinkHandler}).
+
+    Chaque processus fils se connecte à une socket Unix en mode
+    C{SOCK_SEQPACKET} et y envoie un message par enregistrement.
+    Un thread dédié reçoit ces enregistrements et les confie aux loggers
+    du processus parent, et donc aux handlers configurés par L{fileConfig}.
+    Seul le processus parent écrit dans les journaux : les lignes des
+    différents processus ne sont plus entremêlées et la rotation
+    des fichiers fonctionne.
+
+    La socket est créée dans un dossier temporaire accessible
+    uniquement à l'utilisateur courant.
+
+    Les compteurs C{received} et C{errors} indiquent respectivement
+    le nombre d'enregistrements reçus et de messages invalides.
+    """
+
+    # Taille maximale d'un enregistrement sérialisé.
+    MAX_SIZE = 65536
+
+    def __init__(self):
+        """
+        Crée la socket et démarre le thread de réception.
+
+        @raise socket.error: La socket n'a pas pu être créée.
+        """
+        self.received = 0
+        self.errors = 0
+        self._pid = os.getpid()
+        self._stopping = False
+        self._dir = tempfile.mkdtemp(prefix='vigilo-log-')
+        self.address = os.path.join(self._dir, 'sink')
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        try:
+            self._socket.bind(self.address)
+            self._socket.listen(socket.SOMAXCONN)
+        except socket.error:
+            self._socket.close()
+            shutil.rmtree(self._dir, True)
+            raise
+        # Tube permettant de réveiller le thread de réception.
+        self._wakeup = os.pipe()
+        self._thread = threading.Thread(target=self._run, name="LogSink")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        """Boucle du thread de réception."""
+        listener = self._socket.fileno()
+        wakeup = self._wakeup[0]
+        conns = {}
+        poller = select.poll()
+        poller.register(listener, select.POLLIN)
+        poller.register(wakeup, select.POLLIN)
+        try:
+            while True:
+                try:
+                    events = poller.poll()
+                except select.error as e:
+                    if e.args[0] == errno.EINTR:
+                        continue
+                    raise
+                for fd, _event in events:
+                    if fd == wakeup:
+                        # Traite les enregistrements déjà envoyés.
+                        for conn in conns.values():
+                            self._receive(conn)
+                        return
+                    if fd == listener:
+                        try:
+                            conn = self._socket.accept()[0]
+                        except socket.error:
+                            continue
+                        conn.setblocking(False)
+                        conns[conn.fileno()] = conn
+                        poller.register(conn, select.POLLIN)
+                    elif not self._receive(conns[fd]):
+                        poller.unregister(fd)
+                        conns.pop(fd).close()
+        finally:
+            for conn in conns.values():
+                conn.close()
+
+    def _receive(self, conn):
+        """
+        Reçoit et traite les enregistrements disponibles sur une connexion.
+
+        @return: C{False} si la connexion a été fermée par le processus fils.
+        @rtype: C{bool}
+        """
+        while True:
+            try:
+                data = conn.recv(self.MAX_SIZE)
+            except socket.error as e:
+                if e.errno == errno.EINTR:
+                    continue
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return True
+                return False
+            if not data:
+                return False
+            self.dispatch(data)
+
+    def dispatch(self, data):
+        """
+        Transmet un enregistrement reçu au logger correspondant
+        du processus courant.
+
+        @param data: Enregistrement sérialisé (cf. L{LogSinkHandler}).
+        @type data: C{str}
+        """
+        try:
+            # Contrairement à logging.makeLogRecord, on ne calcule pas
+            # des attributs qui seraient aussitôt remplacés.
+            record = logging.LogRecord.__new__(logging.LogRecord)
+            record.__dict__.update(cPickle.loads(data))
+            if record.name == logging.root.name:
+                logger = logging.root
+            else:
+                logger = logging.getLogger(record.name)
+            # Le niveau du logger a déjà été vérifié par le processus fils.
+            logger.handle(record)
+        except Exception: # pylint: disable-msg=W0703
+            self.errors += 1
+        else:
+            self.received += 1
+
+    def stop(self, timeout=5.0):
+        """
+        Traite les enregistrements déjà reçus, puis arrête
+        le thread de réception et supprime la socket.
+        Sans effet dans un processus fils.
+
+        @param timeout: Délai maximum (en secondes) de traitement
+            des enregistrements en attente.
+        @type timeout: C{float}
+        """
+        if os.getpid() != self._pid or self._stopping:
+            return
+        self._stopping = True
+        os.write(self._wakeup[1], '\0')
+        self._thread.join(timeout)
+        self._socket.close()
+        for fd in self._wakeup:
+            os.close(fd)
+        shutil.rmtree(self._dir, True)
+
+
+class LogSinkHandler(logging.Handler):
+    """
+    Handler utilisé par un processus fils pour transmettre ses
+    enregistrements au L{LogSink} du processus parent.
+
+    Les informations de contexte (cf. L{VigiloFormatter.add_context})
+    et le message sont calculés dans le processus fils, puis chaque
+    enregistrement est envoyé en un seul message, sans bloquer.
+    Si le processus parent ne suit pas, les enregistrements sont conservés
+    dans une file d'attente bornée et envoyés lors des appels suivants
+    (ou lors de L{flush}). Lorsque cette file est pleine, le comportement
+    dépend de la politique choisie :
+      - C{block} : l'appelant attend que les enregistrements
+        en attente aient été envoyés ;
+      - C{drop-new} : le nouvel enregistrement est abandonné.
+
+    Les compteurs C{sent} et C{dropped} indiquent respectivement
+    le nombre d'enregistrements envoyés et perdus (file d'attente
+    pleine, processus parent arrêté, enregistrement trop volumineux).
+    """
+
+    OVERFLOW_POLICIES = ('block', 'drop-new')
+
+    def __init__(self, address, backlog=1000, overflow='block', timeout=1.0):
+        """
+        Initialisation du handler.
+
+        @param address: Emplacement de la socket du L{LogSink}.
+        @type address: C{str}
+        @param backlog: Nombre maximum d'enregistrements en attente
+            d'envoi.
+        @type backlog: C{int}
+        @param overflow: Politique appliquée lorsque la file d'attente
+            est pleine (C{block} ou C{drop-new}).
+        @type overflow: C{str}
+        @param timeout: Délai maximum (en secondes) d'envoi
+            d'un enregistrement lors de L{flush}.
+        @type timeout: C{float}
+        @raise ValueError: La politique est invalide.
+        """
+        logging.Handler.__init__(self)
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError("Invalid overflow policy: %s" % overflow)
+        self.address = address
+        self.backlog = backlog
+        self.overflow = overflow
+        self.timeout = timeout
+        self.sent = 0
+        self.dropped = 0
+        self._pending = collections.deque()
+        self._context = VigiloFormatter()
+        self._socket = None
+        self._pid = None
+
+    def _connect(self):
+        """
+        Se connecte au L{LogSink}.
+
+        @raise socket.error: La connexion a échoué.
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        try:
+            sock.connect(self.address)
+        except socket.error:
+            sock.close()
+            raise
+        sock.setblocking(False)
+        self._socket = sock
+
+    def serialize(self, record):
+        """
+        Sérialise un enregistrement.
+
+        @param record: Enregistrement de journalisation.
+        @type record: C{logging.LogRecord}
+        @return: Enregistrement sérialisé, ou C{None} s'il est
+            trop volumineux.
+        @rtype: C{str}
+        """
+        self._context.add_context(record)
+        attrs = dict(record.__dict__)
+        attrs['msg'] = record.getMessage()
+        attrs['args'] = None
+        attrs['exc_info'] = None
+        if record.exc_info and not record.exc_text:
+            attrs['exc_text'] = self._context.formatException(record.exc_info)
+        try:
+            data = cPickle.dumps(attrs, 2)
+        except Exception: # pylint: disable-msg=W0703
+            # Attributs ajoutés par l'appelant (cf. paramètre "extra")
+            # qui ne peuvent pas être sérialisés.
+            for key, value in attrs.items():
+                try:
+                    cPickle.dumps(value, 2)
+                except Exception: # pylint: disable-msg=W0703
+                    attrs[key] = repr(value)
+            data = cPickle.dumps(attrs, 2)
+        if len(data) > LogSink.MAX_SIZE:
+            # On conserve le début du message et la fin de la pile d'appels.
+            size = LogSink.MAX_SIZE // 4
+            attrs['msg'] = attrs['msg'][:size] + '...'
+            if attrs.get('exc_text'):
+                attrs['exc_text'] = '...' + attrs['exc_text'][-size:]
+            data = cPickle.dumps(attrs, 2)
+            if len(data) > LogSink.MAX_SIZE:
+                return None
+        return data
+
+    def emit(self, record):
+        # Un enregistrement qui se propage à plusieurs loggers n'est
+        # envoyé qu'une seule fois : le processus parent se charge
+        # de la propagation.
+        attrs = record.__dict__
+        if attrs.get('_vigilo_sink'):
+            return
+        attrs['_vigilo_sink'] = True
+        try:
+            data = self.serialize(record)
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except Exception:
+            self.handleError(record)
+            return
+        if data is None:
+            self.dropped += 1
+            return
+        # La méthode est appelée en détenant le verrou du handler.
+        if self._pid != os.getpid():
+            # Les enregistrements en attente hérités du processus parent
+            # sont envoyés par celui-ci.
+            self._pending.clear()
+            self._socket = None
+            self._pid = os.getpid()
+        if self._pending:
+            self._send_pending()
+        if self._pending or not self._send(data):
+            if len(self._pending) >= self.backlog:
+                if self.overflow == 'drop-new':
+                    self.dropped += 1
+                    return
+                self._wait_pending()
+            self._pending.append(data)
+
+    def _send(self, data):
+        """
+        Envoie un enregistrement sérialisé.
+
+        @return: C{False} si l'envoi doit être retenté plus tard
+            (tampon de la socket plein).
+        @rtype: C{bool}
+        """
+        try:
+            if self._socket is None:
+                self._connect()
+            self._socket.send(data)
+        except socket.timeout:
+            return False
+        except socket.error as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.ENOBUFS):
+                return False
+            # Processus parent arrêté : la connexion sera
+            # rétablie lors du prochain envoi.
+            if self._socket is not None:
+                self._socket.close()
+                self._socket = None
+            self.dropped += 1
+        else:
+            self.sent += 1
+        return True
+
+    def _send_pending(self):
+        """Envoie les enregistrements en attente, dans l'ordre."""
+        pending = self._pending
+        while pending and self._send(pending[0]):
+            pending.popleft()
+
+    def _wait_pending(self, timeout=None):
+        """
+        Envoie les enregistrements en attente, en patientant si nécessaire.
+        Ceux qui n'ont pas pu être envoyés sont abandonnés.
+
+        @param timeout: Délai maximum (en secondes) d'envoi de chaque
+            enregistrement (par défaut, aucun).
+        @type timeout: C{float}
+        """
+        if self._socket is not None:
+            self._socket.settimeout(timeout)
+        try:
+            self._send_pending()
+        finally:
+            if self._socket is not None:
+                self._socket.setblocking(False)
+        self.dropped += len(self._pending)
+        self._pending.clear()
+
+    def flush(self):
+        """
+        Envoie les enregistrements en attente, en patientant
+        au plus C{timeout} secondes pour chacun d'eux.
+        """
+        self.acquire()
+        try:
+            if self._pending and self._pid == os.getpid():
+                self._wait_pending(self.timeout)
+        finally:
+            self.release()
+
+    def close(self):
+        """Envoie les enregistrements en attente, puis ferme la socket."""
+        self.flush()
+        if self._socket is not None and self._pid == os.getpid():
+            self._socket.close()
+            self._socket = None
+        logging.Handler.close(self)
+
+_log_sink = None
+# Méthode Process.start d'origine, remplacée tant que la collecte
+# est active (cf. L{_install_process_hook}).
+_process_start = None
+# (PID, adresse) du L{LogSink} auquel le processus courant est rattaché.
+_log_sink_child = None
+
+def start_log_sink():
+    """
+    Démarre, dans le processus courant, la collecte des enregistrements
+    de ses futurs processus fils (cf. L{LogSink}). Les processus créés
+    à l'aide du module C{multiprocessing} y sont rattachés automatiquement
+    (cf. L{attach_log_sink}).
+
+    Cette fonction doit être appelée par l'application avant la création
+    de ses processus fils. Elle l'est par L{get_logger} si l'option
+    C{multiprocess} de la section C{[handlers]} vaut C{yes}. Jusqu'à
+    l'appel de L{stop_log_sink}, un processus qui se détache ensuite
+    du terminal (fork) démarre son propre L{LogSink} avant la création
+    de son premier processus fils.
+
+    @return: Point de collecte des enregistrements.
+    @rtype: L{LogSink}
+    """
+    global _log_sink # pylint: disable-msg=W0603
+    if Process is not None:
+        _install_process_hook()
+    sink = _log_sink
+    if sink is not None and sink._pid == os.getpid():
+        return sink
+    sink = _log_sink = LogSink()
+    if register_after_fork:
+        register_after_fork(sink, _after_fork)
+    return sink
+
+def stop_log_sink():
+    """
+    Arrête la collecte des enregistrements démarrée
+    par L{start_log_sink}.
+    """
+    global _log_sink # pylint: disable-msg=W0603
+    sink = _log_sink
+    _log_sink = None
+    _uninstall_process_hook()
+    if sink is not None:
+        sink.stop()
+
+# Les enregistrements reçus sont traités avant logging.shutdown.
+atexit.register(stop_log_sink)
+
+def _ensure_log_sink():
+    """
+    Démarre un L{LogSink} dans le processus courant s'il n'en a pas
+    encore, c'est-à-dire après un détachement du terminal (fork).
+    Un processus lui-même rattaché à un L{LogSink} n'en démarre pas :
+    ses processus fils sont rattachés au même L{LogSink} que lui.
+    """
+    sink = _log_sink
+    if sink is not None and sink._pid == os.getpid():
+        return
+    if _log_sink_child is not None and _log_sink_child[0] == os.getpid():
+        return
+    try:
+        start_log_sink()
+    except (socket.error, OSError) as e:
+        logging.getLogger(__name__).warning(
+            "Could not start the log sink for child processes: %s", e)
+
+def _install_process_hook():
+    """
+    Fait appeler L{_ensure_log_sink} au démarrage de chaque processus
+    créé à l'aide du module C{multiprocessing}, avant le fork(),
+    jusqu'à l'appel de L{_uninstall_process_hook}.
+    """
+    global _process_start # pylint: disable-msg=W0603
+    if _process_start is not None:
+        return
+    start = _process_start = vars(Process)['start']
+
+    def _start(self):
+        _ensure_log_sink()
+        return start(self)
+    _start.__doc__ = start.__doc__
+    Process.start = _start
+
+def _uninstall_process_hook():
+    """Restaure la méthode C{Process.start} d'origine."""
+    global _process_start # pylint: disable-msg=W0603
+    if _process_start is not None:
+        Process.start = _process_start
+        _process_start = None
+
+def _after_fork(sink):
+    """
+    Rattache un processus fils au L{LogSink} de son parent, ou à celui
+    auquel son parent est lui-même rattaché.
+    """
+    pid = os.getpid()
+    if _log_sink_child is not None and _log_sink_child[0] == pid:
+        # Déjà rattaché (plusieurs LogSink ont pu être enregistrés).
+        return
+    # Le thread de réception ne survit pas à un fork() : un LogSink
+    # hérité par le processus parent n'est pas utilisable.
+    ppid = os.getppid()
+    if sink is _log_sink and ppid == sink._pid:
+        attach_log_sink(sink.address)
+    elif _log_sink_child is not None and _log_sink_child[0] == ppid:
+        attach_log_sink(_log_sink_child[1])
+
+def attach_log_sink(address):
+    """
+    Rattache le processus courant au L{LogSink} d'un autre processus :
+    les handlers des loggers sont remplacés par un L{LogSinkHandler}.
+
+    Cette fonction peut être appelée explicitement par un processus
+    créé sans le module C{multiprocessing} (ex : par C{os.fork}).
+
+    @param address: Emplacement de la socket du L{LogSink}.
+    @type address: C{str}
+    @return: Handler installé.
+    @rtype: L{LogSinkHandler}
+    """
+    global _log_sink_child # pylint: disable-msg=W0603
+    _log_sink_child = (os.getpid(), address)
+    handler = LogSinkHandler(address)
+    # Les verrous de logging ont pu être hérités dans un état verrouillé
+    # (fork depuis un autre thread) : on ne les utilise pas ici.
+    loggers = [logging.root] + [logger for logger in
+               list(logging.root.manager.loggerDict.values())
+               if isinstance(logger, logging.Logger)]
+    levels = [h.level for logger in loggers for h in logger.handlers]
+    # Les enregistrements ignorés par tous les handlers ne sont pas envoyés.
+    handler.setLevel(min(levels or [logging.NOTSET]))
+    for logger in loggers:
+        if logger.handlers:
+            logger.handlers = [handler]
+    if Finalize:
+        # Les processus de multiprocessing n'appellent pas logging.shutdown.
+        Finalize(handler, handler.flush, exitpriority=-100)
+    return handler
+
+def _setup_log_sink():
+    """
+    Démarre la collecte des enregistrements des processus fils créés
+    à l'aide du module C{multiprocessing} (cf. L{start_log_sink}),
+    si l'option C{multiprocess} de la section C{[handlers]} vaut C{yes}.
+    """
+    if register_after_fork is None or Process is None:
+        return
+    hconf = settings.get('handlers')
+    if not hconf or 'multiprocess' not in hconf or \
+            not hconf.as_bool('multiprocess'):
+        return
+    try:
+        start_log_sink()
+    except (socket.error, OSError) as e:
+        logging.getLogger(__name__).warning(
+            "Could not start the log sink for child processes: %s", e)
 
 def get_error_message(exc):
     """
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Cache de taille bornée avec éviction des éléments
+les moins récemment utilisés (LRU).
+"""
+
+import threading
+
+__all__ = ("LRUCache", )
+
+# Indices des champs d'un maillon de la liste chaînée.
+_PREV, _NEXT, _KEY, _VALUE = 0, 1, 2, 3
+
+
+class LRUCache(object):
+    """
+    Cache associatif de taille bornée.
+
+    Lorsque le cache est plein, l'élément le moins récemment utilisé
+    est évincé. Le cache tient à jour le nombre de succès (C{hits}),
+    d'échecs (C{misses}) et d'évictions (C{evictions}).
+
+    L'implémentation repose sur un dictionnaire et une liste
+    doublement chaînée circulaire (comme C{functools.lru_cache}
+    en Python 3), de sorte que chaque opération est en O(1).
+    """
+
+    def __init__(self, maxsize=1024):
+        """
+        Initialisation du cache.
+
+        @param maxsize: Nombre maximum d'éléments dans le cache.
+            Une valeur inférieure ou égale à 0 désactive le cache.
+        @type maxsize: C{int}
+        """
+        self._lock = threading.Lock()
+        self._map = {}
+        self._root = []
+        self._root[:] = [self._root, self._root, None, None]
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """
+        Retourne la valeur associée à une clé du cache.
+
+        @param key: Clé recherchée.
+        @param default: Valeur retournée si la clé est absente du cache.
+        @return: Valeur associée à la clé ou C{default}.
+        """
+        with self._lock:
+            link = self._map.get(key)
+            if link is None:
+                self.misses += 1
+                return default
+            # On déplace le maillon en tête de liste
+            # (élément le plus récemment utilisé).
+            prev, next_ = link[_PREV], link[_NEXT]
+            prev[_NEXT] = next_
+            next_[_PREV] = prev
+            root = self._root
+            last = root[_PREV]
+            last[_NEXT] = root[_PREV] = link
+            link[_PREV] = last
+            link[_NEXT] = root
+            self.hits += 1
+            return link[_VALUE]
+
+    def __setitem__(self, key, value):
+        """
+        Ajoute ou remplace une valeur dans le cache,
+        en évinçant si nécessaire l'élément le moins
+        récemment utilisé.
+        """
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            link = self._map.get(key)
+            if link is not None:
+                link[_VALUE] = value
+                return
+            root = self._root
+            while len(self._map) >= self.maxsize:
+                self._evict()
+            last = root[_PREV]
+            link = [last, root, key, value]
+            last[_NEXT] = root[_PREV] = self._map[key] = link
+
+    def __contains__(self, key):
+        return key in self._map
+
+    def __len__(self):
+        return len(self._map)
+
+    def _evict(self):
+        """Évince l'élément le moins récemment utilisé."""
+        root = self._root
+        oldest = root[_NEXT]
+        root[_NEXT] = oldest[_NEXT]
+        oldest[_NEXT][_PREV] = root
+        del self._map[oldest[_KEY]]
+        self.evictions += 1
+
+    def resize(self, maxsize):
+        """
+        Modifie la taille maximale du cache.
+        Les éléments excédentaires sont évincés immédiatement.
+
+        @param maxsize: Nouvelle taille maximale du cache.
+        @type maxsize: C{int}
+        """
+        with self._lock:
+            self.maxsize = maxsize
+            while self._map and len(self._map) > max(maxsize, 0):
+                self._evict()
+
+    def clear(self):
+        """Vide le cache et remet ses compteurs à zéro."""
+        with self._lock:
+            self._map.clear()
+            self._root[:] = [self._root, self._root, None, None]
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """
+        Retourne les statistiques d'utilisation du cache.
+
+        @return: Dictionnaire contenant la taille maximale (C{maxsize}),
+            le nombre d'éléments (C{size}), de succès (C{hits}),
+            d'échecs (C{misses}) et d'évictions (C{evictions}).
+        @rtype: C{dict}
+        """
+        return {
+            'maxsize': self.maxsize,
+            'size': len(self._map),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Arbre préfixe (trie) de chemins d'accès, permettant de représenter
+de manière compacte une hiérarchie de groupes.
+
+Exemple::
+
+    from vigilo.common.pathtrie import PathTrie
+    trie = PathTrie(['/Servers/Linux/Web', '/Servers/Windows'])
+    '/Servers/Linux/Web' in trie                # True
+    list(trie.iter_subtree('/Servers/Linux'))   # [['Servers', 'Linux', 'Web']]
+"""
+
+from vigilo.common import parse_path, parse_paths
+
+__all__ = ("PathTrie", )
+
+
+class _Node(object):
+    """Nœud de l'arbre préfixe."""
+
+    __slots__ = ('children', 'terminal')
+
+    def __init__(self):
+        # Les nœuds sans enfant (feuilles) ne possèdent pas de dictionnaire,
+        # ce qui réduit sensiblement l'empreinte mémoire de l'arbre.
+        self.children = None
+        self.terminal = False
+
+
+class PathTrie(object):
+    """
+    Arbre préfixe de chemins d'accès.
+
+    Chaque composante n'est stockée qu'une seule fois en mémoire
+    (les chaînes sont internées au niveau de l'arbre). Les chemins
+    peuvent être fournis sous forme de chaînes (analysées à l'aide
+    de L{parse_path}) ou de listes de composantes.
+
+    Seuls les chemins explicitement ajoutés sont membres de l'arbre :
+    après l'ajout de C{/Servers/Linux}, C{/Servers} est un préfixe
+    connu de l'arbre, mais n'en est pas membre.
+    """
+
+    def __init__(self, paths=None):
+        """
+        Initialisation de l'arbre.
+
+        @param paths: Chemins d'accès à ajouter à l'arbre.
+        @type paths: C{iterable}
+        """
+        self._root = _Node()
+        self._strings = {}
+        self._size = 0
+        if paths is not None:
+            self.update(paths)
+
+    @classmethod
+    def from_paths(cls, paths):
+        """
+        Construit un arbre à partir d'un ensemble de chemins d'accès
+        sous forme de chaînes, en ignorant les chemins invalides.
+
+        @param paths: Chemins d'accès.
+        @type paths: C{iterable} de C{basestr}
+        @return: Un couple contenant l'arbre et la liste des indices
+            des chemins invalides (cf. L{parse_paths}).
+        @rtype: C{tuple}
+        """
+        trie = cls()
+        parsed, invalid = parse_paths(paths)
+        for parts in parsed:
+            if parts is not None:
+                trie.add(parts)
+        return (trie, invalid)
+
+    def _parse(self, path):
+        """
+        Retourne les composantes d'un chemin d'accès.
+
+        @raise ValueError: Le chemin d'accès est invalide.
+        """
+        if isinstance(path, basestring):
+            parts = parse_path(path)
+            if parts is None:
+                raise ValueError("Invalid path: %r" % (path, ))
+            return parts
+        return path
+
+    def _find(self, path):
+        """Retourne le nœud correspondant à un chemin, ou C{None}."""
+        node = self._root
+        for part in self._parse(path):
+            if node.children is None:
+                return None
+            node = node.children.get(part)
+            if node is None:
+                return None
+        return node
+
+    def add(self, path):
+        """
+        Ajoute un chemin d'accès à l'arbre.
+
+        @param path: Chemin d'accès ou liste de ses composantes.
+        @type path: C{basestr} ou C{list}
+        @return: C{True} si le chemin a été ajouté,
+            C{False} s'il était déjà présent.
+        @rtype: C{bool}
+        @raise ValueError: Le chemin d'accès est invalide.
+        """
+        parts = self._parse(path)
+        if not parts:
+            raise ValueError("Invalid path: %r" % (path, ))
+        strings = self._strings
+        node = self._root
+        for part in parts:
+            children = node.children
+            if children is None:
+                children = node.children = {}
+            child = children.get(part)
+            if child is None:
+                child = children[strings.setdefault(part, part)] = _Node()
+            node = child
+        if node.terminal:
+            return False
+        node.terminal = True
+        self._size += 1
+        return True
+
+    def update(self, paths):
+        """
+        Ajoute plusieurs chemins d'accès à l'arbre.
+
+        @param paths: Chemins d'accès ou listes de composantes.
+        @type paths: C{iterable}
+        """
+        for path in paths:
+            self.add(path)
+
+    def __contains__(self, path):
+        try:
+            node = self._find(path)
+        except ValueError:
+            return False
+        return node is not None and node.terminal
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        return self.iter_subtree()
+
+    def has_prefix(self, path):
+        """
+        Indique si au moins un chemin de l'arbre commence par le préfixe
+        donné (ou est égal à celui-ci).
+
+        Comme pour l'opérateur C{in}, un chemin invalide
+        n'est le préfixe d'aucun chemin de l'arbre.
+
+        @param path: Préfixe recherché.
+        @type path: C{basestr} ou C{list}
+        @rtype: C{bool}
+        """
+        try:
+            return self._find(path) is not None
+        except ValueError:
+            return False
+
+    def iter_subtree(self, path=None):
+        """
+        Parcourt les chemins de l'arbre situés sous un préfixe donné,
+        y compris le préfixe lui-même s'il est membre de l'arbre.
+        Le coût du parcours est proportionnel à la taille du sous-arbre.
+
+        @param path: Préfixe des chemins à parcourir
+            (par défaut, l'ensemble de l'arbre).
+        @type path: C{basestr} ou C{list}
+        @return: Générateur des chemins (sous forme de listes
+            de composantes), dans un ordre quelconque.
+        @rtype: C{generator}
+        """
+        if path is None:
+            prefix = []
+            node = self._root
+        else:
+            prefix = list(self._parse(path))
+            node = self._find(prefix)
+            if node is None:
+                return
+
+        stack = [(node, prefix)]
+        while stack:
+            node, parts = stack.pop()
+            if node.terminal:
+                yield parts
+            if node.children is not None:
+                for part, child in node.children.iteritems():
+                    stack.append((child, parts + [part]))
+
+    def descendants(self, path):
+        """
+        Parcourt les chemins de l'arbre situés strictement
+        sous un préfixe donné.
+
+        @param path: Préfixe des chemins à parcourir.
+        @type path: C{basestr} ou C{list}
+        @return: Générateur des chemins (sous forme de listes
+            de composantes), dans un ordre quelconque.
+        @rtype: C{generator}
+        """
+        depth = len(self._parse(path))
+        for parts in self.iter_subtree(path):
+            if len(parts) > depth:
+                yield parts
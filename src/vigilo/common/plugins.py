@@ -9,9 +9,9 @@ Permet notamment de lister les extensions d'une application.
 from __future__ import print_function
 
 import sys
-from pkg_resources import working_set
 from optparse import OptionParser
 from vigilo.common.argparse import prepare_argparse
+from vigilo.common.entrypoints import get_index
 from vigilo.common.gettext import translate
 
 _ = translate(__name__)
@@ -30,28 +30,22 @@ def main():
                 "which provides this feature."))
 
     opts, args = parser.parse_args()
+    index = get_index()
     # Sans argument, liste les noms des groupes de points d'entrée
     # se rapportant à Vigilo.
     if not args:
-        groups = {}
         vigilo_groups = ('vigilo.', 'vigiadmin.', 'vigiboard.', 'vigiconf.',
                          'vigigraph.', 'vigimap.', 'vigirrd.')
-        for distro in working_set:
-            for group in distro.get_entry_map().keys():
-                if group.startswith(vigilo_groups):
-                    groups.setdefault(group, [])
-                    groups[group].append(
-                        distro.project_name + ' ' + distro.version)
         print(_("Available entry-points groups:"))
-        for group in sorted(list(groups)):
+        for group in index.groups(vigilo_groups):
             print("-", group, end=' ')
             if opts.display_provider:
                 print("--", _("Provided by:"), \
-                      ", ".join(sorted(groups[group])), end='')
+                      ", ".join(index.providers(group)), end='')
             print()
         sys.exit(0)
 
-    for ep in sorted(working_set.iter_entry_points(args[0]),
+    for ep in sorted(index.entry_points(args[0]),
                      key=lambda x: x.name.lower()):
         print("-", ep.name, end=' ')
         if opts.display_provider:
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""
+Réorganise une arborescence de fichiers RRD existante
+d'un mode de répartition vers un autre (cf. L{get_rrd_path}).
+
+Les fichiers sont déplacés par renommage (ce qui suppose que la source
+et la destination se trouvent sur le même système de fichiers),
+en parallèle, et chaque déplacement réussi est consigné dans un journal
+qui permet de reprendre une migration interrompue.
+"""
+from __future__ import print_function
+
+import os
+import sys
+import errno
+from multiprocessing.pool import ThreadPool
+from optparse import OptionParser
+
+from vigilo.common import get_rrd_path, iter_rrd_files, get_rrd_path_options
+from vigilo.common.argparse import prepare_argparse
+from vigilo.common.gettext import translate
+
+_ = translate(__name__)
+
+__all__ = ("relayout", )
+
+PATH_MODES = ("flat", "name", "hash")
+
+
+def _read_journal(journal):
+    """
+    Lit le journal d'une migration précédente.
+
+    @param journal: Chemin vers le journal.
+    @type journal: C{str}
+    @return: Ensemble des fichiers sources déjà déplacés.
+    @rtype: C{set}
+    """
+    done = set()
+    if journal is None or not os.path.exists(journal):
+        return done
+    with open(journal, 'r') as f:
+        for line in f:
+            # Une ligne incomplète peut subsister si le processus
+            # a été interrompu pendant l'écriture du journal.
+            if not line.endswith('\n'):
+                continue
+            done.add(line.split('\t', 1)[0])
+    return done
+
+def _move(task):
+    """
+    Déplace un fichier RRD vers son nouvel emplacement.
+
+    @param task: Couple (source, destination).
+    @type task: C{tuple}
+    @return: Triplet (source, destination, erreur éventuelle).
+    @rtype: C{tuple}
+    """
+    src, dst = task
+    try:
+        try:
+            os.makedirs(os.path.dirname(dst))
+        except OSError as e:
+            # Le dossier peut avoir été créé par un autre worker.
+            if e.errno != errno.EEXIST:
+                raise
+        if os.path.exists(dst):
+            return (src, dst, _("Destination already exists"))
+        os.rename(src, dst)
+    except OSError as e:
+        if e.errno == errno.EXDEV:
+            return (src, dst, _("Source and destination are not "
+                                "on the same filesystem"))
+        return (src, dst, e.strerror)
+    return (src, dst, None)
+
+def _prune(dirs, base_dir):
+    """
+    Supprime les dossiers laissés vides par la migration,
+    en remontant jusqu'au dossier racine (exclu).
+    """
+    base_dir = os.path.abspath(base_dir)
+    # Les dossiers les plus profonds sont traités en premier.
+    for path in sorted(dirs, key=len, reverse=True):
+        path = os.path.abspath(path)
+        while path.startswith(base_dir + os.sep):
+            try:
+                os.rmdir(path)
+            except OSError:
+                break
+            path = os.path.dirname(path)
+
+def relayout(base_dir, from_mode, to_mode, target_dir=None, jobs=4,
+             journal=None, dry_run=False, prune=True, out=None,
+             from_options=None, to_options=None):
+    """
+    Déplace les fichiers RRD d'un mode de répartition vers un autre.
+
+    @param base_dir: Dossier racine des fichiers RRD existants.
+    @type base_dir: C{str}
+    @param from_mode: Mode de répartition actuel.
+    @type from_mode: C{str}
+    @param to_mode: Mode de répartition souhaité.
+    @type to_mode: C{str}
+    @param target_dir: Dossier racine de destination
+        (par défaut, le même que L{base_dir}).
+    @type target_dir: C{str}
+    @param jobs: Nombre de déplacements simultanés.
+    @type jobs: C{int}
+    @param journal: Chemin vers le journal des déplacements effectués.
+        Les fichiers qui y figurent déjà sont ignorés.
+    @type journal: C{str}
+    @param dry_run: Si C{True}, affiche les déplacements
+        sans les effectuer.
+    @type dry_run: C{bool}
+    @param prune: Supprimer les dossiers laissés vides.
+    @type prune: C{bool}
+    @param out: Flux sur lequel les déplacements prévus (en mode
+        C{dry_run}) et les erreurs sont affichés.
+    @type out: C{file}
+    @param from_options: Paramètres de répartition supplémentaires
+        de l'arborescence existante (C{path_depth}, C{path_width}).
+    @type from_options: C{dict}
+    @param to_options: Paramètres de répartition supplémentaires
+        de l'arborescence cible (C{path_depth}, C{path_width}).
+    @type to_options: C{dict}
+    @return: Statistiques de la migration : nombre de fichiers
+        déplacés (C{moved}), ignorés (C{skipped}) et en erreur (C{errors}).
+    @rtype: C{dict}
+    """
+    if target_dir is None:
+        target_dir = base_dir
+    if out is None:
+        out = sys.stdout
+    if from_options is None:
+        from_options = {}
+    if to_options is None:
+        to_options = {}
+    stats = {'moved': 0, 'skipped': 0, 'errors': 0}
+    done = _read_journal(journal)
+
+    def _tasks():
+        """Génère les déplacements à effectuer."""
+        for hostname, ds, src, _size, _mtime in \
+                iter_rrd_files(base_dir, from_mode, **from_options):
+            dst = get_rrd_path(hostname, ds, target_dir, to_mode,
+                               **to_options)
+            if src == dst or src in done:
+                stats['skipped'] += 1
+                continue
+            yield (src, dst)
+
+    if dry_run:
+        for src, dst in _tasks():
+            print("%s -> %s" % (src, dst), file=out)
+            stats['moved'] += 1
+        return stats
+
+    emptied = set()
+    journal_file = None
+    if journal is not None:
+        journal_file = open(journal, 'a')
+    pool = ThreadPool(max(jobs, 1))
+    try:
+        for src, dst, error in pool.imap_unordered(_move, _tasks(), 64):
+            if error is not None:
+                stats['errors'] += 1
+                print((_("Could not move %(src)s to %(dst)s: %(error)s") % {
+                        'src': src.decode('utf-8', 'replace'),
+                        'dst': dst.decode('utf-8', 'replace'),
+                        'error': error,
+                      }).encode('utf-8'), file=out)
+                continue
+            stats['moved'] += 1
+            emptied.add(os.path.dirname(src))
+            if journal_file is not None:
+                journal_file.write("%s\t%s\n" % (src, dst))
+                journal_file.flush()
+    finally:
+        pool.close()
+        pool.join()
+        if journal_file is not None:
+            journal_file.close()
+
+    if prune:
+        _prune(emptied, base_dir)
+    return stats
+
+def _current_options(section):
+    """
+    Retourne les options de répartition actuelles des fichiers RRD,
+    telles que définies dans la configuration (cf. L{get_rrd_path_options}),
+    ou leurs valeurs par défaut en l'absence de configuration.
+
+    @param section: Nom de la section de la configuration.
+    @type section: C{str}
+    @rtype: C{dict}
+    """
+    from vigilo.common.conf import settings
+    try:
+        settings.load_module(__name__)
+    except IOError:
+        return get_rrd_path_options({})
+    return get_rrd_path_options(settings.get(section, {}))
+
+def main():
+    """
+    Cette fonction est appelée lorsqu'un utilisateur lance la commande
+    'vigilo-rrd-relayout'.
+    Cet utilitaire permet de changer le mode de répartition
+    d'une arborescence de fichiers RRD.
+    """
+    prepare_argparse()
+    parser = OptionParser(usage="%prog [options] FROM_MODE TO_MODE")
+    parser.add_option('-d', '--base-dir', dest='base_dir',
+        default="/var/lib/vigilo/rrds",
+        help=_("Root directory of the existing RRD files."))
+    parser.add_option('-t', '--target-dir', dest='target_dir',
+        help=_("Root directory for the relocated RRD files "
+               "(defaults to the base directory)."))
+    parser.add_option('-s', '--section', dest='section',
+        default="connector-metro",
+        help=_("Settings section holding the current RRD path options, "
+               "used when --from-depth or --from-width is omitted."))
+    parser.add_option('--from-depth', dest='from_depth', type='int',
+        help=_("Number of intermediate directory levels "
+               "in the existing tree."))
+    parser.add_option('--from-width', dest='from_width', type='int',
+        help=_("Number of characters added at each "
+               "directory level in the existing tree."))
+    parser.add_option('--to-depth', dest='to_depth', type='int',
+        default=2, help=_("Number of intermediate directory levels "
+                          "in the new tree."))
+    parser.add_option('--to-width', dest='to_width', type='int',
+        default=1, help=_("Number of characters added at each "
+                          "directory level in the new tree."))
+    parser.add_option('-j', '--jobs', dest='jobs', type='int', default=4,
+        help=_("Number of files moved in parallel."))
+    parser.add_option('-J', '--journal', dest='journal',
+        help=_("Journal file used to resume an interrupted migration."))
+    parser.add_option('-n', '--dry-run', action='store_true',
+        dest='dry_run', default=False,
+        help=_("Only display what would be done."))
+    parser.add_option('--no-prune', action='store_false',
+        dest='prune', default=True,
+        help=_("Keep the directories left empty by the migration."))
+
+    opts, args = parser.parse_args()
+    if len(args) != 2 or args[0] not in PATH_MODES or \
+            args[1] not in PATH_MODES:
+        parser.error(_("Expected two path modes among: %s") %
+                     ", ".join(PATH_MODES))
+
+    # Par défaut, l'arborescence existante respecte la configuration.
+    from_options = {'path_depth': opts.from_depth,
+                    'path_width': opts.from_width}
+    if None in from_options.values():
+        try:
+            current = _current_options(opts.section)
+        except ValueError as e:
+            parser.error(str(e))
+        for key, value in from_options.items():
+            if value is None:
+                from_options[key] = current[key]
+
+    stats = relayout(opts.base_dir, args[0], args[1], opts.target_dir,
+                     opts.jobs, opts.journal, opts.dry_run, opts.prune,
+                     from_options=from_options,
+                     to_options={'path_depth': opts.to_depth,
+                                 'path_width': opts.to_width})
+    print(_("%(moved)d file(s) moved, %(skipped)d skipped, "
+            "%(errors)d error(s)") % stats, file=sys.stderr)
+    if stats['errors']:
+        sys.exit(1)
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,15 +6,25 @@
 from __future__ import absolute_import, print_function
 
 import runpy
+import marshal
 import os
 import sys
 import tempfile
 import unittest
 import shutil
+import time
+import threading
 # Import from io if we target 2.6
 from cStringIO import StringIO
 
-from vigilo.common.conf import settings
+import pkg_resources
+
+from vigilo.common.conf import settings, SettingsWatcher, pyinotify, \
+                               VigiloConfigObj, _get_configspec, \
+                               setup_plugins_path, _plugins_fingerprint, \
+                               _load_plugins_cache, query_settings
+from vigilo.common import confshm
+from vigilo.common import conf as conf_module
 from vigilo.common.logging import fileConfig
 
 
@@ -294,3 +304,545 @@ args=(sys.stdout, )
 """)
         expected = ['(sys.stdout', ')']
         self.assertEqual(settings["section"].get("args"), expected)
+
+    def test_snapshot_cache(self):
+        """Mise en cache de la configuration fusionnée."""
+        cache_dir = os.path.join(self.tmpdir, "cache")
+        os.mkdir(cache_dir)
+        conffile = os.path.join(self.tmpdir, "test.ini")
+        incfile = os.path.join(self.tmpdir, "inc.ini")
+        with open(conffile, "w") as conf:
+            conf.write("[include]\ninclude = %s\n"
+                       "[section]\nkey=value\nlist=a, b\n" % incfile)
+        with open(incfile, "w") as conf:
+            conf.write("[other]\nkey=included\n")
+        os.environ["VIGILO_SETTINGS"] = conffile
+        settings.cache_dir = cache_dir
+        try:
+            settings.load_module()
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            expected = settings.dict()
+            filenames = settings.filenames[:]
+            keys = settings.keys()
+
+            # Second chargement : la configuration provient du cache.
+            settings.reset()
+            try:
+                settings.load_file = None
+                settings.load_module()
+            finally:
+                # Retire l'attribut qui masque la méthode.
+                del settings.load_file
+            self.assertTrue(callable(settings.load_file))
+            self.assertEqual(settings.dict(), expected)
+            self.assertEqual(settings.filenames, filenames)
+            self.assertEqual(settings.keys(), keys)
+
+            # La modification d'un fichier inclus invalide le cache.
+            with open(incfile, "w") as conf:
+                conf.write("[other]\nkey=modified value\n")
+            settings.reset()
+            settings.load_module()
+            self.assertEqual(settings["other"]["key"], "modified value")
+        finally:
+            del settings.cache_dir
+
+    def _rewrite_unnoticed(self, filename, data):
+        """
+        Réécrit un fichier sans modifier son empreinte (taille, date
+        de modification et inode), afin de vérifier s'il est relu.
+        La date de modification du fichier doit avoir été fixée au
+        préalable (cf. L{_pin_mtime}).
+        """
+        st = os.stat(filename)
+        self.assertEqual(len(data), st.st_size)
+        with open(filename, "r+") as conf:
+            conf.write(data)
+        os.utime(filename, (st.st_atime, st.st_mtime))
+
+    def _pin_mtime(self, filename):
+        """
+        Fixe la date de modification d'un fichier à une valeur entière,
+        que C{os.utime} peut restaurer sans perte de précision.
+        """
+        os.utime(filename, (1000000000, 1000000000))
+
+    def test_incremental_reload(self):
+        """Rechargement des seuls fichiers modifiés."""
+        conffile0 = os.path.join(self.tmpdir, "test.ini")
+        confdir = os.path.join(self.tmpdir, "conf.d")
+        os.mkdir(confdir)
+        conffile1 = os.path.join(confdir, "test-1.ini")
+        conffile2 = os.path.join(confdir, "test-2.ini")
+        conffile3 = os.path.join(confdir, "test-3.ini")
+        with open(conffile0, "w") as conf:
+            conf.write("[include]\ninclude = %s\n" % confdir)
+        with open(conffile1, "w") as conf:
+            conf.write("[section]\nkey1=value1\nkey=value1\n")
+        with open(conffile2, "w") as conf:
+            conf.write("[section]\nkey=value2\n")
+        self._pin_mtime(conffile1)
+        settings.load_file(conffile0)
+        self.assertEqual(settings["section"]["key"], "value2")
+
+        # Aucune modification.
+        self.assertEqual(settings.reload(), [])
+
+        # Modification d'un fichier : seul celui-ci est réanalysé.
+        self._rewrite_unnoticed(conffile1,
+                                "[section]\nkey1=valueX\nkey=value1\n")
+        with open(conffile2, "w") as conf:
+            conf.write("[section]\nkey=modified\n")
+        self.assertEqual(settings.reload(), [("section", "key")])
+        self.assertEqual(settings["section"]["key"], "modified")
+        self.assertEqual(settings["section"]["key1"], "value1")
+
+        # Ajout d'un fichier dans le dossier inclus.
+        with open(conffile3, "w") as conf:
+            conf.write("[other]\nkey=value3\n")
+        self.assertEqual(settings.reload(), [("other", )])
+        self.assertTrue(conffile3 in settings.filenames)
+
+        # Suppression d'un fichier du dossier inclus.
+        os.unlink(conffile2)
+        self.assertEqual(settings.reload(), [("section", "key")])
+        self.assertEqual(settings["section"]["key"], "value1")
+        self.assertFalse(conffile2 in settings.filenames)
+
+    def test_reload_is_atomic(self):
+        """Les autres threads ne voient jamais de configuration partielle."""
+        conffile = os.path.join(self.tmpdir, "test.ini")
+        contents = ["[first]\nkey=a\n[second]\nkey=1\n",
+                    "[first]\nkey=b\n[second]\nkey=2\n"]
+        with open(conffile, "w") as conf:
+            conf.write(contents[0])
+        settings.load_file(conffile)
+        errors = []
+        stopping = threading.Event()
+        def reader():
+            while not stopping.is_set():
+                try:
+                    values = (settings["first"]["key"],
+                              settings["second"]["key"])
+                except KeyError as e:
+                    errors.append(e)
+                    return
+                if values not in (("a", "1"), ("b", "2"), ("a", "2"),
+                                  ("b", "1")):
+                    errors.append(values)
+                    return
+        thread = threading.Thread(target=reader)
+        # Changements de thread fréquents, pour provoquer les conflits.
+        interval = sys.getcheckinterval()
+        sys.setcheckinterval(1)
+        thread.start()
+        try:
+            for i in xrange(1, 50):
+                with open(conffile, "w") as conf:
+                    # La taille change à chaque fois afin que la
+                    # modification soit détectée.
+                    conf.write(contents[i % 2] + "#" * i + "\n")
+                settings.reload()
+        finally:
+            stopping.set()
+            thread.join()
+            sys.setcheckinterval(interval)
+        self.assertEqual(errors, [])
+        self.assertEqual(settings["first"]["key"], "b")
+        # Les sections sont rattachées à l'objet de configuration global.
+        self.assertTrue(settings["first"].main is settings)
+        self.assertTrue(settings["first"].parent is settings)
+
+    def _test_watcher(self, use_inotify):
+        """Rechargement automatique de la configuration."""
+        confdir = os.path.join(self.tmpdir, "conf.d")
+        os.mkdir(confdir)
+        self.load_conf_from_string("[include]\ninclude = %s\n"
+                                   "[section]\nkey=value\n" % confdir)
+        called = threading.Event()
+        changes = []
+        def callback(keys):
+            changes.extend(keys)
+            called.set()
+
+        watcher = SettingsWatcher(settings, interval=0.05, debounce=0.05,
+                                  use_inotify=use_inotify)
+        watcher.add_callback(callback)
+        watcher.start()
+        try:
+            with open(os.path.join(confdir, "new.ini"), "w") as conf:
+                conf.write("[other]\nkey=value\n")
+            called.wait(5)
+            self.assertEqual(changes, [("other", )])
+            self.assertEqual(settings["other"]["key"], "value")
+
+            # Une erreur de syntaxe ne doit pas altérer la configuration.
+            called.clear()
+            with open(os.path.join(confdir, "new.ini"), "w") as conf:
+                conf.write("[other\n")
+            time.sleep(0.5)
+            self.assertFalse(called.is_set())
+            self.assertEqual(settings["other"]["key"], "value")
+            self.assertEqual(settings["section"]["key"], "value")
+        finally:
+            watcher.stop()
+
+    def test_watcher_polling(self):
+        """Rechargement automatique de la configuration (scrutation)."""
+        self._test_watcher(False)
+
+    def test_watcher_inotify(self):
+        """Rechargement automatique de la configuration (inotify)."""
+        if pyinotify is None:
+            self.skipTest("pyinotify is not available")
+        self._test_watcher(True)
+
+    def test_parallel_include_directory(self):
+        """Analyse en parallèle des fichiers d'un dossier inclus."""
+        conffile0 = os.path.join(self.tmpdir, "test.ini")
+        confdir = os.path.join(self.tmpdir, "conf.d")
+        os.mkdir(confdir)
+        with open(conffile0, "w") as conf:
+            conf.write("[include]\ninclude = %s\n[section]\nkey=main\n"
+                       % confdir)
+        for i in xrange(10):
+            with open(os.path.join(confdir, "%02d.ini" % i), "w") as conf:
+                conf.write("[section]\nkey=%d\nkey%d=%d\n[section%d]\n"
+                           "list=a, b\n" % (i, i, i, i))
+        with open(os.path.join(confdir, "05.spec"), "w") as spec:
+            spec.write("[section]\nkey5=integer\n")
+        os.environ["VIGILO_SETTINGS"] = conffile0
+
+        sequential = VigiloConfigObj(None, interpolation=False)
+        sequential.paths = []
+        sequential.load_module()
+        parallel = VigiloConfigObj(None, interpolation=False)
+        parallel.paths = []
+        parallel.include_workers = 3
+        self.assertTrue(parallel._can_prefetch())
+        min_files = conf_module._PREFETCH_MIN_FILES
+        conf_module._PREFETCH_MIN_FILES = 2
+        try:
+            parallel.load_module()
+        finally:
+            conf_module._PREFETCH_MIN_FILES = min_files
+        self.assertEqual(parallel._pool, None)
+
+        self.assertEqual(parallel.dict(), sequential.dict())
+        self.assertEqual(parallel.keys(), sequential.keys())
+        self.assertEqual(parallel["section"].keys(),
+                         sequential["section"].keys())
+        self.assertEqual(parallel.filenames, sequential.filenames)
+        self.assertEqual(parallel["section"]["key5"], 5)
+
+        # Jamais depuis un autre thread (rechargement par un
+        # SettingsWatcher, par exemple).
+        result = []
+        thread = threading.Thread(
+            target=lambda: result.append(parallel._can_prefetch()))
+        thread.start()
+        thread.join()
+        self.assertEqual(result, [False])
+
+    def test_lazy_loading(self):
+        """Chargement paresseux des sections."""
+        conffile0 = os.path.join(self.tmpdir, "test.ini")
+        confdir = os.path.join(self.tmpdir, "conf.d")
+        os.mkdir(confdir)
+        conffile1 = os.path.join(confdir, "test-1.ini")
+        with open(conffile0, "w") as conf:
+            conf.write("top = 1\n[section]\nkey = main\nnumber = 1\n"
+                       "text = '''\n[not_a_section]\n'''\n"
+                       "[include]\ninclude = %s\n"
+                       "[other]\nlist = a, b\n[[sub]]\nkey = value\n"
+                       % confdir)
+        with open(os.path.join(self.tmpdir, "test.spec"), "w") as spec:
+            spec.write("top = integer\n[section]\nnumber = integer\n"
+                       "[defaults]\nkey = integer(default=42)\n")
+        with open(conffile1, "w") as conf:
+            conf.write("[section]\nkey = included\nextra = included\n")
+        self._pin_mtime(conffile1)
+
+        eager = VigiloConfigObj(None, interpolation=False)
+        eager.load_file(conffile0)
+        lazy = VigiloConfigObj(None, interpolation=False)
+        lazy.lazy = True
+        lazy.load_file(conffile0)
+
+        self.assertEqual(lazy.filenames, eager.filenames)
+        self.assertEqual(sorted(lazy.keys()), sorted(eager.keys()))
+        self.assertEqual(lazy["top"], 1)
+        self.assertEqual(lazy["section"]["key"], "main")
+        self.assertEqual(lazy["section"]["extra"], "included")
+        self.assertEqual(lazy["section"]["number"], 1)
+        self.assertTrue("other" in lazy)
+        self.assertEqual(lazy.dict(), eager.dict())
+
+        # Les sections ne sont lues que lors de leur premier accès.
+        lazy.reset()
+        lazy.load_file(conffile0)
+        self._rewrite_unnoticed(conffile1, "[section]\nkey = included\n"
+                                           "extra = INCLUDED\n")
+        self.assertEqual(lazy["section"]["extra"], "INCLUDED")
+        self.assertEqual(eager["section"]["extra"], "included")
+
+        # Les erreurs de validation sont signalées lors de l'accès
+        # à la section concernée.
+        with open(os.path.join(confdir, "test-1.spec"), "w") as spec:
+            spec.write("[section]\nnumber = integer\n")
+        with open(conffile1, "w") as conf:
+            conf.write("[section]\nnumber = NaN\n")
+        lazy.reset()
+        lazy.load_file(conffile0)
+        self.assertEqual(lazy["other"]["sub"]["key"], "value")
+        self.assertRaises(SyntaxError, lambda: lazy["section"])
+
+    def test_lazy_reload(self):
+        """Rechargement d'une configuration chargée paresseusement."""
+        self.load_conf_from_string("[section]\nkey = value\n"
+                                   "[other]\nkey = value\n")
+        settings.lazy = True
+        try:
+            settings.reset()
+            settings.load_file(os.environ["VIGILO_SETTINGS"])
+            self.assertEqual(settings["section"]["key"], "value")
+            with open(os.environ["VIGILO_SETTINGS"], "w") as conf:
+                conf.write("[section]\nkey = modified\n"
+                           "[other]\nkey = modified\n[new]\n")
+            self.assertEqual(settings.reload(),
+                             [("new", ), ("section", "key")])
+            self.assertEqual(settings["other"]["key"], "modified")
+        finally:
+            del settings.lazy
+
+    def test_reload_validates_changed_sections(self):
+        """Seules les sections modifiées sont validées à nouveau."""
+        conffile = os.path.join(self.tmpdir, "test.ini")
+        specfile = os.path.join(self.tmpdir, "test.spec")
+        with open(specfile, "w") as spec:
+            spec.write("top = integer\n[first]\nkey = integer\n"
+                       "[second]\nkey = integer\n"
+                       "[defaults]\nkey = integer(default=42)\n")
+        with open(conffile, "w") as conf:
+            conf.write("top = 1\n[first]\nkey = 1\n[second]\nkey = 2\n")
+        settings.load_file(conffile)
+        self.assertTrue(_get_configspec(specfile) is _get_configspec(specfile))
+
+        with open(conffile, "w") as conf:
+            conf.write("top = 1\n[first]\nkey = 1\n[second]\nkey = 3\n"
+                       "[third]\nkey = 4\n")
+        self.assertEqual(settings.reload(),
+                         [("second", "key"), ("third", )])
+        self.assertEqual(query_settings(settings, [
+            ("first", "key"), ("second", "key"), ("third", "key"),
+            ("defaults", "key"),
+        ], [])[0], [
+            (("first", "key"), 1, False),
+            (("second", "key"), 3, False),
+            (("third", "key"), "4", False),
+            (("defaults", "key"), 42, False),
+        ])
+        self.assertEqual(settings.keys(),
+                         ["top", "first", "second", "third", "defaults"])
+
+        # Une valeur invalide dans une section modifiée est détectée.
+        with open(conffile, "w") as conf:
+            conf.write("top = 1\n[first]\nkey = 1\n[second]\nkey = NaN\n")
+        self.assertRaises(SyntaxError, settings.reload)
+        self.assertEqual(settings["second"]["key"], 3)
+
+    def _run_cmdline(self, args):
+        """Exécute l'utilitaire vigilo-config et retourne sa sortie."""
+        oldout, sys.stdout = sys.stdout, StringIO()
+        olderr, sys.stderr = sys.stderr, StringIO()
+        try:
+            sys.argv[1:] = args
+            try:
+                runpy.run_module('vigilo.common.conf',
+                        run_name='__main__', alter_sys=True)
+            except SystemExit as e:
+                return (e.code, sys.stdout.getvalue())
+        finally:
+            sys.stdout = oldout
+            sys.stderr = olderr
+
+    def test_cmdline_batch(self):
+        """Interrogation de plusieurs paramètres avec vigilo-config."""
+        self.load_conf_from_string("[bus]\nhost = localhost\nport = 5222\n"
+                                   "[db]\nurl = 'a b'\nlist = x, y\n"
+                                   "[[sub]]\nkey = value\n")
+        conffile = os.environ["VIGILO_SETTINGS"]
+
+        self.assertEqual(self._run_cmdline(
+            ['-s', 'bus', '-g', 'host', '-g', 'port', conffile]),
+            (0, "localhost\n5222\n"))
+        self.assertEqual(self._run_cmdline(
+            ['-f', 'shell', '-q', 'bus:port', '-d', 'db', conffile]),
+            (0, "BUS_PORT=5222\nDB_URL='a b'\nDB_LIST='x, y'\n"
+                "DB_SUB_KEY=value\n"))
+        self.assertEqual(self._run_cmdline(
+            ['-f', 'json', '-q', 'bus:host', '-d', 'db', conffile]),
+            (0, '{"bus": {"host": "localhost"}, "db": {"list": ["x", "y"], '
+                '"sub": {"key": "value"}, "url": "a b"}}\n'))
+        # Les paramètres inconnus sont signalés,
+        # mais n'empêchent pas l'affichage des autres.
+        self.assertEqual(self._run_cmdline(
+            ['-q', 'bus:nope', '-q', 'bus:host', conffile]),
+            (1, "localhost\n"))
+        self.assertEqual(self._run_cmdline(['-q', 'bus', conffile])[0], 2)
+
+        # Une section invalide n'est analysée que lors de la requête,
+        # mais l'erreur est signalée de la même manière.
+        with open(conffile, "w") as conf:
+            conf.write("[bus]\nhost = localhost\n[[bad\n")
+        self.assertEqual(self._run_cmdline(
+            ['-s', 'bus', '-g', 'host', conffile]), (4, ""))
+
+    def test_typed_view(self):
+        """Vues typées d'une section."""
+        self.load_conf_from_string("[connector]\nmax_queue_size = 42\n"
+                                   "debug = no\nratio = 0.5\n"
+                                   "hosts = a, b\nlog-file = /tmp/log\n")
+        converters = {
+            'max_queue_size': int,
+            'debug': bool,
+            'ratio': 'float',
+            'hosts': list,
+            'log-file': str,
+            'timeout': int,
+        }
+        view = settings.typed_view('connector', converters,
+                                   defaults={'timeout': 10})
+        self.assertEqual(view.max_queue_size, 42)
+        self.assertEqual(view.debug, False)
+        self.assertEqual(view.ratio, 0.5)
+        self.assertEqual(view.hosts, ['a', 'b'])
+        self.assertEqual(view.log_file, '/tmp/log')
+        self.assertEqual(view.timeout, 10)
+        del converters['timeout']
+        view = settings.typed_view('connector', converters)
+        self.assertTrue(settings.typed_view('connector', converters) is view)
+        # Les valeurs par défaut sont appliquées à chaque appel.
+        self.assertEqual(settings.typed_view('connector', {
+            'timeout': int, 'hosts': list,
+        }, defaults={'timeout': [1, 2]}).timeout, [1, 2])
+        self.assertEqual(settings.typed_view('connector', {
+            'timeout': int, 'hosts': list,
+        }, defaults={'timeout': 5}).timeout, 5)
+        # Noms d'attributs invalides ou en conflit.
+        self.assertEqual(tuple(settings.typed_view('connector', {
+            '_debug': str, 'debug': bool,
+        }, defaults={'_debug': 'x'})), ('x', False))
+        self.assertRaises(ValueError, settings.typed_view, 'connector',
+                          {'log-file': str, 'log_file': str})
+        self.assertEqual(settings.typed_view('connector', {
+            'max_queue_size': lambda value: int(value) * 2,
+        }).max_queue_size, 84)
+        self.assertRaises(KeyError, settings.typed_view, 'connector',
+                          {'timeout': int})
+        self.assertRaises(KeyError, settings.typed_view, 'nope', {})
+
+        # Les vues sont invalidées lors du rechargement.
+        generation = settings.generation
+        with open(os.environ["VIGILO_SETTINGS"], "w") as conf:
+            conf.write("[connector]\nmax_queue_size = 7\n")
+        settings.reload()
+        self.assertNotEqual(settings.generation, generation)
+        self.assertEqual(view.max_queue_size, 42)
+        self.assertEqual(settings.typed_view('connector', {
+            'max_queue_size': int,
+        }).max_queue_size, 7)
+
+    def test_shared_settings(self):
+        """Partage de la configuration au travers d'un fichier projeté."""
+        self.load_conf_from_string("top = 1\n[bus]\nhost = localhost\n"
+                                   "[db]\nlist = a, b\n[[sub]]\nkey = value\n")
+        shmfile = os.path.join(self.tmpdir, "settings.shm")
+        self.assertEqual(settings.publish_shared(shmfile), 1)
+
+        config = VigiloConfigObj(None, interpolation=False)
+        config.attach_shared(shmfile)
+        self.assertEqual(config.filenames, settings.filenames)
+        self.assertEqual(config["top"], "1")
+        self.assertEqual(config["db"]["sub"]["key"], "value")
+        self.assertEqual(config["db"]["list"], ["a", "b"])
+        self.assertEqual(config.keys(), ["top", "bus", "db"])
+        self.assertFalse(config.shared_changed())
+
+        # Les processus détectent une nouvelle publication
+        # et s'y attachent lors du rechargement.
+        with open(os.environ["VIGILO_SETTINGS"], "w") as conf:
+            conf.write("top = 1\n[bus]\nhost = example.com\n")
+        settings.reload()
+        self.assertEqual(settings.publish_shared(shmfile), 2)
+        self.assertTrue(config.shared_changed())
+        self.assertEqual(config.reload(), [("db", )])
+        self.assertFalse(config.shared_changed())
+        self.assertEqual(config["bus"]["host"], "example.com")
+
+        with open(shmfile, "w") as shm:
+            shm.write("garbage")
+        self.assertRaises(ValueError, config.attach_shared, shmfile)
+        # Index tronqué ou mal formé.
+        for index in ({}, [], {'version': sys.version_info[:2]},
+                      {'version': sys.version_info[:2], 'scalars': [],
+                       'sections': [1], 'filenames': []}):
+            data = marshal.dumps(index)
+            with open(shmfile, "wb") as shm:
+                shm.write(confshm._HEADER.pack(confshm._MAGIC, 3, len(data)))
+                shm.write(data)
+            self.assertRaises(ValueError, config.attach_shared, shmfile)
+        self.assertEqual(config["bus"]["host"], "example.com")
+
+    def _make_plugin(self, plugins_path, name):
+        """Crée un plugin (egg décompressé) dans un dossier."""
+        egg_info = os.path.join(plugins_path, "%s-1.0-py%d.%d.egg" % (
+            name, sys.version_info[0], sys.version_info[1]), "EGG-INFO")
+        os.makedirs(egg_info)
+        with open(os.path.join(egg_info, "PKG-INFO"), "w") as f:
+            f.write("Metadata-Version: 1.0\nName: %s\nVersion: 1.0\n" % name)
+
+    def test_plugins_cache(self):
+        """Mise en cache de la résolution des plugins."""
+        plugins_path = os.path.join(self.tmpdir, "plugins")
+        cache_file = os.path.join(self.tmpdir, "plugins.cache")
+        self._make_plugin(plugins_path, "vigilotestplugin")
+        working_set = pkg_resources.working_set
+        try:
+            pkg_resources.working_set = pkg_resources.WorkingSet([])
+            setup_plugins_path(plugins_path, cache_file)
+            self.assertTrue(os.path.exists(cache_file))
+            self.assertEqual([dist.key for dist in pkg_resources.working_set],
+                             ["vigilotestplugin"])
+
+            pkg_resources.working_set = pkg_resources.WorkingSet([])
+            fingerprint = _plugins_fingerprint(plugins_path)
+            dists, errors = _load_plugins_cache(cache_file, fingerprint)
+            self.assertEqual([dist.key for dist in dists],
+                             ["vigilotestplugin"])
+            self.assertEqual(errors, [])
+            setup_plugins_path(plugins_path, cache_file)
+            self.assertEqual([dist.key for dist in pkg_resources.working_set],
+                             ["vigilotestplugin"])
+
+            # Le cache est invalidé par la modification des métadonnées
+            # d'un plugin.
+            egg_info = os.path.join(plugins_path, "vigilotestplugin-1.0-py%d.%d"
+                ".egg" % sys.version_info[:2], "EGG-INFO")
+            with open(os.path.join(egg_info, "entry_points.txt"), "w") as f:
+                f.write("[vigilo.tests]\ntest = os\n")
+            self.assertEqual(_load_plugins_cache(
+                cache_file, _plugins_fingerprint(plugins_path)), None)
+            setup_plugins_path(plugins_path, cache_file)
+            with open(os.path.join(egg_info, "entry_points.txt"), "w") as f:
+                f.write("[vigilo.tests]\nnewer = os\n")
+            self.assertEqual(_load_plugins_cache(
+                cache_file, _plugins_fingerprint(plugins_path)), None)
+
+            # Le cache est invalidé par l'ajout d'un plugin.
+            self._make_plugin(plugins_path, "vigilotestplugin2")
+            fingerprint = _plugins_fingerprint(plugins_path)
+            self.assertEqual(_load_plugins_cache(cache_file, fingerprint),
+                             None)
+        finally:
+            pkg_resources.working_set = working_set
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""Tests du serveur de configuration."""
+
+import os
+import sys
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+from cStringIO import StringIO
+
+from vigilo.common.conf import VigiloConfigObj, settings
+from vigilo.common.confserver import SettingsServer
+from vigilo.common.confclient import SettingsClient, query, main, \
+                                     format_results
+
+
+class ConfServer(unittest.TestCase):
+    """Tests du serveur de configuration."""
+
+    def setUp(self):
+        """Préparatifs avant chaque test."""
+        self.tmpdir = tempfile.mkdtemp(prefix="vigilo-common-tests-")
+        self.conffile = os.path.join(self.tmpdir, "settings.ini")
+        with open(self.conffile, "w") as conf:
+            conf.write("[bus]\nhost = localhost\nport = 5222\n"
+                       "[db]\nurl = 'a b'\nlist = x, y\n")
+        self.config = VigiloConfigObj(None, interpolation=False)
+        self.config.load_file(self.conffile)
+        self.path = os.path.join(self.tmpdir, "config.sock")
+        self.server = SettingsServer(self.path, self.config, watch=False)
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       kwargs={'poll_interval': 0.05})
+        self.thread.start()
+
+    def tearDown(self):
+        """Nettoyage après chaque test."""
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+        shutil.rmtree(self.tmpdir)
+        os.environ.pop("VIGILO_CONFIG_SOCKET", None)
+
+    def test_query(self):
+        """Interrogation du serveur."""
+        client = SettingsClient(self.path)
+        try:
+            self.assertEqual(client.get("bus", "host"), "localhost")
+            self.assertEqual(client.get("bus", "nope", "default"), "default")
+            results, errors = client.query([("bus", "port")], ["db"])
+            self.assertEqual(results, [
+                (("bus", "port"), "5222", False),
+                (("db", "url"), "a b", True),
+                (("db", "list"), ["x", "y"], True),
+            ])
+            self.assertEqual(errors, [])
+            self.assertEqual(client.query([("nope", "key")]),
+                             ([], ["No such section: nope"]))
+        finally:
+            client.close()
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+
+    def test_reload(self):
+        """Les valeurs rechargées sont servies."""
+        with open(self.conffile, "w") as conf:
+            conf.write("[bus]\nhost = example.com\n")
+        self.server._locked(self.config.reload)
+        self.assertEqual(query([("bus", "host")], path=self.path)[0],
+                         [(("bus", "host"), "example.com", False)])
+
+    def test_format_unicode(self):
+        """Les valeurs Unicode sont affichées en UTF-8."""
+        results = [((u"db", u"name"), u"caf\xe9", False),
+                   (("db", "list"), [u"\xe9", "b"], True),
+                   (("db", "port"), 42, True)]
+        self.assertEqual(format_results(results, "shell"),
+                         ["DB_NAME='caf\xc3\xa9'", "DB_LIST='\xc3\xa9, b'",
+                          "DB_PORT=42"])
+        self.assertEqual(format_results(results[:1], "plain"),
+                         ["caf\xc3\xa9"])
+
+    def test_settings_mismatch(self):
+        """Le serveur refuse les requêtes portant sur une autre configuration."""
+        self.assertEqual(query([("bus", "host")], path=self.path,
+                               settings=[self.conffile])[0],
+                         [(("bus", "host"), "localhost", False)])
+        otherfile = os.path.join(self.tmpdir, "other.ini")
+        for filenames in ([otherfile], [otherfile, self.conffile],
+                          [self.conffile, otherfile], []):
+            self.assertRaises(ValueError, query, [("bus", "host")],
+                              path=self.path, settings=filenames)
+
+    def test_socket_in_use(self):
+        """Un seul serveur peut utiliser une socket donnée."""
+        self.assertRaises(socket.error, SettingsServer, self.path,
+                          self.config, watch=False)
+
+    def _run_client(self, args):
+        """Exécute la commande vigilo-config et retourne sa sortie."""
+        oldargv, sys.argv = sys.argv, ["vigilo-config"] + args
+        oldout, sys.stdout = sys.stdout, StringIO()
+        try:
+            res = main()
+            return (res, sys.stdout.getvalue())
+        finally:
+            sys.argv = oldargv
+            sys.stdout = oldout
+
+    def test_cmdline(self):
+        """La commande vigilo-config utilise le serveur s'il est disponible."""
+        os.environ["VIGILO_CONFIG_SOCKET"] = self.path
+        # Le fichier est modifié sans que le serveur ne le recharge :
+        # la réponse vient du serveur, qui sert ce fichier.
+        with open(self.conffile) as conf:
+            original = conf.read()
+        with open(self.conffile, "w") as conf:
+            conf.write("[bus]\nhost = modified\n")
+        os.environ["VIGILO_SETTINGS"] = self.conffile
+        try:
+            self.assertEqual(
+                self._run_client(["-f", "shell", "-q", "bus:host",
+                                  "-d", "db"]),
+                (0, "BUS_HOST=localhost\nDB_URL='a b'\nDB_LIST='x, y'\n"))
+        finally:
+            del os.environ["VIGILO_SETTINGS"]
+            with open(self.conffile, "w") as conf:
+                conf.write(original)
+
+        # Le serveur ne sert pas le fichier demandé par le client :
+        # la configuration est analysée par la commande.
+        otherfile = os.path.join(self.tmpdir, "other.ini")
+        with open(otherfile, "w") as conf:
+            conf.write("[bus]\nhost = other\n")
+        os.environ["VIGILO_SETTINGS"] = otherfile
+        try:
+            self.assertEqual(self._run_client(["-q", "bus:host"]),
+                             (0, "other\n"))
+        finally:
+            del os.environ["VIGILO_SETTINGS"]
+            settings.reset()
+            del settings.lazy
+
+        # Le répertoire courant contient un fichier de configuration que
+        # le serveur ne sert pas : la configuration est analysée par la
+        # commande, qui charge ce fichier.
+        workdir = os.path.join(self.tmpdir, "workdir")
+        os.mkdir(workdir)
+        with open(os.path.join(workdir, "settings.ini"), "w") as conf:
+            conf.write("[bus]\nuser = cwd\n")
+        os.environ["VIGILO_SETTINGS"] = self.conffile
+        oldcwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            self.assertEqual(self._run_client(["-q", "bus:user"]),
+                             (0, "cwd\n"))
+        finally:
+            os.chdir(oldcwd)
+            del os.environ["VIGILO_SETTINGS"]
+            settings.reset()
+            del settings.lazy
+
+        # Sans serveur, la configuration est analysée par la commande.
+        os.environ["VIGILO_CONFIG_SOCKET"] = os.path.join(self.tmpdir, "none")
+        try:
+            self.assertEqual(self._run_client(["-s", "bus", "-g", "port",
+                                               self.conffile]),
+                             (0, "5222\n"))
+        finally:
+            settings.reset()
+            del settings.lazy
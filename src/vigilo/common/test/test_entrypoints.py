@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""Tests de l'index des points d'entrée."""
+
+import os
+import marshal
+import shutil
+import tempfile
+import unittest
+
+import pkg_resources
+
+from vigilo.common import entrypoints
+from vigilo.common.entrypoints import EntryPointIndex
+
+
+class EntryPoints(unittest.TestCase):
+    """Tests de l'index des points d'entrée."""
+
+    def setUp(self):
+        """Préparatifs avant chaque test."""
+        self.tmpdir = tempfile.mkdtemp(prefix="vigilo-common-tests-")
+        self.site = os.path.join(self.tmpdir, "site-packages")
+        self._make_dist(os.path.join(self.site, "vigilo_foo.egg-info"),
+                        "[vigilo.tests]\nfoo = os.path:join\n"
+                        "missing = os.path:nope\n",
+                        "Metadata-Version: 1.0\nName: vigilo-foo\n"
+                        "Version: 1.2\n")
+        # Distribution masquée par la précédente.
+        self._make_dist(os.path.join(self.tmpdir, "vigilo_foo-0.1.dist-info"),
+                        "[vigilo.tests]\nfoo = os:getcwd\n")
+        self.egg = os.path.join(self.tmpdir, "vigilo_bar-2.0-py2.7.egg")
+        self._make_dist(os.path.join(self.egg, "EGG-INFO"),
+                        "# comment\n[vigilo.tests]\nfoo = os:getcwd\n"
+                        "bar = os:getcwd [extra]\n[other]\nbaz = os\n")
+        self.entries = [self.site, self.tmpdir, self.egg]
+
+    def tearDown(self):
+        """Nettoyage après chaque test."""
+        shutil.rmtree(self.tmpdir)
+
+    def _make_dist(self, metadata, entry_points, pkg_info=None):
+        """Crée les métadonnées d'une distribution."""
+        os.makedirs(metadata)
+        with open(os.path.join(metadata, "entry_points.txt"), "w") as f:
+            f.write(entry_points)
+        if pkg_info is not None:
+            with open(os.path.join(metadata, "PKG-INFO"), "w") as f:
+                f.write(pkg_info)
+
+    def test_lookup(self):
+        """Recherche de groupes et de points d'entrée."""
+        index = EntryPointIndex(self.entries)
+        self.assertEqual(index.groups(), ["other", "vigilo.tests"])
+        self.assertEqual(index.groups(("vigilo.", )), ["vigilo.tests"])
+        self.assertEqual(index.providers("vigilo.tests"),
+                         ["vigilo-bar 2.0", "vigilo-foo 1.2"])
+        self.assertEqual([(ep.name, str(ep.dist)) for ep
+                          in index.entry_points("vigilo.tests")],
+                         [("foo", "vigilo-foo 1.2"),
+                          ("missing", "vigilo-foo 1.2"),
+                          ("foo", "vigilo-bar 2.0"),
+                          ("bar", "vigilo-bar 2.0")])
+        self.assertEqual(index.entry_points("nope"), [])
+        self.assertEqual(index.get("vigilo.tests", "foo").load(), os.path.join)
+        bar = index.get("vigilo.tests", "bar")
+        self.assertEqual(bar.resolve(), os.getcwd)
+        self.assertEqual(bar.location, self.egg)
+        self.assertEqual((bar.module_name, bar.attrs, bar.extras),
+                         ("os", ("getcwd", ), ("extra", )))
+        self.assertEqual(bar.dist.location, self.egg)
+        # L'option "extra" n'est pas déclarée par la distribution.
+        self.assertRaises(pkg_resources.UnknownExtra, bar.load)
+        self.assertEqual(bar.load(require=False), os.getcwd)
+        self.assertEqual(index.get("other", "baz").load(), os)
+        self.assertRaises(ImportError,
+                          index.get("vigilo.tests", "missing").load)
+        self.assertEqual(index.get("vigilo.tests", "nope"), None)
+
+    def test_develop(self):
+        """Distributions installées par "setup.py develop"."""
+        source = os.path.join(self.tmpdir, "src", "vigilo-dev")
+        self._make_dist(os.path.join(source, "vigilo_dev.egg-info"),
+                        "[vigilo.tests]\ndev = os:getcwd\n",
+                        "Metadata-Version: 1.0\nName: vigilo-dev\n"
+                        "Version: 0.3.dev0\n")
+        link = os.path.join(self.site, "vigilo-dev.egg-link")
+        with open(link, "w") as f:
+            f.write("../src/vigilo-dev\n../\n")
+
+        # Le fichier .egg-link est suivi, y compris lorsque le dossier
+        # des sources n'est pas dans le sys.path.
+        index = EntryPointIndex(self.entries)
+        dev = index.get("vigilo.tests", "dev")
+        self.assertEqual((dev.project, dev.version), ("vigilo-dev",
+                                                      "0.3.dev0"))
+        self.assertEqual(dev.location, source)
+        self.assertEqual(dev.load(require=False), os.getcwd)
+
+        # Le dossier des sources ajouté au sys.path (easy-install.pth)
+        # ne produit pas de doublon.
+        index = EntryPointIndex(self.entries + [source])
+        self.assertEqual([ep.name for ep in
+                          index.entry_points("vigilo.tests")].count("dev"), 1)
+        index = EntryPointIndex([source])
+        self.assertEqual(index.get("vigilo.tests", "dev").location, source)
+
+    def test_iter_entry_points(self):
+        """Recherche dans l'index partagé du working_set."""
+        working_set = pkg_resources.working_set
+        pkg_resources.working_set = pkg_resources.WorkingSet(self.entries)
+        try:
+            self.assertEqual([str(ep.dist) for ep in
+                              entrypoints.iter_entry_points("vigilo.tests",
+                                                            "foo")],
+                             ["vigilo-foo 1.2", "vigilo-bar 2.0"])
+            self.assertEqual(len(entrypoints.iter_entry_points(
+                "vigilo.tests")), 4)
+        finally:
+            pkg_resources.working_set = working_set
+            entrypoints._index = None
+
+    def test_cache(self):
+        """Mise en cache de l'index."""
+        cache_dir = tempfile.mkdtemp(prefix="vigilo-common-tests-")
+        self.addCleanup(shutil.rmtree, cache_dir)
+        cache_file = os.path.join(cache_dir, "entrypoints.cache")
+        index = EntryPointIndex(self.entries, cache_file)
+        self.assertTrue(os.path.exists(cache_file))
+        scan = entrypoints._scan
+        entrypoints._scan = None
+        try:
+            self.assertEqual(EntryPointIndex(self.entries, cache_file)
+                             .entry_points("vigilo.tests"),
+                             index.entry_points("vigilo.tests"))
+        finally:
+            entrypoints._scan = scan
+
+        # Un cache mal formé est reconstruit.
+        for items in ([("vigilo.tests", "truncated")], [None], 42):
+            with open(cache_file, "rb") as f:
+                cache = marshal.load(f)
+            cache["items"] = items
+            with open(cache_file, "wb") as f:
+                marshal.dump(cache, f)
+            self.assertEqual(EntryPointIndex(self.entries, cache_file)
+                             .entry_points("vigilo.tests"),
+                             index.entry_points("vigilo.tests"))
+
+        # Le cache est invalidé par la modification d'une distribution.
+        entry_points = os.path.join(self.egg, "EGG-INFO", "entry_points.txt")
+        with open(entry_points, "w") as f:
+            f.write("[vigilo.new]\nnew = os\n")
+        os.utime(entry_points, (1, 1))
+        self.assertEqual(EntryPointIndex(self.entries, cache_file).groups(),
+                         ["vigilo.new", "vigilo.tests"])
@@ -12,10 +12,68 @@ import sys
 import tempfile
 import unittest
 import shutil
+import json
+import socket
 import logging
+import threading
+import multiprocessing
 
 from vigilo.common.conf import settings
-from vigilo.common.logging import fileConfig, get_logger
+from vigilo.common import logging as vigilo_logging
+from vigilo.common.logging import fileConfig, get_logger, AsyncHandler, \
+                                  BatchedSysLogHandler, VigiloJSONFormatter, \
+                                  VigiloFormatter, register_context_provider, \
+                                  unregister_context_provider, \
+                                  start_log_sink, stop_log_sink, LogSink, \
+                                  LogSinkHandler
+
+
+class _BlockingHandler(logging.Handler):
+    """Handler qui attend d'être débloqué avant d'écrire."""
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.event = threading.Event()
+        self.messages = []
+
+    def emit(self, record):
+        self.event.wait()
+        self.messages.append(record.getMessage())
+
+
+class _ListHandler(logging.Handler):
+    """Handler qui conserve les enregistrements reçus."""
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def _log_messages(name, count):
+    """Journalise des messages depuis un processus fils."""
+    logger = logging.getLogger(name)
+    for i in xrange(count):
+        logger.info("message %d", i)
+    handler = logger.handlers[0]
+    assert isinstance(handler, LogSinkHandler), handler
+    handler.flush()
+    assert handler.sent == count, (handler.sent, handler.dropped)
+
+
+def _spawn_workers(name, count):
+    """
+    Journalise des messages depuis un processus fils créé par un
+    processus lui-même fils (détaché du terminal ou non).
+    """
+    worker = multiprocessing.Process(target=_log_messages,
+                                     args=(name, count))
+    worker.start()
+    worker.join()
+    assert worker.exitcode == 0, worker.exitcode
+
 
 class Logging(unittest.TestCase):
     """Tests portant sur la configuration des journaux."""
@@ -80,3 +138,462 @@ args=(sys.stdout, )
                         handler.__class__.__name__)
         self.assertEqual(handler.level, logging.INFO)
         self.assertEqual(handler.stream, sys.stdout)
+
+    def test_async_handler_config(self):
+        """Déport d'un handler dans un thread dédié."""
+        logfile = os.path.join(self.tmpdir, "test.log")
+        self.load_conf_from_string("""
+[loggers]
+keys=test
+
+[handlers]
+keys=test
+
+[logger_test]
+level=DEBUG
+handlers=test
+qualname=%s
+
+[handler_test]
+class=FileHandler
+level=INFO
+args=(%r, )
+queue=yes
+queue_size=10
+overflow=drop-new
+""" % (__name__, logfile))
+        fileConfig()
+        logger = get_logger(__name__)
+        handler = logger.handlers[0]
+        self.assertTrue(isinstance(handler, AsyncHandler))
+        self.assertTrue(isinstance(handler.target, logging.FileHandler))
+        self.assertEqual((handler.level, handler.queue_size, handler.overflow),
+                         (logging.INFO, 10, "drop-new"))
+        try:
+            for i in xrange(5):
+                logger.info("message %d", i)
+            logger.debug("ignored")
+            handler.flush()
+            with open(logfile) as log:
+                self.assertEqual(log.read().splitlines(),
+                                 ["message %d" % i for i in xrange(5)])
+            self.assertEqual((handler.queued, handler.written,
+                              handler.dropped), (5, 5, 0))
+        finally:
+            handler.close()
+            handler.target.close()
+            logger.removeHandler(handler)
+
+    def test_async_handler_reconfigure(self):
+        """Reconfiguration pendant une écriture asynchrone."""
+        class Target(_BlockingHandler):
+            def emit(self, record):
+                _BlockingHandler.emit(self, record)
+                # L'écriture nécessite le verrou du module logging.
+                logging.getLogger(__name__)
+        target = Target()
+        handler = AsyncHandler(target)
+        handler.handle(logging.makeLogRecord({"msg": "x"}))
+        self.load_conf_from_string("[handlers]\nkeys=\n")
+        thread = threading.Thread(target=fileConfig)
+        thread.daemon = True
+        thread.start()
+        thread.join(0.1)
+        target.event.set()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(target.messages, ["x"])
+
+    def _test_overflow(self, overflow, expected):
+        """Comportement d'un handler asynchrone dont la file est pleine."""
+        target = _BlockingHandler()
+        handler = AsyncHandler(target, 2, overflow)
+        logger = logging.getLogger("%s.%s" % (__name__, overflow))
+        logger.propagate = False
+        logger.addHandler(handler)
+        try:
+            # Le premier message est en cours d'écriture
+            # lorsque les suivants sont émis.
+            logger.error("0")
+            while handler._queue:
+                threading.Event().wait(0.01)
+            for i in xrange(1, 5):
+                logger.error("%d", i)
+            target.event.set()
+            handler.flush()
+            self.assertEqual(target.messages, expected)
+            self.assertEqual(handler.dropped, 5 - len(expected))
+            self.assertEqual(handler.written, len(expected))
+        finally:
+            target.event.set()
+            handler.close()
+            logger.removeHandler(handler)
+
+    def test_async_handler_drop_new(self):
+        """Abandon des nouveaux messages lorsque la file est pleine."""
+        self._test_overflow("drop-new", ["0", "1", "2"])
+
+    def test_async_handler_drop_oldest(self):
+        """Abandon des anciens messages lorsque la file est pleine."""
+        self._test_overflow("drop-oldest", ["0", "3", "4"])
+
+    def test_async_handler_block(self):
+        """Attente d'une place lorsque la file est pleine."""
+        target = _BlockingHandler()
+        handler = AsyncHandler(target, 1, "block")
+        record = logging.makeLogRecord({"msg": "%s", "args": ("x", )})
+        handler.handle(record)
+        handler.handle(logging.makeLogRecord({"msg": "y"}))
+        thread = threading.Thread(target=handler.handle,
+                                  args=(logging.makeLogRecord({"msg": "z"}), ))
+        thread.start()
+        thread.join(0.1)
+        # La file est pleine : l'appelant est bloqué.
+        self.assertTrue(thread.is_alive())
+        target.event.set()
+        thread.join()
+        handler.close()
+        self.assertEqual(target.messages, ["x", "y", "z"])
+        self.assertEqual(handler.dropped, 0)
+
+    def test_async_handler_copies_record(self):
+        """L'enregistrement transmis aux autres handlers n'est pas modifié."""
+        target = _ListHandler()
+        handler = AsyncHandler(target)
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = logging.makeLogRecord({"msg": "%s", "args": ("x", ),
+                                            "exc_info": sys.exc_info()})
+        try:
+            handler.handle(record)
+            handler.flush()
+        finally:
+            handler.close()
+        self.assertEqual((record.msg, record.args), ("%s", ("x", )))
+        self.assertTrue(record.exc_info is not None)
+        self.assertEqual(len(target.records), 1)
+        self.assertFalse(target.records[0] is record)
+        self.assertEqual(target.records[0].getMessage(), "x")
+        self.assertTrue("ValueError: boom" in target.records[0].exc_text)
+
+    def test_async_handler_restart(self):
+        """Un seul thread d'écriture est démarré après un fork()."""
+        target = _ListHandler()
+        handler = AsyncHandler(target)
+        thread = handler._thread
+        # Simule un fork() : le handler appartient à un autre processus.
+        handler._pid = -1
+        threads = [threading.Thread(target=handler.handle,
+                                    args=(logging.makeLogRecord(
+                                        {"msg": str(i)}), ))
+                   for i in xrange(10)]
+        for emitter in threads:
+            emitter.start()
+        for emitter in threads:
+            emitter.join()
+        handler.flush()
+        handler.close()
+        self.assertFalse(handler._thread is thread)
+        self.assertEqual(sorted(record.msg for record in target.records),
+                         sorted(str(i) for i in xrange(10)))
+
+    def test_formatter_context(self):
+        """Informations de contexte injectées par VigiloFormatter."""
+        formatter = VigiloFormatter("%(processName)s %(vigilo_app)s "
+                                    "%(user_login)s %(user_ip)s %(message)s")
+        record = logging.makeLogRecord({"msg": "test", "user_ip": "1.2.3.4"})
+        self.assertEqual(formatter.format(record),
+                         "%s ??? ??? 1.2.3.4 test" %
+                         os.path.basename(sys.argv[0]))
+
+        def provider(record):
+            return {"user_login": "manager", "user_ip": "5.6.7.8"}
+        register_context_provider(provider)
+        try:
+            record = logging.makeLogRecord({"msg": "test",
+                                            "user_ip": "1.2.3.4"})
+            self.assertEqual(formatter.format(record).split()[-4:],
+                             ["???", "manager", "1.2.3.4", "test"])
+        finally:
+            unregister_context_provider(provider)
+
+    def test_tg_context_errors(self):
+        """Les erreurs de la configuration de TurboGears sont ignorées."""
+        class Config(object):
+            def __getattr__(self, name):
+                raise RuntimeError(name)
+        class Request(object):
+            @property
+            def remote_addr(self):
+                raise TypeError("No object (name: request) has been "
+                                "registered for this thread")
+        old_modules = vigilo_logging._tg_modules
+        vigilo_logging._tg_modules = (Request(), Config())
+        try:
+            self.assertEqual(vigilo_logging._tg_context(None), {})
+        finally:
+            vigilo_logging._tg_modules = old_modules
+
+    def test_batched_syslog_datagram(self):
+        """Envoi par lots vers une socket syslog en mode datagramme."""
+        path = os.path.join(self.tmpdir, "log")
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        server.bind(path)
+        server.settimeout(1)
+        handler = BatchedSysLogHandler(path, "daemon", None, 3, 60)
+        try:
+            for msg in ("a", "b"):
+                handler.handle(logging.makeLogRecord({"msg": msg}))
+            # Le lot n'est pas encore complet.
+            server.setblocking(False)
+            self.assertRaises(socket.error, server.recv, 1024)
+            server.settimeout(1)
+            handler.handle(logging.makeLogRecord({"msg": "c",
+                                                  "levelname": "ERROR"}))
+            self.assertEqual([server.recv(1024) for _i in xrange(3)],
+                             ["<28>a\000", "<28>b\000", "<27>c\000"])
+            handler.handle(logging.makeLogRecord({"msg": "d"}))
+            handler.flush()
+            self.assertEqual(server.recv(1024), "<28>d\000")
+            self.assertEqual((handler.sent, handler.dropped), (4, 0))
+
+            # Après un fork(), les messages hérités du processus parent
+            # ne sont pas envoyés une seconde fois.
+            handler.handle(logging.makeLogRecord({"msg": "inherited"}))
+            handler._pid = -1
+            handler.flush()
+            server.setblocking(False)
+            self.assertRaises(socket.error, server.recv, 1024)
+            self.assertEqual((handler.sent, handler.dropped), (4, 0))
+
+            # Les messages qui ne peuvent pas être envoyés sont comptés.
+            server.close()
+            os.unlink(path)
+            handler.handle(logging.makeLogRecord({"msg": "e"}))
+            handler.flush()
+            self.assertEqual((handler.sent, handler.dropped), (4, 1))
+        finally:
+            handler.close()
+            server.close()
+
+    def test_batched_syslog_stream(self):
+        """Envoi par lots vers une socket syslog en mode flux."""
+        path = os.path.join(self.tmpdir, "log")
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        server.listen(1)
+        # Le type de socket est donné par son nom, comme dans la
+        # configuration recommandée.
+        handler = BatchedSysLogHandler(path, "daemon", "stream", 10, 0.05)
+        self.assertEqual(handler.socktype, socket.SOCK_STREAM)
+        conn = server.accept()[0]
+        conn.settimeout(1)
+        try:
+            for msg in ("a", "b\nc"):
+                handler.handle(logging.makeLogRecord({"msg": msg}))
+            # Le lot est envoyé à l'expiration du délai.
+            self.assertEqual(conn.recv(1024), "5 <28>a7 <28>b\nc")
+            # Attend que le thread d'envoi ait mis à jour les compteurs.
+            handler.flush()
+            self.assertEqual((handler.sent, handler.dropped), (2, 0))
+        finally:
+            handler.close()
+            conn.close()
+            server.close()
+
+    def test_json_formatter(self):
+        """Formatage des enregistrements en JSON."""
+        formatter = VigiloJSONFormatter("%(levelname)s %(message)s "
+                                        "%(user_ip)s %(vigilo_app)s")
+        record = logging.makeLogRecord({
+            "msg": "caf\xc3\xa9 %s", "args": ("ok", ),
+            "levelname": "INFO", "user_ip": "1.2.3.4",
+        })
+        output = formatter.format(record)
+        self.assertTrue(isinstance(output, str))
+        self.assertEqual(json.loads(output), {
+            "levelname": "INFO",
+            "message": u"caf\xe9 ok",
+            "user_ip": "1.2.3.4",
+            "vigilo_app": "???",
+        })
+
+        # Champs par défaut et exceptions.
+        try:
+            raise ValueError("oops")
+        except ValueError:
+            record = logging.makeLogRecord({"msg": "\xff",
+                                            "exc_info": sys.exc_info()})
+        data = json.loads(VigiloJSONFormatter().format(record))
+        self.assertEqual(sorted(data), sorted(
+            VigiloJSONFormatter.DEFAULT_FIELDS + ("exception", )))
+        self.assertEqual(data["message"], u"\ufffd")
+        self.assertTrue(data["exception"].endswith("ValueError: oops"))
+
+    def test_log_sink(self):
+        """Écriture des journaux des processus fils par le processus parent."""
+        logfile = os.path.join(self.tmpdir, "test.log")
+        self.load_conf_from_string("""
+[loggers]
+keys=test
+
+[handlers]
+keys=test
+
+[formatters]
+keys=test
+
+[logger_test]
+level=DEBUG
+handlers=test
+qualname=%s.sink
+
+[handler_test]
+class=FileHandler
+level=INFO
+formatter=test
+args=(%r, )
+
+[formatter_test]
+class=vigilo.common.logging.VigiloFormatter
+format=%%(multiprocessName)s %%(message)s
+""" % (__name__, logfile))
+        fileConfig()
+        logger = logging.getLogger("%s.sink" % __name__)
+        handler = logger.handlers[0]
+        # La collecte n'est pas démarrée sans que l'application
+        # ou la configuration ne le demande.
+        vigilo_logging._setup_log_sink()
+        self.assertEqual(vigilo_logging._log_sink, None)
+        self.assertEqual(vigilo_logging._process_start, None)
+        sink = start_log_sink()
+        try:
+            workers = [multiprocessing.Process(target=_log_messages,
+                                               name="Worker-%d" % i,
+                                               args=(logger.name, 200))
+                       for i in xrange(3)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+                self.assertEqual(worker.exitcode, 0)
+            # Les handlers du processus parent ne sont pas modifiés.
+            self.assertEqual(logger.handlers, [handler])
+        finally:
+            stop_log_sink()
+            handler.close()
+            logger.removeHandler(handler)
+        self.assertEqual((sink.received, sink.errors), (600, 0))
+        with open(logfile) as log:
+            lines = log.read().splitlines()
+        # Chaque ligne est intacte et les messages d'un même processus
+        # restent dans l'ordre.
+        for i in xrange(3):
+            self.assertEqual([line for line in lines
+                              if line.startswith("Worker-%d " % i)],
+                             ["Worker-%d message %d" % (i, j)
+                              for j in xrange(200)])
+        self.assertEqual(len(lines), 600)
+
+    def test_log_sink_fork(self):
+        """Démarrage du LogSink par la configuration, puis après un fork."""
+        logfile = os.path.join(self.tmpdir, "test.log")
+        self.load_conf_from_string("""
+[loggers]
+keys=test
+
+[handlers]
+keys=test
+multiprocess=yes
+
+[formatters]
+keys=test
+
+[logger_test]
+level=DEBUG
+handlers=test
+qualname=%s.lazy
+
+[handler_test]
+class=FileHandler
+level=INFO
+formatter=test
+args=(%r, )
+
+[formatter_test]
+class=vigilo.common.logging.VigiloFormatter
+format=%%(message)s
+""" % (__name__, logfile))
+        fileConfig()
+        logger = logging.getLogger("%s.lazy" % __name__)
+        handler = logger.handlers[0]
+        start = vars(multiprocessing.Process)['start']
+        vigilo_logging._setup_log_sink()
+        try:
+            sink = vigilo_logging._log_sink
+            self.assertEqual(sink._pid, os.getpid())
+            worker = multiprocessing.Process(target=_spawn_workers,
+                                             args=(logger.name, 10))
+            worker.start()
+            worker.join()
+            self.assertEqual(worker.exitcode, 0)
+            self.assertTrue(vigilo_logging._log_sink is sink)
+
+            # Un processus détaché du terminal démarre son propre LogSink.
+            pid = os.fork()
+            if not pid:
+                status = 1
+                try:
+                    _spawn_workers(logger.name, 5)
+                    status = int(vigilo_logging._log_sink is sink)
+                    stop_log_sink()
+                finally:
+                    os._exit(status)
+            self.assertEqual(os.waitpid(pid, 0)[1], 0)
+        finally:
+            stop_log_sink()
+            handler.close()
+            logger.removeHandler(handler)
+        # La méthode Process.start d'origine est restaurée.
+        self.assertTrue(vars(multiprocessing.Process)['start'] is start)
+        # Le dossier de la socket est supprimé par le processus parent.
+        self.assertFalse(os.path.exists(os.path.dirname(sink.address)))
+        self.assertEqual((sink.received, sink.errors), (10, 0))
+        with open(logfile) as log:
+            self.assertEqual(len(log.read().splitlines()), 15)
+
+    def test_log_sink_handler(self):
+        """Transmission des enregistrements à un LogSink."""
+        logger = logging.getLogger("%s.sink_handler" % __name__)
+        logger.propagate = False
+        target = _ListHandler()
+        logger.addHandler(target)
+        sink = LogSink()
+        handler = LogSinkHandler(sink.address)
+        try:
+            record = logging.makeLogRecord({
+                "name": logger.name, "levelno": logging.INFO,
+                "msg": "%s %s", "args": ("a", "b"),
+                "process": os.getpid() + 1, "multiprocessName": "Worker-1",
+            })
+            # Un enregistrement qui se propage n'est envoyé qu'une fois.
+            handler.handle(record)
+            handler.handle(record)
+            sink.stop()
+            self.assertEqual((sink.received, sink.errors), (1, 0))
+            self.assertEqual((handler.sent, handler.dropped), (1, 0))
+            self.assertEqual(len(target.records), 1)
+            received = target.records[0]
+            self.assertEqual(received.getMessage(), "a b")
+            # Les informations du processus émetteur sont conservées.
+            formatter = VigiloFormatter("%(multiprocessName)s %(message)s")
+            self.assertEqual(formatter.format(received), "Worker-1 a b")
+
+            # Le processus parent est arrêté : l'enregistrement est perdu.
+            handler.handle(logging.makeLogRecord({"msg": "c"}))
+            self.assertEqual((handler.sent, handler.dropped), (1, 1))
+        finally:
+            sink.stop()
+            handler.close()
+            logger.removeHandler(target)
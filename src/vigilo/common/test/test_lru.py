@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""Teste le cache LRU."""
+import unittest
+from vigilo.common.lru import LRUCache
+
+class TestLRUCache(unittest.TestCase):
+    def test_eviction(self):
+        """L'élément le moins récemment utilisé est évincé."""
+        cache = LRUCache(2)
+        cache['a'] = 1
+        cache['b'] = 2
+        self.assertEqual(cache.get('a'), 1) # 'b' devient le plus ancien.
+        cache['c'] = 3
+        self.assertFalse('b' in cache)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_counters(self):
+        """Comptage des succès et des échecs."""
+        cache = LRUCache(2)
+        self.assertEqual(cache.get('a', 42), 42)
+        cache['a'] = 1
+        cache.get('a')
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['size'], 1)
+
+    def test_resize(self):
+        """Réduction de la taille du cache."""
+        cache = LRUCache(3)
+        for key in 'abc':
+            cache[key] = key
+        cache.resize(1)
+        self.assertEqual(len(cache), 1)
+        self.assertTrue('c' in cache)
+        cache.resize(0)
+        cache['d'] = 'd'
+        self.assertEqual(len(cache), 0)
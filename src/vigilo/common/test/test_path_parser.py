@@ -4,7 +4,7 @@
 
 """Teste l'analyseur de chemins."""
 import unittest
-from vigilo.common import parse_path
+from vigilo.common import parse_path, parse_paths, format_path, format_paths
 
 class TestPathParser(unittest.TestCase):
     def test_accept_valid_paths(self):
@@ -41,3 +41,42 @@ class TestPathParser(unittest.TestCase):
         ]
         for path in paths:
             self.assertEqual(None, parse_path(path))
+
+    def test_long_components(self):
+        """L'analyseur doit gérer des composantes de grande taille."""
+        component = "x" * 10000
+        self.assertEqual([component, component],
+                         parse_path("/%s/%s" % (component, component)))
+        self.assertEqual([component + "/" + component],
+                         parse_path(r"/%s\/%s" % (component, component)))
+
+    def test_unicode(self):
+        """L'analyseur doit accepter des chemins en unicode."""
+        self.assertEqual([u'éçà', u'A/B'], parse_path(u'/éçà/A\\/B'))
+        self.assertEqual([u'éçà', u'B'], parse_path(u'/éçà/B'))
+
+    def test_bulk_parsing(self):
+        """Analyse d'un ensemble de chemins en un seul appel."""
+        paths = ['/A/B', '/A//B', r'/A\/B/C', 'A', 'A/B', '/']
+        parsed, invalid = parse_paths(paths)
+        self.assertEqual(parsed, [parse_path(path) for path in paths])
+        self.assertEqual(invalid, [1, 4, 5])
+
+    def test_format_path(self):
+        """Construction d'un chemin à partir de ses composantes."""
+        paths = [
+            ['A'],
+            ['A', 'B', 'C'],
+            [r'A\B'],
+            [r'A/B'],
+            [r'A\/B', 'C'],
+            [u'éçà'],
+        ]
+        for parts in paths:
+            self.assertEqual(parts, parse_path(format_path(parts)))
+        self.assertEqual(r'/A\\\/B/C', format_path([r'A\/B', 'C']))
+        self.assertEqual(format_paths(paths),
+                         [format_path(parts) for parts in paths])
+        self.assertRaises(ValueError, format_path, [])
+        self.assertRaises(ValueError, format_path, ['A', ''])
+        self.assertRaises(ValueError, format_paths, [['A'], []])
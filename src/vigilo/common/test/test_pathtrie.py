@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""Teste l'arbre préfixe de chemins d'accès."""
+import unittest
+from vigilo.common.pathtrie import PathTrie
+
+class TestPathTrie(unittest.TestCase):
+    def setUp(self):
+        """Préparatifs avant chaque test."""
+        self.trie = PathTrie([
+            '/Servers',
+            '/Servers/Linux',
+            '/Servers/Linux/Web',
+            r'/Servers/Linux/DB\/Cache',
+            '/Servers/Windows',
+            '/Network',
+        ])
+
+    def test_membership(self):
+        """Appartenance d'un chemin à l'arbre."""
+        self.assertEqual(len(self.trie), 6)
+        self.assertTrue('/Servers/Linux' in self.trie)
+        self.assertTrue(['Servers', 'Linux', 'DB/Cache'] in self.trie)
+        self.assertFalse('/Servers/Solaris' in self.trie)
+        self.assertFalse('/A//B' in self.trie)
+        self.assertFalse(self.trie.add('/Servers/Linux'))
+        self.assertEqual(len(self.trie), 6)
+        self.assertRaises(ValueError, self.trie.add, '/')
+
+    def test_prefix(self):
+        """Recherche d'un préfixe."""
+        trie = PathTrie(['/A/B/C'])
+        self.assertTrue(trie.has_prefix('/A/B'))
+        self.assertFalse('/A/B' in trie)
+        self.assertFalse(trie.has_prefix('/A/C'))
+        # Un chemin invalide n'est ni membre, ni préfixe.
+        for path in ('/', '/A//B', ''):
+            self.assertFalse(path in trie)
+            self.assertFalse(trie.has_prefix(path))
+
+    def test_subtree(self):
+        """Parcours d'un sous-arbre."""
+        self.assertEqual(
+            sorted(self.trie.iter_subtree('/Servers/Linux')),
+            [['Servers', 'Linux'],
+             ['Servers', 'Linux', 'DB/Cache'],
+             ['Servers', 'Linux', 'Web']])
+        self.assertEqual(
+            sorted(self.trie.descendants('/Servers/Linux')),
+            [['Servers', 'Linux', 'DB/Cache'],
+             ['Servers', 'Linux', 'Web']])
+        self.assertEqual(list(self.trie.iter_subtree('/Unknown')), [])
+        self.assertEqual(len(list(self.trie)), 6)
+
+    def test_interning(self):
+        """Les composantes identiques sont partagées en mémoire."""
+        trie = PathTrie()
+        trie.add(['Servers', ''.join(['Li', 'nux'])])
+        trie.add([''.join(['Lin', 'ux'])])
+        first, second = sorted(trie, key=len)
+        self.assertTrue(first[0] is second[1])
+
+    def test_from_paths(self):
+        """Construction à partir de chaînes, avec des chemins invalides."""
+        trie, invalid = PathTrie.from_paths(['/A/B', '/A//B', '/C'])
+        self.assertEqual(invalid, [1])
+        self.assertEqual(sorted(trie), [['A', 'B'], ['C']])
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2006-2020 CS GROUP - France
+# License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
+
+"""Teste la réorganisation des arborescences de fichiers RRD."""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from cStringIO import StringIO
+
+from vigilo.common import get_rrd_path
+from vigilo.common.conf import settings
+from vigilo.common.relayout import relayout, main
+
+class TestRelayout(unittest.TestCase):
+    hosts = ("localhost", "a", u"testserver éçà")
+    datasources = ("Ping", "Load")
+
+    def setUp(self):
+        """Préparatifs avant chaque test."""
+        self.tmpdir = tempfile.mkdtemp(prefix="vigilo-common-tests-")
+        for hostname in self.hosts:
+            for ds in self.datasources:
+                path = get_rrd_path(hostname, ds, self.tmpdir, "flat")
+                if not os.path.isdir(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                open(path, "w").close()
+
+    def tearDown(self):
+        """Nettoyage après chaque test."""
+        shutil.rmtree(self.tmpdir)
+
+    def assertLayout(self, path_mode):
+        """Vérifie que tous les fichiers respectent le mode indiqué."""
+        for hostname in self.hosts:
+            for ds in self.datasources:
+                path = get_rrd_path(hostname, ds, self.tmpdir, path_mode)
+                self.assertTrue(os.path.exists(path), path)
+
+    def test_relayout(self):
+        """Passage du mode "flat" au mode "hash", puis retour."""
+        journal = os.path.join(self.tmpdir, "journal")
+        stats = relayout(self.tmpdir, "flat", "hash", journal=journal)
+        self.assertEqual(stats, {'moved': 6, 'skipped': 0, 'errors': 0})
+        self.assertLayout("hash")
+        # Les dossiers vidés par la migration ont été supprimés.
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir,
+                                                     "localhost")))
+        self.assertEqual(len(open(journal).readlines()), 6)
+
+        stats = relayout(self.tmpdir, "hash", "flat")
+        self.assertEqual(stats['moved'], 6)
+        self.assertLayout("flat")
+
+    def test_dry_run(self):
+        """Simulation de la migration."""
+        out = StringIO()
+        stats = relayout(self.tmpdir, "flat", "name", dry_run=True, out=out)
+        # Le nom d'hôte "a" est trop court pour être réparti :
+        # son chemin est le même dans les deux modes.
+        self.assertEqual(stats, {'moved': 4, 'skipped': 2, 'errors': 0})
+        self.assertEqual(len(out.getvalue().splitlines()), 4)
+        self.assertLayout("flat")
+
+    def test_resume(self):
+        """Reprise d'une migration à partir du journal."""
+        journal = os.path.join(self.tmpdir, "journal")
+        src = get_rrd_path("localhost", "Ping", self.tmpdir, "flat")
+        dst = get_rrd_path("localhost", "Ping", self.tmpdir, "hash")
+        open(journal, "w").write("%s\t%s\n" % (src, dst))
+        stats = relayout(self.tmpdir, "flat", "hash", journal=journal)
+        self.assertEqual(stats, {'moved': 5, 'skipped': 1, 'errors': 0})
+        self.assertTrue(os.path.exists(src))
+
+    def test_conflict(self):
+        """Un fichier existant n'est jamais écrasé."""
+        dst = get_rrd_path("localhost", "Ping", self.tmpdir, "hash")
+        os.makedirs(os.path.dirname(dst))
+        open(dst, "w").close()
+        out = StringIO()
+        stats = relayout(self.tmpdir, "flat", "hash", out=out)
+        self.assertEqual(stats, {'moved': 5, 'skipped': 0, 'errors': 1})
+        self.assertTrue(os.path.exists(
+            get_rrd_path("localhost", "Ping", self.tmpdir, "flat")))
+
+    def test_deeper_fan_out(self):
+        """Ajout d'un niveau de sous-dossiers en mode "hash"."""
+        relayout(self.tmpdir, "flat", "hash")
+        stats = relayout(self.tmpdir, "hash", "hash",
+                         to_options={'path_depth': 3})
+        self.assertEqual(stats['moved'], 6)
+        for hostname in self.hosts:
+            for ds in self.datasources:
+                path = get_rrd_path(hostname, ds, self.tmpdir, "hash",
+                                    path_depth=3)
+                self.assertTrue(os.path.exists(path), path)
+
+    def test_cmdline_settings(self):
+        """La commande utilise par défaut la répartition configurée."""
+        relayout(self.tmpdir, "flat", "hash", to_options={'path_depth': 3})
+        confdir = tempfile.mkdtemp(prefix="vigilo-common-tests-")
+        conffile = os.path.join(confdir, "settings.ini")
+        with open(conffile, "w") as conf:
+            conf.write("[connector-metro]\nrrd_path_depth = 3\n")
+        os.environ["VIGILO_SETTINGS"] = conffile
+        oldargv, sys.argv = sys.argv, ["vigilo-rrd-relayout", "-d",
+                                       self.tmpdir, "hash", "flat"]
+        oldstderr, sys.stderr = sys.stderr, StringIO()
+        try:
+            self.assertRaises(SystemExit, main)
+            self.assertEqual(sys.stderr.getvalue(),
+                             "6 file(s) moved, 0 skipped, 0 error(s)\n")
+        finally:
+            sys.argv = oldargv
+            sys.stderr = oldstderr
+            del os.environ["VIGILO_SETTINGS"]
+            settings.reset()
+            shutil.rmtree(confdir)
+        self.assertLayout("flat")
@@ -3,8 +3,12 @@
 # License: GNU GPL v2 <http://www.gnu.org/licenses/gpl-2.0.html>
 
 """Teste la génération du chemin vers les fichiers RRD."""
+import os
+import shutil
+import tempfile
 import unittest
-from vigilo.common import get_rrd_path
+from vigilo.common import get_rrd_path, get_rrd_paths, rrd_path_cache, \
+                          parse_rrd_path, iter_rrd_files, get_rrd_path_options
 
 class TestRRDPath(unittest.TestCase):
     def test_default_values(self):
@@ -68,3 +72,130 @@ class TestRRDPath(unittest.TestCase):
             "/var/lib/vigilo/rrds/0/08/testserver+%C3%A9%C3%A7%C3%A0/"
             "Ping%27+%C3%A9%C3%A7%C3%A0.rrd"
         )
+
+    def test_batch(self):
+        """Calcul des chemins pour un ensemble d'hôtes et de sources."""
+        pairs = [
+            ("localhost", "Ping"),
+            (u"testserver éçà", u"Ping' éçà"),
+            ("localhost", None),
+            ("localhost", "Load"),
+        ]
+        for path_mode in ("flat", "name", "hash"):
+            self.assertEqual(
+                list(get_rrd_paths(pairs, base_dir="/tmp",
+                                   path_mode=path_mode)),
+                [get_rrd_path(hostname, ds, base_dir="/tmp",
+                              path_mode=path_mode)
+                 for (hostname, ds) in pairs]
+            )
+
+    def test_cache(self):
+        """Mise en cache des chemins calculés."""
+        rrd_path_cache.clear()
+        path = get_rrd_path("localhost", "Ping", path_mode="hash")
+        self.assertEqual(rrd_path_cache.misses, 1)
+        self.assertEqual(get_rrd_path("localhost", "Ping", path_mode="hash"),
+                         path)
+        self.assertEqual(rrd_path_cache.hits, 1)
+        # Le mode de répartition fait partie de la clé du cache.
+        self.assertEqual(get_rrd_path("localhost", "Ping", path_mode="flat"),
+                         "/var/lib/vigilo/rrds/localhost/Ping.rrd")
+        self.assertEqual(rrd_path_cache.misses, 2)
+
+    def test_parse_rrd_path(self):
+        """Retrouver l'hôte et la source de données depuis le chemin."""
+        for path_mode in ("flat", "name", "hash"):
+            for hostname, ds in (("localhost", "Ping"),
+                                 ("a", "Load"),
+                                 (u"testserver éçà", u"Ping' éçà")):
+                path = get_rrd_path(hostname, ds, path_mode=path_mode)
+                self.assertEqual(
+                    parse_rrd_path(path, path_mode=path_mode),
+                    (hostname.encode('utf-8'), ds.encode('utf-8'))
+                )
+
+    def test_parse_rrd_path_invalid(self):
+        """Chemins ne correspondant pas au mode de répartition."""
+        self.assertEqual(None, parse_rrd_path(
+            "/var/lib/vigilo/rrds/localhost/Ping.rrd", path_mode="hash"))
+        self.assertEqual(None, parse_rrd_path(
+            "/var/lib/vigilo/rrds/4/42/localhost/Ping.rrd"))
+        self.assertEqual(None, parse_rrd_path(
+            "/var/lib/vigilo/rrds/localhost/Ping.txt"))
+        self.assertEqual(None, parse_rrd_path("/tmp/localhost/Ping.rrd"))
+
+    def test_iter_rrd_files(self):
+        """Parcours d'une arborescence de fichiers RRD."""
+        tmpdir = tempfile.mkdtemp(prefix="vigilo-common-tests-")
+        try:
+            expected = set()
+            for hostname in ("localhost", "a", "testserver"):
+                for ds in ("Ping", "Load"):
+                    path = get_rrd_path(hostname, ds, tmpdir, "hash")
+                    if not os.path.isdir(os.path.dirname(path)):
+                        os.makedirs(os.path.dirname(path))
+                    open(path, "w").write("x" * 3)
+                    expected.add((hostname, ds, path, 3))
+            # Fichier ne respectant pas le mode de répartition.
+            os.makedirs(os.path.join(tmpdir, "foo"))
+            open(os.path.join(tmpdir, "foo", "bar.rrd"), "w").close()
+
+            found = set()
+            for hostname, ds, path, size, mtime in \
+                    iter_rrd_files(tmpdir, "hash"):
+                self.assertTrue(mtime > 0)
+                found.add((hostname, ds, path, size))
+            self.assertEqual(found, expected)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_fan_out(self):
+        """Nombre de niveaux et largeur des sous-dossiers intermédiaires."""
+        self.assertEqual(
+            get_rrd_path("localhost", "Ping", path_mode="hash",
+                         path_depth=3),
+            "/var/lib/vigilo/rrds/4/42/421/localhost/Ping.rrd"
+        )
+        self.assertEqual(
+            get_rrd_path("localhost", "Ping", path_mode="hash",
+                         path_depth=2, path_width=2),
+            "/var/lib/vigilo/rrds/42/421a/localhost/Ping.rrd"
+        )
+        self.assertEqual(
+            get_rrd_path("localhost", path_mode="name", path_depth=3),
+            "/var/lib/vigilo/rrds/l/lo/loc/localhost"
+        )
+        # Nom trop court pour le nombre de niveaux demandé.
+        self.assertEqual(
+            get_rrd_path("ab", path_mode="name", path_depth=3),
+            "/var/lib/vigilo/rrds/ab"
+        )
+        self.assertRaises(ValueError, get_rrd_path, "localhost",
+                          path_mode="hash", path_depth=5, path_width=8)
+        # Paramètres de répartition invalides.
+        for depth, width in ((2, 0), (-1, 1)):
+            self.assertRaises(ValueError, get_rrd_path, "localhost",
+                              path_mode="name", path_depth=depth,
+                              path_width=width)
+            self.assertRaises(ValueError, get_rrd_path_options, {
+                'rrd_path_depth': str(depth),
+                'rrd_path_width': str(width),
+            })
+
+        path = get_rrd_path("localhost", "Ping", path_mode="hash",
+                            path_depth=3, path_width=2)
+        self.assertEqual(
+            parse_rrd_path(path, path_mode="hash",
+                           path_depth=3, path_width=2),
+            ("localhost", "Ping"))
+        self.assertEqual(None, parse_rrd_path(path, path_mode="hash"))
+
+    def test_path_options(self):
+        """Options de répartition lues depuis la configuration."""
+        self.assertEqual(get_rrd_path_options({}), {
+            'path_mode': 'flat', 'path_depth': 2, 'path_width': 1})
+        self.assertEqual(get_rrd_path_options({
+            'rrd_path_mode': 'hash',
+            'rrd_path_depth': '3',
+        }), {'path_mode': 'hash', 'path_depth': 3, 'path_width': 1})